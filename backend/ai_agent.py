@@ -2,10 +2,13 @@
 AI Agent for task processing
 """
 
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 import json
 import os
 
+from priority_classifier import classify_priorities, classify_priority
+from task_index import task_index
+
 class AIAgent:
     def __init__(self, api_key: Optional[str] = None):
         self.api_key = api_key or os.getenv('OPENAI_API_KEY', '')
@@ -26,6 +29,17 @@ class AIAgent:
         tags = task_data.get('tags', '')
         due_date = task_data.get('due_date')
         
+        # The user's tasks that look most alike (local TF-IDF index)
+        similar_tasks = []
+        if task_data.get('user_id'):
+            similar_tasks = task_index.similar(
+                task_data['user_id'],
+                f"{title} {task_data.get('description', '')}",
+                k=5,
+                exclude=task_data.get('id'),
+                min_score=0.3
+            )
+        
         suggestions = {
             "title": title,
             "ai_suggestions": {
@@ -35,7 +49,7 @@ class AIAgent:
                 "due_date_reminder": f"Due on {due_date}" if due_date else "No due date set"
             },
             "time_estimation": "30-60 minutes",
-            "similar_tasks": [],
+            "similar_tasks": similar_tasks,
             "has_openai": self.has_openai
         }
         
@@ -47,12 +61,11 @@ class AIAgent:
     
     def analyze_priority(self, task_data: Dict[str, Any]) -> str:
         """Analyze and suggest priority"""
-        title = task_data.get('title', '').lower()
-        if any(word in title for word in ['urgent', 'asap', 'critical', 'important', 'high']):
-            return 'high'
-        elif any(word in title for word in ['low', 'someday', 'maybe', 'optional']):
-            return 'low'
-        return 'medium'
+        return classify_priority(task_data.get('title', ''))
+    
+    def analyze_priorities(self, tasks: List[Dict[str, Any]]) -> List[str]:
+        """Suggested priority of many tasks in one pass"""
+        return classify_priorities([task.get('title', '') for task in tasks])
 
 def create_ai_agent(api_key: Optional[str] = None) -> AIAgent:
     """Factory function to create AI agent"""
@@ -1,43 +1,188 @@
+import hashlib
+import hmac
 import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Any, Dict, Optional, Tuple
 from jose import JWTError, jwt
-from fastapi import HTTPException, Security, status
+from fastapi import Depends, HTTPException, Security, WebSocket, WebSocketException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 
 load_dotenv()
 
+# Routes check bearer tokens only with AUTH_REQUIRED set: until a login that
+# issues signed tokens exists, the API trusts the user_id in the path
+AUTH_REQUIRED = os.getenv("AUTH_REQUIRED", "false").lower() in ("1", "true", "yes")
+
 SECRET_KEY = os.getenv("BETTER_AUTH_SECRET")
-if not SECRET_KEY:
-    raise ValueError("BETTER_AUTH_SECRET environment variable not set")
+if AUTH_REQUIRED and not SECRET_KEY:
+    raise ValueError("BETTER_AUTH_SECRET environment variable not set (required by AUTH_REQUIRED)")
 
 ALGORITHM = "HS256"
-security = HTTPBearer()
+# Missing credentials are reported by verify_token, so authorized_user can skip them
+security = HTTPBearer(auto_error=False)
+
+# Key rotation: "kid:secret,kid:secret". Tokens name their key in the kid
+# header, tokens without one are checked against BETTER_AUTH_SECRET.
+# New tokens are signed with AUTH_SIGNING_KID (default: the first key).
+AUTH_SECRETS = dict(
+    entry.strip().split(":", 1) for entry in os.getenv("AUTH_SECRETS", "").split(",") if entry.strip()
+)
+AUTH_SIGNING_KID = os.getenv("AUTH_SIGNING_KID") or next(iter(AUTH_SECRETS), None)
+if AUTH_SIGNING_KID is not None and AUTH_SIGNING_KID not in AUTH_SECRETS:
+    raise ValueError(f"AUTH_SIGNING_KID {AUTH_SIGNING_KID} is not in AUTH_SECRETS")
+
+# Operators' token for internal views (per-user metrics), unset: nobody gets them
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+# Verified tokens kept, each until its exp (at most AUTH_TOKEN_CACHE_MAX_TTL_SECONDS)
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+AUTH_TOKEN_CACHE_MAX_TTL_SECONDS = float(os.getenv("AUTH_TOKEN_CACHE_MAX_TTL_SECONDS", "3600"))
+
+
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+class TokenCache:
+    """LRU of verified tokens by hash: a repeated token skips signature and claim checks"""
+
+    def __init__(self, max_size: int = AUTH_TOKEN_CACHE_SIZE, max_ttl: float = AUTH_TOKEN_CACHE_MAX_TTL_SECONDS):
+        self.max_size = max_size
+        self.max_ttl = max_ttl
+        # hash -> (user_id, expires_at)
+        self._entries: "OrderedDict[bytes, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0}
 
+    @staticmethod
+    def key(token: str) -> bytes:
+        # Only the hash is kept, a memory dump does not leak usable tokens
+        return hashlib.blake2b(token.encode(), digest_size=20).digest()
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Security(security)) -> str:
-    token = credentials.credentials
-    
+    def get(self, token: str) -> Optional[str]:
+        key = self.key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            if entry[1] <= time.time():
+                del self._entries[key]
+                self.stats['expired'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry[0]
+
+    def put(self, token: str, user_id: str, exp: Optional[float]):
+        expires_at = time.time() + self.max_ttl
+        if exp is not None:
+            expires_at = min(expires_at, float(exp))
+        key = self.key(token)
+        with self._lock:
+            self._entries[key] = (user_id, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def metrics(self) -> Dict[str, Any]:
+        lookups = self.stats['hits'] + self.stats['misses'] + self.stats['expired']
+        return {**self.stats, 'size': len(self._entries),
+                'hit_rate': round(self.stats['hits'] / lookups, 3) if lookups else None}
+
+
+token_cache = TokenCache()
+
+
+def _secret_for(token: str) -> str:
+    """Key the token says it was signed with"""
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        
-        if user_id is None:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid authentication credentials",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
-        
+        kid = jwt.get_unverified_header(token).get("kid")
+    except JWTError:
+        raise _unauthorized("Could not validate credentials")
+    if kid is None:
+        if not SECRET_KEY:
+            raise _unauthorized("Could not validate credentials")
+        return SECRET_KEY
+    if kid not in AUTH_SECRETS:
+        raise _unauthorized("Unknown signing key")
+    return AUTH_SECRETS[kid]
+
+
+def decode_token(token: str) -> str:
+    """User id of a valid token, cached until the token expires"""
+    user_id = token_cache.get(token)
+    if user_id is not None:
         return user_id
-        
+
+    try:
+        payload = jwt.decode(token, _secret_for(token), algorithms=[ALGORITHM])
     except JWTError:
+        raise _unauthorized("Could not validate credentials")
+    user_id = payload.get("sub")
+    if user_id is None:
+        raise _unauthorized("Invalid authentication credentials")
+
+    token_cache.put(token, user_id, payload.get("exp"))
+    return user_id
+
+
+def verify_token(credentials: Optional[HTTPAuthorizationCredentials] = Security(security)) -> str:
+    if credentials is None:
+        raise _unauthorized("Not authenticated")
+    return decode_token(credentials.credentials)
+
+
+def shared_token_matches(token: Optional[str], expected: Optional[str]) -> bool:
+    """Constant-time check of a shared (non-JWT) token, never true when none is configured"""
+    return bool(expected) and bool(token) and hmac.compare_digest(token.encode(), expected.encode())
+
+
+def metrics_operator(credentials: Optional[HTTPAuthorizationCredentials] = Security(security)) -> bool:
+    """Whether the request carries METRICS_TOKEN as its bearer token"""
+    return shared_token_matches(credentials.credentials if credentials else None, METRICS_TOKEN)
+
+
+def authorized_user(user_id: str, credentials: Optional[HTTPAuthorizationCredentials] = Security(security)) -> str:
+    """The path's user_id, if the bearer token belongs to that user (no check without AUTH_REQUIRED)"""
+    if not AUTH_REQUIRED:
+        return user_id
+    if user_id != verify_token(credentials):
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Could not validate credentials",
-            headers={"WWW-Authenticate": "Bearer"},
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Cannot access another user's data"
         )
+    return user_id
+
+
+def authorized_socket_user(user_id: str, websocket: WebSocket) -> str:
+    """authorized_user for WebSockets, where browsers cannot set headers: the token may come as ?token="""
+    if not AUTH_REQUIRED:
+        return user_id
+    token = websocket.query_params.get("token")
+    if not token:
+        scheme, _, token = websocket.headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer":
+            token = ""
+    try:
+        token_user_id = decode_token(token) if token else None
+    except HTTPException:
+        token_user_id = None
+    if token_user_id is None or token_user_id != user_id:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION)
+    return user_id
 
 
 def create_access_token(user_id: str, expires_delta: Optional[timedelta] = None) -> str:
@@ -45,8 +190,11 @@ def create_access_token(user_id: str, expires_delta: Optional[timedelta] = None)
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(days=7)
-    
+
     to_encode = {"sub": user_id, "exp": expire}
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    
-    return encoded_jwt
+    if AUTH_SIGNING_KID is None:
+        if not SECRET_KEY:
+            raise ValueError("BETTER_AUTH_SECRET environment variable not set")
+        return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    return jwt.encode(to_encode, AUTH_SECRETS[AUTH_SIGNING_KID], algorithm=ALGORITHM,
+                      headers={"kid": AUTH_SIGNING_KID})
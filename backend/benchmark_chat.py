@@ -0,0 +1,206 @@
+"""
+Chat Pipeline Benchmark
+Latency and throughput of /api/{user_id}/chat against a fake OpenAI
+
+Starts fake_openai.py and the API (uvicorn main:app, the real AIAgent,
+tool executor and MCPServer on a scratch SQLite database by default)
+as subprocesses, then sends chat requests at increasing concurrency.
+Each level reports p50/p95/p99 latency, throughput, errors, the peak
+number of LLM calls the fake saw in flight and the API's event loop lag.
+
+With a fixed fake latency, throughput should grow with concurrency up
+to OPENAI_MAX_CONCURRENCY; if it flattens earlier, or the loop lag
+climbs, something is serializing or blocking the event loop.
+
+A --tool-ratio share of the messages makes the fake call tools (add,
+list, complete), so those turns take two LLM round trips and a
+database transaction. Every message is unique, the response cache never
+answers.
+
+Usage:
+    python benchmark_chat.py [--concurrency 1,4,16,64] [--requests 200] [--latency fixed:500] [--stream]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+
+import httpx
+from jose import jwt
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+def start_server(app: str, port: int, env: dict, log_path: str) -> subprocess.Popen:
+    log = open(log_path, "w")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--port", str(port), "--log-level", "warning"],
+        cwd=HERE, env={**os.environ, **env}, stdout=log, stderr=subprocess.STDOUT
+    )
+
+
+def wait_ready(url: str, process: subprocess.Popen, timeout: float = 60):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited before {url} was ready")
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+
+def auth_header(user_id: str, secret: str) -> dict:
+    """Bearer token the API accepts for user_id (signed with BETTER_AUTH_SECRET)"""
+    token = jwt.encode({"sub": user_id, "exp": int(time.time()) + 86400}, secret, algorithm="HS256")
+    return {"Authorization": f"Bearer {token}"}
+
+
+def make_message(n: int, tool_ratio: float) -> str:
+    """A unique chat message, tool-calling for tool_ratio of them"""
+    if random.random() >= tool_ratio:
+        return f"how should I plan my afternoon around meeting {n}?"
+    return random.choice([
+        f"remember to buy part {n}",
+        f"what's still pending for project {n}",
+        f"I finished buy part {max(0, n - 10)}",
+    ])
+
+
+async def send(client: httpx.AsyncClient, user_id: str, message: str, stream: bool, headers: dict) -> dict:
+    """One chat turn: status, latency and time to the first token (streaming)"""
+    started = time.perf_counter()
+    ttft = None
+    if not stream:
+        response = await client.post(f"/api/{user_id}/chat", json={"message": message}, headers=headers)
+        return {"status": response.status_code, "ms": (time.perf_counter() - started) * 1000, "ttft_ms": None}
+
+    status = 200
+    async with client.stream("POST", f"/api/{user_id}/chat/stream", json={"message": message}, headers=headers) as response:
+        status = response.status_code
+        async for line in response.aiter_lines():
+            if line == "event: token" and ttft is None:
+                ttft = (time.perf_counter() - started) * 1000
+            elif line == "event: error":
+                status = 503
+    return {"status": status, "ms": (time.perf_counter() - started) * 1000, "ttft_ms": ttft}
+
+
+async def run_level(base_url: str, concurrency: int, requests: int, users: int, tool_ratio: float,
+                    stream: bool, offset: int, secret: str) -> dict:
+    """Send requests with concurrency workers, each one request at a time"""
+    results = []
+    headers = {f"bench-{n}": auth_header(f"bench-{n}", secret) for n in range(users)}
+    queue = iter(range(offset, offset + requests))
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+        async def worker():
+            for n in queue:
+                try:
+                    user_id = f"bench-{n % users}"
+                    results.append(await send(client, user_id, make_message(n, tool_ratio), stream, headers[user_id]))
+                except httpx.HTTPError as e:
+                    results.append({"status": type(e).__name__, "ms": None, "ttft_ms": None})
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies = [r["ms"] for r in results if r["status"] == 200]
+    ttfts = [r["ttft_ms"] for r in results if r["status"] == 200 and r["ttft_ms"] is not None]
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "ok": len(latencies),
+        "errors": dict(Counter(str(r["status"]) for r in results if r["status"] != 200)),
+        "seconds": round(elapsed, 2),
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "latency_ms": {f"p{int(p * 100)}": round(percentile(latencies, p), 1) for p in (0.5, 0.95, 0.99)},
+        "ttft_ms": {f"p{int(p * 100)}": round(percentile(ttfts, p), 1) for p in (0.5, 0.95)} if stream else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", default="1,4,16,64", help="comma separated levels")
+    parser.add_argument("--requests", type=int, default=0, help="per level, default max(20, 4 x concurrency)")
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--tool-ratio", type=float, default=0.3)
+    parser.add_argument("--stream", action="store_true", help="use the SSE endpoint")
+    parser.add_argument("--latency", default="fixed:500", help="fake time to first token, see fake_openai.py")
+    parser.add_argument("--token-interval-ms", type=float, default=10)
+    parser.add_argument("--api-port", type=int, default=8810)
+    parser.add_argument("--fake-port", type=int, default=8901)
+    parser.add_argument("--database-url", default=None, help="default: a scratch SQLite file")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args()
+
+    random.seed(42)
+    scratch = tempfile.mkdtemp(prefix="bench-chat-")
+    secret = os.getenv("BETTER_AUTH_SECRET", "benchmark")
+    fake_env = {"FAKE_OPENAI_LATENCY": args.latency, "FAKE_OPENAI_TOKEN_INTERVAL_MS": str(args.token_interval_ms)}
+    api_env = {
+        "DATABASE_URL": args.database_url or f"sqlite:///{scratch}/bench.db",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{args.fake_port}/v1",
+        "OPENAI_API_KEY": "sk-fake",
+        "KAFKA_BACKEND": "memory",
+        "BETTER_AUTH_SECRET": secret,
+    }
+    fake_url = f"http://127.0.0.1:{args.fake_port}"
+    api_url = f"http://127.0.0.1:{args.api_port}"
+
+    fake = start_server("fake_openai:app", args.fake_port, fake_env, f"{scratch}/fake.log")
+    api = start_server("main:app", args.api_port, api_env, f"{scratch}/api.log")
+    results = []
+    try:
+        wait_ready(f"{fake_url}/v1/models", fake)
+        wait_ready(f"{api_url}/health", api)
+        print(f"📊 Chat benchmark: fake latency {args.latency}, {args.tool_ratio:.0%} tool turns, "
+              f"{'streamed' if args.stream else 'plain'} (logs in {scratch})")
+        print(f"   {'conc':>5} {'ok':>5} {'err':>4} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} "
+              f"{'llm peak':>9} {'loop lag':>9}")
+
+        offset = 0
+        for concurrency in [int(level) for level in args.concurrency.split(",")]:
+            requests = args.requests or max(20, 4 * concurrency)
+            httpx.post(f"{fake_url}/stats/reset")
+            level = asyncio.run(run_level(api_url, concurrency, requests, args.users, args.tool_ratio, args.stream, offset, secret))
+            offset += requests
+            level["fake_openai"] = httpx.get(f"{fake_url}/stats").json()
+            health = httpx.get(f"{api_url}/health").json()
+            level["event_loop"] = health["event_loop"]
+            level["scheduler"] = (health.get("ai_agent") or {}).get("scheduler")
+            results.append(level)
+
+            latency = level["latency_ms"]
+            print(f"   {concurrency:>5} {level['ok']:>5} {sum(level['errors'].values()):>4} "
+                  f"{level['throughput_rps']:>8.2f} {latency['p50']:>6.0f}ms {latency['p95']:>6.0f}ms "
+                  f"{latency['p99']:>6.0f}ms {level['fake_openai']['max_in_flight']:>9} "
+                  f"{health['event_loop']['lag_ms']['p99']:>7.1f}ms")
+    finally:
+        for process in (api, fake):
+            process.terminate()
+            process.wait(timeout=10)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
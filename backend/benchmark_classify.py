@@ -0,0 +1,86 @@
+"""
+Priority Classification Benchmark
+Throughput of batch keyword classification against the per-title check
+
+Compares the original AIAgent.analyze_priority loop (any(word in title)
+per keyword list, per title), classify_priority per title and
+classify_priorities over the whole batch, and checks that all three
+agree.
+
+Usage:
+    python benchmark_classify.py [--titles 100000] [--repeat 3]
+"""
+
+import argparse
+import random
+import time
+
+from priority_classifier import HIGH_KEYWORDS, LOW_KEYWORDS, classify_priorities, classify_priority
+
+WORDS = (
+    "buy milk call mom finish report review code deploy server fix bug write docs plan meeting "
+    "email client pay rent book flight clean kitchen prepare slides update budget order parts"
+).split()
+
+
+def analyze_priority_loop(title: str) -> str:
+    """The per-title check classify_priorities replaces"""
+    title = title.lower()
+    if any(word in title for word in HIGH_KEYWORDS):
+        return 'high'
+    elif any(word in title for word in LOW_KEYWORDS):
+        return 'low'
+    return 'medium'
+
+
+def make_titles(count: int, seed: int = 7):
+    rng = random.Random(seed)
+    keywords = HIGH_KEYWORDS + LOW_KEYWORDS + ["URGENT!", "Maybe", "slow", "highway"]
+    titles = []
+    for _ in range(count):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(2, 8))]
+        if rng.random() < 0.3:
+            words.insert(rng.randrange(len(words) + 1), rng.choice(keywords))
+        titles.append(" ".join(words))
+    return titles
+
+
+def best_of(repeat: int, fn):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--titles", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    titles = make_titles(args.titles)
+    print(f"📊 Classifying {len(titles)} titles (best of {args.repeat})")
+
+    runs = [
+        ("per-title any() loop", lambda: [analyze_priority_loop(t) for t in titles]),
+        ("classify_priority", lambda: [classify_priority(t) for t in titles]),
+        ("classify_priorities", lambda: classify_priorities(titles)),
+    ]
+    baseline = None
+    expected = None
+    for name, fn in runs:
+        elapsed, result = best_of(args.repeat, fn)
+        if expected is None:
+            expected = result
+        assert result == expected, f"{name} disagrees with the per-title loop"
+        baseline = baseline or elapsed
+        print(f"   {name:<22} {elapsed * 1000:8.1f}ms  {len(titles) / elapsed:12,.0f} titles/s  "
+              f"x{baseline / elapsed:.1f}")
+    print("✅ All classifiers agree")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Event Pipeline Benchmark
+End-to-end throughput of the Kafka event pipeline on the in-memory broker
+
+Stage 1: API threads publish task events through TodoKafkaProducer.
+Stage 2: a consumer group (ResilientConsumer) turns each event into a
+         reminder.due message, like the reminder scheduler.
+Stage 3: a second consumer group batches reminders into per-user digests.
+
+A fraction of stage 2 handler calls can be made to fail to exercise the
+retry topics and DLQ, and one consumer joins late to force a rebalance.
+
+Usage:
+    python benchmark_pipeline.py [--events 20000] [--consumers 3] [--failure-rate 0.01]
+"""
+
+import os
+
+os.environ.setdefault("KAFKA_BACKEND", "memory")
+
+import argparse
+import json
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from kafka_client import KAFKA_BACKEND, create_consumer
+from kafka_producer import kafka_producer
+from kafka_retry import FailureRouter, ResilientConsumer, retry_topics
+from reminder_digest import ReminderDigester
+
+RETRY_DELAYS = [0.05, 0.1, 0.2]
+POLL_TIMEOUT_MS = 100
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+class Stage:
+    """A consumer group of ResilientConsumer threads"""
+
+    def __init__(self, name: str, topic: str, handler, delays=RETRY_DELAYS):
+        self.name = name
+        self.topic = topic
+        self.handler = handler
+        self.delays = delays
+        self.stop = threading.Event()
+        self.threads = []
+        self.consumers = []
+
+    def start_consumer(self):
+        consumer = create_consumer(
+            self.topic,
+            *retry_topics(self.name, self.delays),
+            group_id=self.name,
+            value_deserializer=lambda v: json.loads(v.decode('utf-8')),
+            auto_offset_reset='earliest',
+            enable_auto_commit=False
+        )
+        resilient = ResilientConsumer(consumer, self.handler, FailureRouter(kafka_producer.publish, self.name, self.delays))
+        self.consumers.append(resilient)
+
+        def run():
+            while not self.stop.is_set():
+                resilient.poll_once(POLL_TIMEOUT_MS)
+            consumer.close()
+
+        thread = threading.Thread(target=run, name=f"{self.name}-{len(self.threads)}", daemon=True)
+        thread.start()
+        self.threads.append(thread)
+
+    def join(self):
+        self.stop.set()
+        for thread in self.threads:
+            thread.join()
+
+    def metrics(self) -> Counter:
+        totals = Counter()
+        for consumer in self.consumers:
+            totals.update({k: v for k, v in consumer.metrics().items() if isinstance(v, int) and not isinstance(v, bool)})
+        return totals
+
+
+def run_benchmark(events: int, producers: int, consumers: int, users: int, failure_rate: float, timeout: float):
+    random.seed(42)
+    lock = threading.Lock()
+    delivered = Counter()
+    latencies = []
+    digester = ReminderDigester(window_seconds=0.05, max_digests_per_hour=10 ** 9)
+
+    def schedule_reminder(event):
+        if random.random() < failure_rate:
+            raise ValueError("injected failure")
+        task_data = event['task_data']
+        if not kafka_producer.publish_reminder(event['task_id'], event['user_id'], task_data['title'], task_data['created']):
+            raise RuntimeError("reminder not acked")
+
+    def flush_digests():
+        """Send due digests (caller holds the lock)"""
+        for digest, _ in digester.flush_due():
+            now = time.time()
+            for reminder in digest['reminders']:
+                delivered[reminder['task_id']] += 1
+                latencies.append(now - datetime.fromisoformat(reminder['due_at']).timestamp())
+
+    def deliver_reminder(event):
+        with lock:
+            digester.add(event)
+            flush_digests()
+
+    stage2 = Stage('bench-reminder-scheduler', 'task-events', schedule_reminder)
+    stage3 = Stage('bench-reminder-service', 'reminders', deliver_reminder)
+    for _ in range(max(1, consumers - 1)):
+        stage2.start_consumer()
+    for _ in range(consumers):
+        stage3.start_consumer()
+
+    def publish(worker: int):
+        for task_id in range(worker, events, producers):
+            kafka_producer.publish_task_event('created', task_id, f"user-{task_id % users}", {
+                'title': f"Task {task_id}",
+                'created': datetime.now().isoformat(),
+            })
+
+    kafka_producer.start()
+    while not kafka_producer.connected:
+        time.sleep(0.01)
+
+    started = time.time()
+    publishers = [threading.Thread(target=publish, args=(w,)) for w in range(producers)]
+    for thread in publishers:
+        thread.start()
+
+    # A late joiner forces a rebalance of stage 2 while events are flowing
+    time.sleep(0.2)
+    if consumers > 1:
+        stage2.start_consumer()
+
+    for thread in publishers:
+        thread.join()
+    produced_at = time.time()
+
+    dead_lettered = 0
+    while time.time() - started < timeout:
+        with lock:
+            flush_digests()
+            done = len(delivered)
+        dead_lettered = stage2.metrics()['dead_lettered']
+        if done + dead_lettered >= events:
+            break
+        time.sleep(0.05)
+    finished = time.time()
+
+    stage2.join()
+    stage3.join()
+
+    elapsed = finished - started
+    s2, s3 = stage2.metrics(), stage3.metrics()
+    return {
+        'backend': KAFKA_BACKEND,
+        'events': events,
+        'producers': producers,
+        'consumers_per_group': consumers,
+        'publish_seconds': round(produced_at - started, 3),
+        'end_to_end_seconds': round(elapsed, 3),
+        'throughput_events_per_second': round(events / elapsed),
+        'delivered': len(delivered),
+        'duplicates': sum(c - 1 for c in delivered.values()),
+        'lost': events - len(delivered) - dead_lettered,
+        'retried': s2['retried'],
+        'dead_lettered': dead_lettered,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 0.50) * 1000, 1),
+            'p95': round(percentile(latencies, 0.95) * 1000, 1),
+            'p99': round(percentile(latencies, 0.99) * 1000, 1),
+        },
+        'stage_metrics': {'scheduler': dict(s2), 'reminders': dict(s3)},
+        'digests': digester.metrics()['digests_sent'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end event pipeline throughput benchmark")
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--producers", type=int, default=4)
+    parser.add_argument("--consumers", type=int, default=3)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--failure-rate", type=float, default=0.01)
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.ERROR)
+    for name in ('kafka_producer', 'kafka_retry'):
+        logging.getLogger(name).setLevel(logging.ERROR)
+
+    result = run_benchmark(args.events, args.producers, args.consumers, args.users, args.failure_rate, args.timeout)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+"""
+Chat Search
+Full-text search over a user's chat history
+
+On PostgreSQL the messages are matched with websearch_to_tsquery
+against their stored search_vector column, through the GIN index on
+(user_id, search_vector) (see migrations/add_chat_search.sql), and
+ranked with ts_rank_cd on the same column. Snippets (ts_headline, the
+expensive part) are only built for the rows of the requested page.
+
+Elsewhere (SQLite in development) an in-process inverted index is used:
+built from the database on a user's first search, then kept current by
+remember_exchange after every committed exchange, for the
+CHAT_SEARCH_MAX_USERS most recently searching users. All query terms
+must match, hits are ranked with BM25.
+
+Matched words are marked with ** in snippets on both backends.
+"""
+
+import logging
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List
+
+from sqlalchemy import text
+from sqlmodel import Session, select
+
+from database import engine
+from models import Message
+
+logger = logging.getLogger(__name__)
+
+CHAT_SEARCH_BACKEND = os.getenv("CHAT_SEARCH_BACKEND") or ("postgres" if engine.dialect.name == "postgresql" else "memory")
+CHAT_SEARCH_MAX_USERS = int(os.getenv("CHAT_SEARCH_MAX_USERS", "100"))
+CHAT_SEARCH_PAGE_SIZE = int(os.getenv("CHAT_SEARCH_PAGE_SIZE", "20"))
+# Deeper pages are refused, ranked results cannot be paged by a cursor
+CHAT_SEARCH_MAX_OFFSET = 1000
+MARK = "**"
+
+# search_vector is to_tsvector('english', content), queries must use the same config
+_PG_SEARCH = text(f"""
+    SELECT m.id, m.conversation_id, m.role, m.created_at, hits.rank,
+           ts_headline('english', m.content, q.query,
+                       'MaxWords=24, MinWords=8, MaxFragments=2, FragmentDelimiter=" … ", StartSel={MARK}, StopSel={MARK}')
+               AS snippet
+    FROM (
+        SELECT id, ts_rank_cd(search_vector, query) AS rank
+        FROM messages, websearch_to_tsquery('english', :query) query
+        WHERE user_id = :user_id AND search_vector @@ query
+        ORDER BY rank DESC, id DESC
+        LIMIT :limit OFFSET :offset
+    ) hits
+    JOIN messages m ON m.id = hits.id
+    CROSS JOIN websearch_to_tsquery('english', :query) q(query)
+    ORDER BY hits.rank DESC, m.id DESC
+""")
+
+_WORD = re.compile(r"\w+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have how i in is it its me my of on or that the this to "
+    "was what when where which who will with you your".split()
+)
+# BM25 parameters
+_K1 = 1.2
+_B = 0.75
+
+
+def _stem(word: str) -> str:
+    """Crude plural folding, so "tasks" finds "task" like the english config does"""
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def terms(content: str) -> List[str]:
+    return [_stem(word) for word in _WORD.findall(content.lower()) if word not in STOPWORDS]
+
+
+def snippet(content: str, query_terms: set, width: int = 160) -> str:
+    """Window of content around the first matching word, matches marked"""
+    words = list(_WORD.finditer(content))
+    hits = [w for w in words if _stem(w.group().lower()) in query_terms]
+    if not hits:
+        return content[:width]
+    start = max(0, hits[0].start() - width // 3)
+    end = min(len(content), start + width)
+    parts = []
+    position = start
+    for hit in hits:
+        if hit.start() < start or hit.end() > end:
+            continue
+        parts += [content[position:hit.start()], MARK, hit.group(), MARK]
+        position = hit.end()
+    parts.append(content[position:end])
+    return ("… " if start else "") + "".join(parts).strip() + (" …" if end < len(content) else "")
+
+
+class UserMessageIndex:
+    """Inverted index of one user's messages"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # id -> (conversation_id, role, content, created_at)
+        self.docs: Dict[int, tuple] = {}
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.lengths: Dict[int, int] = {}
+        self.total_length = 0
+
+    def add(self, message_id: int, conversation_id: int, role: str, content: str, created_at):
+        if message_id in self.docs:
+            return
+        self.docs[message_id] = (conversation_id, role, content, created_at)
+        words = terms(content)
+        self.lengths[message_id] = len(words)
+        self.total_length += len(words)
+        for word in words:
+            posting = self.postings.setdefault(word, {})
+            posting[message_id] = posting.get(message_id, 0) + 1
+
+    def search(self, query: str, limit: int, offset: int) -> List[Dict[str, Any]]:
+        query_terms = list(dict.fromkeys(terms(query)))
+        postings = [self.postings.get(term) for term in query_terms]
+        if not query_terms or not all(postings):
+            return []
+        # Intersect from the rarest term, its posting bounds the candidates
+        postings.sort(key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                return []
+
+        count = len(self.docs)
+        average = self.total_length / count
+        scores = dict.fromkeys(candidates, 0.0)
+        for posting in postings:
+            idf = math.log(1 + (count - len(posting) + 0.5) / (len(posting) + 0.5))
+            for message_id in candidates:
+                tf = posting[message_id]
+                norm = _K1 * (1 - _B + _B * self.lengths[message_id] / average)
+                scores[message_id] += idf * tf * (_K1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))[offset:offset + limit]
+
+        wanted = set(query_terms)
+        results = []
+        for message_id, score in ranked:
+            conversation_id, role, content, created_at = self.docs[message_id]
+            results.append({
+                "message_id": message_id, "conversation_id": conversation_id, "role": role,
+                "created_at": created_at, "rank": round(score, 4), "snippet": snippet(content, wanted),
+            })
+        return results
+
+
+class MessageIndex:
+    """In-process message indexes of the most recently searching users"""
+
+    def __init__(self, max_users: int = CHAT_SEARCH_MAX_USERS):
+        self.max_users = max_users
+        self._users: "OrderedDict[str, UserMessageIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'builds': 0, 'queries': 0, 'updates': 0, 'evictions': 0}
+
+    def _load(self, user_id: str) -> UserMessageIndex:
+        with self._lock:
+            index = self._users.get(user_id)
+            if index is not None:
+                self._users.move_to_end(user_id)
+                return index
+            index = self._users[user_id] = UserMessageIndex()
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+                self.stats['evictions'] += 1
+            # Built under the index's lock, searches and updates for the user wait for it
+            index.lock.acquire()
+
+        try:
+            started = time.perf_counter()
+            with Session(engine) as session:
+                rows = session.exec(
+                    select(Message.id, Message.conversation_id, Message.role, Message.content, Message.created_at)
+                    .where(Message.user_id == user_id)
+                ).all()
+            for row in rows:
+                index.add(*row)
+            self.stats['builds'] += 1
+            logger.info(f"🔎 Indexed {len(rows)} messages of {user_id} in {(time.perf_counter() - started) * 1000:.0f}ms")
+        except Exception:
+            with self._lock:
+                self._users.pop(user_id, None)
+            raise
+        finally:
+            index.lock.release()
+        return index
+
+    def add(self, messages: List[Message]):
+        """Index committed messages of users whose index is loaded (the others load them from the database)"""
+        for message in messages:
+            index = self._users.get(message.user_id)
+            if index is None:
+                continue
+            with index.lock:
+                index.add(message.id, message.conversation_id, message.role, message.content, message.created_at)
+            self.stats['updates'] += 1
+
+    def search(self, user_id: str, query: str, limit: int, offset: int) -> List[Dict[str, Any]]:
+        index = self._load(user_id)
+        with index.lock:
+            self.stats['queries'] += 1
+            return index.search(query, limit, offset)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {**self.stats, 'users': len(self._users)}
+
+
+# Shared index of the memory backend
+message_index = MessageIndex()
+
+
+def _search_postgres(user_id: str, query: str, limit: int, offset: int) -> List[Dict[str, Any]]:
+    with Session(engine) as session:
+        rows = session.execute(_PG_SEARCH, {"user_id": user_id, "query": query, "limit": limit, "offset": offset})
+        return [
+            {"message_id": row.id, "conversation_id": row.conversation_id, "role": row.role,
+             "created_at": row.created_at, "rank": round(float(row.rank), 4), "snippet": row.snippet}
+            for row in rows
+        ]
+
+
+def search(user_id: str, query: str, limit: int = CHAT_SEARCH_PAGE_SIZE, offset: int = 0) -> Dict[str, Any]:
+    """A page of the user's messages matching query, best first"""
+    started = time.perf_counter()
+    run = _search_postgres if CHAT_SEARCH_BACKEND == "postgres" else message_index.search
+    # One extra row tells whether there is a next page
+    results = run(user_id, query, limit + 1, offset)
+    more = len(results) > limit
+    return {
+        "query": query,
+        "results": results[:limit],
+        "next_offset": offset + limit if more and offset + limit <= CHAT_SEARCH_MAX_OFFSET else None,
+        "backend": CHAT_SEARCH_BACKEND,
+        "ms": round((time.perf_counter() - started) * 1000, 2),
+    }
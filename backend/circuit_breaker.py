@@ -0,0 +1,121 @@
+"""
+Circuit Breaker
+Stops calling a failing dependency and probes it again with exponential backoff
+
+closed    -> calls go through, consecutive failures are counted
+open      -> calls are rejected until the backoff expires
+half_open -> one probe call is let through, success closes the breaker,
+             failure re-opens it with twice the backoff
+"""
+
+import logging
+import random
+import threading
+import time
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Thread-safe circuit breaker with exponential backoff"""
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 3,
+        reset_timeout: float = 1.0,
+        max_reset_timeout: float = 60.0,
+        clock=time.monotonic,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._open_until = 0.0
+        # Backoff of the next opening, doubled each time the probe fails
+        self._timeout = reset_timeout
+        self._probing = False
+        self.open_count = 0
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and self.clock() >= self._open_until:
+            self._state = HALF_OPEN
+            self._probing = False
+        return self._state
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def allow(self) -> bool:
+        """True if a call may be made now (one probe at a time when half open)"""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._state != CLOSED:
+                logger.info(f"✅ {self.name} circuit closed")
+            self._state = CLOSED
+            self._failures = 0
+            self._timeout = self.reset_timeout
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            state = self._current_state()
+            if state == HALF_OPEN or (state == CLOSED and self._failures >= self.failure_threshold):
+                self._open()
+
+    def trip(self):
+        """Open the breaker right away (e.g. the dependency is unreachable)"""
+        with self._lock:
+            self._failures += 1
+            if self._current_state() != OPEN:
+                self._open()
+
+    def _open(self):
+        # Jitter keeps replicas from probing in lockstep
+        backoff = self._timeout * random.uniform(1.0, 1.2)
+        self._state = OPEN
+        self._open_until = self.clock() + backoff
+        self._timeout = min(self._timeout * 2, self.max_reset_timeout)
+        self._probing = False
+        self.open_count += 1
+        logger.warning(f"⚠️  {self.name} circuit open, retrying in {backoff:.1f}s")
+
+    def retry_in(self) -> float:
+        """Seconds until the next probe is allowed"""
+        with self._lock:
+            if self._current_state() != OPEN:
+                return 0.0
+            return max(0.0, self._open_until - self.clock())
+
+    def snapshot(self) -> Dict[str, Any]:
+        """State for health endpoints"""
+        with self._lock:
+            state = self._current_state()
+            return {
+                'state': state,
+                'consecutive_failures': self._failures,
+                'retry_in_seconds': round(max(0.0, self._open_until - self.clock()), 1) if state == OPEN else 0,
+                'open_count': self.open_count,
+            }
@@ -0,0 +1,333 @@
+"""
+Conversation Store
+Persists chat exchanges and loads the recent history sent to the model
+
+Messages are read as "the latest N of a conversation", which the
+(conversation_id, created_at) index answers without touching older rows.
+Messages already folded into the conversation's rolling summary (see
+conversation_summary.py) are skipped, the summary is sent instead.
+Active conversations are also kept in a small in-process LRU so a
+follow-up message usually needs no history query at all. The cache is
+per worker and only updated after a commit, entries expire after
+HISTORY_CACHE_TTL_SECONDS to bound staleness across workers.
+
+Conversation lists and message histories are paged with keyset cursors
+((updated_at, id) and (created_at, id), opaque to clients), so a page
+costs the same however far back it is. Message counts are kept on the
+conversation row by save_exchange instead of counted per listing.
+"""
+
+import base64
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from sqlalchemy import tuple_
+from sqlmodel import Session, select
+
+import chat_search
+from database import engine
+from models import Conversation, Message
+from token_budget import HISTORY_TOKEN_BUDGET, count_tokens, fit_latest, message_tokens
+
+logger = logging.getLogger(__name__)
+
+# Most recent messages loaded (and cached) per conversation
+HISTORY_MAX_MESSAGES = int(os.getenv("HISTORY_MAX_MESSAGES", "20"))
+HISTORY_CACHE_SIZE = int(os.getenv("HISTORY_CACHE_SIZE", "1000"))
+HISTORY_CACHE_TTL_SECONDS = float(os.getenv("HISTORY_CACHE_TTL_SECONDS", "300"))
+# Default page sizes of the conversation list and message history endpoints
+CONVERSATION_PAGE_SIZE = int(os.getenv("CONVERSATION_PAGE_SIZE", "20"))
+MESSAGE_PAGE_SIZE = int(os.getenv("MESSAGE_PAGE_SIZE", "50"))
+MAX_PAGE_SIZE = 200
+
+
+class ChatContext(NamedTuple):
+    """What the model is given about the conversation so far"""
+    summary: Optional[str]
+    messages: List[Dict[str, Any]]
+
+
+class Page(NamedTuple):
+    """One page of a listing, next_cursor is None on the last one"""
+    items: List[Dict[str, Any]]
+    next_cursor: Optional[str]
+
+
+def encode_cursor(at: datetime, row_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{at.isoformat()}|{row_id}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """(timestamp, id) of a cursor, ValueError if it is malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        at, row_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(at), int(row_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def _entry(message: Message) -> Dict[str, Any]:
+    entry = {"id": message.id, "role": message.role, "content": message.content, "created_at": message.created_at}
+    entry["tokens"] = message_tokens(entry)
+    return entry
+
+
+class HistoryCache:
+    """LRU of the latest messages of active conversations"""
+
+    def __init__(self, max_conversations: int = HISTORY_CACHE_SIZE, ttl: float = HISTORY_CACHE_TTL_SECONDS):
+        self.max_conversations = max_conversations
+        self.ttl = ttl
+        # conversation_id -> (user_id, loaded_at, summary, deque of entries)
+        self._items: "OrderedDict[int, Tuple[str, float, Optional[str], deque]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def get(self, conversation_id: int) -> Optional[Tuple[str, ChatContext]]:
+        with self._lock:
+            item = self._items.get(conversation_id)
+            if item is None or time.monotonic() - item[1] > self.ttl:
+                self._items.pop(conversation_id, None)
+                self.stats['misses'] += 1
+                return None
+            self._items.move_to_end(conversation_id)
+            self.stats['hits'] += 1
+            return item[0], ChatContext(item[2], list(item[3]))
+
+    def put(self, conversation_id: int, user_id: str, summary: Optional[str], entries: List[Dict[str, Any]]):
+        with self._lock:
+            self._items[conversation_id] = (
+                user_id, time.monotonic(), summary, deque(entries, maxlen=HISTORY_MAX_MESSAGES)
+            )
+            self._items.move_to_end(conversation_id)
+            while len(self._items) > self.max_conversations:
+                self._items.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def append(self, conversation_id: int, entries: List[Dict[str, Any]]):
+        """Add committed messages to a cached conversation (no-op if not cached)"""
+        with self._lock:
+            item = self._items.get(conversation_id)
+            if item is not None:
+                item[3].extend(entries)
+                self._items.move_to_end(conversation_id)
+
+    def discard(self, conversation_id: int):
+        with self._lock:
+            self._items.pop(conversation_id, None)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, 'conversations': len(self._items)}
+
+
+history_cache = HistoryCache()
+
+
+def get_conversation(user_id: str, conversation_id: int) -> Optional[Conversation]:
+    """Conversation owned by user_id, or None"""
+    with Session(engine) as session:
+        conversation = session.get(Conversation, conversation_id)
+        if conversation and conversation.user_id == user_id:
+            return conversation
+        return None
+
+
+def _within_budget(context: ChatContext, token_budget: int) -> ChatContext:
+    """Summary plus as many recent messages as fit in what it leaves"""
+    remaining = token_budget - count_tokens(context.summary or "")
+    return ChatContext(context.summary, fit_latest(context.messages, max(0, remaining)))
+
+
+def load_context(
+    user_id: str,
+    conversation_id: Optional[int],
+    token_budget: int = HISTORY_TOKEN_BUDGET
+) -> ChatContext:
+    """Summary and latest unsummarized messages (oldest first), within the token budget"""
+    if conversation_id is None:
+        return ChatContext(None, [])
+
+    cached = history_cache.get(conversation_id)
+    if cached is not None:
+        owner, context = cached
+        return _within_budget(context, token_budget) if owner == user_id else ChatContext(None, [])
+
+    with Session(engine) as session:
+        conversation = session.get(Conversation, conversation_id)
+        if not conversation or conversation.user_id != user_id:
+            return ChatContext(None, [])
+        statement = (
+            select(Message)
+            .where(Message.conversation_id == conversation_id)
+            .order_by(Message.created_at.desc(), Message.id.desc())
+            .limit(HISTORY_MAX_MESSAGES)
+        )
+        if conversation.summarized_through is not None:
+            statement = statement.where(Message.id > conversation.summarized_through)
+        entries = [_entry(message) for message in reversed(session.exec(statement).all())]
+        summary = conversation.summary
+
+    history_cache.put(conversation_id, user_id, summary, entries)
+    return _within_budget(ChatContext(summary, entries), token_budget)
+
+
+def unsummarized_messages(
+    conversation_id: int, limit: int
+) -> Tuple[Optional[str], Optional[int], List[Dict[str, Any]]]:
+    """Current summary, its last message id and the oldest `limit` messages after it (oldest first)"""
+    with Session(engine) as session:
+        conversation = session.get(Conversation, conversation_id)
+        if not conversation:
+            return None, None, []
+        statement = (
+            select(Message)
+            .where(Message.conversation_id == conversation_id)
+            .order_by(Message.created_at, Message.id)
+            .limit(limit)
+        )
+        if conversation.summarized_through is not None:
+            statement = statement.where(Message.id > conversation.summarized_through)
+        entries = [_entry(message) for message in session.exec(statement).all()]
+        return conversation.summary, conversation.summarized_through, entries
+
+
+def save_summary(conversation_id: int, summary: str, summarized_through: int, previous_through: Optional[int]) -> bool:
+    """Store a new rolling summary unless another worker already moved it on"""
+    with Session(engine) as session:
+        conversation = session.get(Conversation, conversation_id, with_for_update=True)
+        if conversation is None or conversation.summarized_through != previous_through:
+            return False
+        conversation.summary = summary
+        conversation.summarized_through = summarized_through
+        session.add(conversation)
+        session.commit()
+    history_cache.discard(conversation_id)
+    return True
+
+
+def save_exchange(
+    session: Session,
+    user_id: str,
+    conversation_id: Optional[int],
+    user_message: str,
+    assistant_message: str
+) -> Tuple[int, List[Message]]:
+    """
+    Add a user message and the assistant reply to the session.
+
+    Starts a new conversation when conversation_id is None. Nothing is
+    committed: the caller commits together with the turn's tool side
+    effects, then calls remember_exchange().
+    Returns (conversation_id, [user message, assistant message]).
+    """
+    now = datetime.now()
+    conversation = session.get(Conversation, conversation_id) if conversation_id else None
+    if conversation is None or conversation.user_id != user_id:
+        conversation = Conversation(user_id=user_id, created_at=now, message_count=2)
+    else:
+        # Incremented in SQL, concurrent turns of a conversation do not lose counts
+        conversation.message_count = Conversation.message_count + 2
+    conversation.updated_at = now
+    session.add(conversation)
+    session.flush()
+
+    messages = [
+        Message(conversation_id=conversation.id, user_id=user_id, role="user",
+                content=user_message, created_at=now),
+        Message(conversation_id=conversation.id, user_id=user_id, role="assistant",
+                content=assistant_message, created_at=datetime.now()),
+    ]
+    session.add_all(messages)
+    session.flush()
+    return conversation.id, messages
+
+
+def remember_exchange(conversation_id: int, messages: List[Message]):
+    """Add committed messages to the history cache (and the dev search index)"""
+    history_cache.append(conversation_id, [_entry(message) for message in messages])
+    if chat_search.CHAT_SEARCH_BACKEND == "memory":
+        chat_search.message_index.add(messages)
+    logger.info(f"💾 Saved exchange in conversation {conversation_id}")
+
+
+def _page_size(limit: int) -> int:
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def list_conversations(user_id: str, limit: int = CONVERSATION_PAGE_SIZE, before: Optional[str] = None) -> Page:
+    """User's conversations, most recently active first, older ones after the cursor"""
+    limit = _page_size(limit)
+    with Session(engine) as session:
+        statement = (
+            select(Conversation)
+            .where(Conversation.user_id == user_id)
+            .order_by(Conversation.updated_at.desc(), Conversation.id.desc())
+            .limit(limit + 1)
+        )
+        if before:
+            statement = statement.where(tuple_(Conversation.updated_at, Conversation.id) < decode_cursor(before))
+        rows = session.exec(statement).all()
+
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return Page(
+        [
+            {
+                "id": conversation.id,
+                "created_at": conversation.created_at,
+                "updated_at": conversation.updated_at,
+                "message_count": conversation.message_count
+            }
+            for conversation in rows
+        ],
+        encode_cursor(rows[-1].updated_at, rows[-1].id) if more else None
+    )
+
+
+def get_messages(
+    user_id: str,
+    conversation_id: int,
+    limit: int = MESSAGE_PAGE_SIZE,
+    before: Optional[str] = None,
+    after: Optional[str] = None
+) -> Optional[Page]:
+    """
+    A page of a conversation's messages in order, None if it is not the user's.
+
+    By default the latest messages, with before the ones preceding that
+    cursor (next_cursor pages further back, None at the start), with
+    after the ones following it (next_cursor is the last one returned,
+    to poll from).
+    """
+    limit = _page_size(limit)
+    forward = after is not None
+    key = tuple_(Message.created_at, Message.id)
+    with Session(engine) as session:
+        conversation = session.get(Conversation, conversation_id)
+        if not conversation or conversation.user_id != user_id:
+            return None
+        statement = select(Message).where(Message.conversation_id == conversation_id).limit(limit + 1)
+        if forward:
+            statement = statement.where(key > decode_cursor(after)).order_by(Message.created_at, Message.id)
+        else:
+            statement = statement.order_by(Message.created_at.desc(), Message.id.desc())
+            if before:
+                statement = statement.where(key < decode_cursor(before))
+        rows = session.exec(statement).all()
+
+    more = len(rows) > limit
+    rows = rows[:limit]
+    # Where the next page starts: the last row in the direction of travel
+    cursor = encode_cursor(rows[-1].created_at, rows[-1].id) if rows and (more or forward) else None
+    if not forward:
+        rows.reverse()
+    return Page(
+        [{"id": m.id, "role": m.role, "content": m.content, "created_at": m.created_at} for m in rows],
+        cursor
+    )
@@ -0,0 +1,149 @@
+"""
+Conversation Summary
+Keeps a rolling summary per conversation so prompts stop growing with it
+
+After each turn, once the messages not yet summarized exceed
+HISTORY_TOKEN_BUDGET, the oldest of them are folded into the
+conversation's summary and only the recent tail (SUMMARY_KEEP_TOKENS)
+stays verbatim. Each run reads the previous summary and at most
+SUMMARY_CHUNK_MESSAGES + HISTORY_MAX_MESSAGES messages, and folds at most
+SUMMARY_CHUNK_MESSAGES / SUMMARY_CHUNK_TOKENS of them, so the cost is
+bounded however long the chat is. A conversation further behind (a
+backlog of imported or unsummarized messages) catches up chunk by chunk.
+
+Runs in the background after the reply is sent, at most once at a time
+per conversation. The agent's summarize() is used when it has one (an
+LLM call), otherwise or on failure a short extractive summary is built.
+"""
+
+import asyncio
+import logging
+import os
+from typing import Any, Dict, List, Optional, Set
+
+import conversation_store
+from conversation_store import HISTORY_MAX_MESSAGES
+from token_budget import HISTORY_TOKEN_BUDGET, count_tokens
+from usage_metrics import new_usage, usage_ledger
+
+logger = logging.getLogger(__name__)
+
+# Unsummarized tokens kept verbatim after a summarization run
+SUMMARY_KEEP_TOKENS = int(os.getenv("SUMMARY_KEEP_TOKENS", str(HISTORY_TOKEN_BUDGET // 2)))
+SUMMARY_MAX_TOKENS = int(os.getenv("SUMMARY_MAX_TOKENS", "300"))
+# Messages (and their tokens) folded into the summary by one run at most
+SUMMARY_CHUNK_MESSAGES = int(os.getenv("SUMMARY_CHUNK_MESSAGES", "100"))
+SUMMARY_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", str(HISTORY_TOKEN_BUDGET * 2)))
+# Characters of each message kept by the extractive fallback
+EXTRACT_CHARS = 160
+
+
+def split_overflow(messages: List[Dict[str, Any]], keep_tokens: int = SUMMARY_KEEP_TOKENS):
+    """(messages to fold into the summary, messages to keep verbatim)"""
+    kept = 0
+    index = len(messages)
+    while index > 0 and kept + messages[index - 1]["tokens"] <= keep_tokens:
+        index -= 1
+        kept += messages[index]["tokens"]
+    return messages[:index], messages[index:]
+
+
+def oldest_chunk(messages: List[Dict[str, Any]], max_tokens: int = SUMMARY_CHUNK_TOKENS):
+    """The oldest messages within max_tokens (at least one)"""
+    used = 0
+    for index, message in enumerate(messages):
+        used += message["tokens"]
+        if used > max_tokens and index > 0:
+            return messages[:index]
+    return messages
+
+
+def extractive_summary(previous: Optional[str], messages: List[Dict[str, Any]]) -> str:
+    """Previous summary plus the start of each message, newest kept when too long"""
+    lines = [previous] if previous else []
+    for message in messages:
+        text = " ".join(message["content"].split())
+        if len(text) > EXTRACT_CHARS:
+            text = text[:EXTRACT_CHARS].rsplit(" ", 1)[0] + "…"
+        lines.append(f"{message['role']}: {text}")
+    summary = "\n".join(lines)
+    max_chars = SUMMARY_MAX_TOKENS * 4
+    return summary if len(summary) <= max_chars else "…" + summary[-max_chars:]
+
+
+class ConversationSummarizer:
+    """Schedules background summary updates"""
+
+    def __init__(self):
+        self._running: Set[int] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self.stats = {'runs': 0, 'messages_folded': 0, 'fallbacks': 0, 'conflicts': 0}
+
+    def schedule(self, agent, conversation_id: int):
+        """Update the summary after a turn if the window overflowed (non-blocking)"""
+        if conversation_id in self._running:
+            return
+        self._running.add(conversation_id)
+        task = asyncio.get_running_loop().create_task(self._run(agent, conversation_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, agent, conversation_id: int):
+        try:
+            # One chunk per update, until the conversation has caught up
+            while await self.update(agent, conversation_id):
+                pass
+        except Exception as e:
+            logger.error(f"❌ Summarizing conversation {conversation_id} failed: {e}")
+        finally:
+            self._running.discard(conversation_id)
+
+    async def update(self, agent, conversation_id: int) -> bool:
+        """Fold the oldest overflowing messages (one chunk) into the summary, True if it changed"""
+        window = SUMMARY_CHUNK_MESSAGES + HISTORY_MAX_MESSAGES
+        summary, through, messages = await asyncio.to_thread(
+            conversation_store.unsummarized_messages, conversation_id, window
+        )
+        if len(messages) < window:
+            # Every unsummarized message is here: fold what the verbatim tail leaves over
+            if sum(m["tokens"] for m in messages) + count_tokens(summary or "") <= HISTORY_TOKEN_BUDGET:
+                return False
+            folded, _ = split_overflow(messages)
+        else:
+            # More behind: the oldest chunk is older than any history sent verbatim
+            folded = messages[:SUMMARY_CHUNK_MESSAGES]
+        folded = oldest_chunk(folded)
+        if not folded:
+            return False
+
+        new_summary = None
+        if hasattr(agent, "summarize"):
+            usage = new_usage()
+            new_summary = await agent.summarize(summary, folded, SUMMARY_MAX_TOKENS, usage)
+            # Charged to the conversation (and its owner) as background usage
+            usage_ledger.record(None, conversation_id, usage, summary=True)
+        if not new_summary:
+            self.stats['fallbacks'] += 1
+            new_summary = extractive_summary(summary, folded)
+
+        saved = await asyncio.to_thread(
+            conversation_store.save_summary, conversation_id, new_summary, folded[-1]["id"], through
+        )
+        if not saved:
+            self.stats['conflicts'] += 1
+            return False
+
+        self.stats['runs'] += 1
+        self.stats['messages_folded'] += len(folded)
+        logger.info(
+            f"📝 Folded {len(folded)} messages into the summary of conversation {conversation_id} "
+            f"({count_tokens(new_summary)} tokens)"
+        )
+        return True
+
+    def metrics(self) -> Dict[str, Any]:
+        return {**self.stats, 'running': len(self._running)}
+
+
+# Shared summarizer used by the chat endpoints
+summarizer = ConversationSummarizer()
@@ -21,11 +21,24 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL environment variable not set")
 
+# Log every SQL statement (development only, it is slow and noisy)
+DATABASE_ECHO = os.getenv("DATABASE_ECHO", "false").lower() in ("1", "true", "yes")
+# Connections kept open per process, and extra ones opened under load
+DATABASE_POOL_SIZE = int(os.getenv("DATABASE_POOL_SIZE", "5"))
+DATABASE_MAX_OVERFLOW = int(os.getenv("DATABASE_MAX_OVERFLOW", "10"))
+
+# SQLite keeps its own pool classes, which take no size
+pool_options = {} if DATABASE_URL.startswith("sqlite") else {
+    "pool_size": DATABASE_POOL_SIZE,
+    "max_overflow": DATABASE_MAX_OVERFLOW,
+}
+
 # Create engine
 engine = create_engine(
     DATABASE_URL,
-    echo=True,  # Set to False in production
+    echo=DATABASE_ECHO,
     pool_pre_ping=True,  # Verify connections before using
+    **pool_options
 )
 
 
@@ -0,0 +1,248 @@
+"""
+Fake OpenAI
+Local stand-in for the OpenAI chat completions API, for load tests
+
+Serves POST /v1/chat/completions, plain and streamed (SSE chunks like
+the real API), so the real AIAgent runs unchanged against it with
+OPENAI_BASE_URL pointing here. No model is involved:
+
+- Latency: the time to the first token is drawn from a distribution
+  (FAKE_OPENAI_LATENCY), then every token takes
+  FAKE_OPENAI_TOKEN_INTERVAL_MS. A plain response is sent when all of
+  its tokens would have been generated.
+- Tool calls: the last user message is matched against a script of
+  rules, each match becomes a tool call (streamed in fragments). Once
+  the tool results come back, the reply is a short text. Messages that
+  match no rule get FAKE_OPENAI_REPLY_TOKENS words of text.
+- Errors: FAKE_OPENAI_ERROR_RATE of the requests fail with a 503.
+
+Latency specs: "fixed:MS", "uniform:LOW_MS,HIGH_MS", "normal:MEAN_MS,STDDEV_MS"
+or "lognormal:MEDIAN_MS,SIGMA". A script is a JSON list of
+{"pattern": regex, "tool": name, "arguments": {key: template}}, the
+templates are filled with the pattern's named groups.
+
+Usage:
+    python fake_openai.py [--port 8901] [--latency lognormal:800,0.4] [--script rules.json]
+    OPENAI_BASE_URL=http://127.0.0.1:8901/v1 OPENAI_API_KEY=sk-fake uvicorn main:app
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
+
+FAKE_OPENAI_LATENCY = os.getenv("FAKE_OPENAI_LATENCY", "lognormal:600,0.4")
+FAKE_OPENAI_TOKEN_INTERVAL_MS = float(os.getenv("FAKE_OPENAI_TOKEN_INTERVAL_MS", "15"))
+FAKE_OPENAI_REPLY_TOKENS = int(os.getenv("FAKE_OPENAI_REPLY_TOKENS", "30"))
+FAKE_OPENAI_ERROR_RATE = float(os.getenv("FAKE_OPENAI_ERROR_RATE", "0"))
+FAKE_OPENAI_SCRIPT = os.getenv("FAKE_OPENAI_SCRIPT")
+
+# Phrasings the local intent parser leaves to the model
+DEFAULT_SCRIPT = [
+    {"pattern": r"remember to (?P<title>[^,.;]+)", "tool": "add_task", "arguments": {"title": "{title}"}},
+    {"pattern": r"what(?:'s| is) (?:still )?(?:left|pending)", "tool": "list_tasks", "arguments": {"completed": False}},
+    {"pattern": r"anything about (?P<query>[^,.;?]+)", "tool": "list_tasks", "arguments": {"query": "{query}"}},
+    {"pattern": r"i (?:finished|did) (?P<task>[^,.;]+)", "tool": "complete_task", "arguments": {"task": "{task}"}},
+    {"pattern": r"forget about (?P<task>[^,.;]+)", "tool": "delete_task", "arguments": {"task": "{task}"}},
+]
+
+WORDS = (
+    "sure here is what I found you have a few things on your list today the most urgent one "
+    "is due soon and the rest can wait let me know if you want me to change anything"
+).split()
+
+
+def parse_latency(spec: str) -> Callable[[], float]:
+    """Sampler of a latency spec, in seconds"""
+    kind, _, params = spec.partition(":")
+    values = [float(value) for value in params.split(",") if value]
+    samplers = {
+        "fixed": lambda ms: ms,
+        "uniform": lambda low, high: random.uniform(low, high),
+        "normal": lambda mean, stddev: random.gauss(mean, stddev),
+        "lognormal": lambda median, sigma: random.lognormvariate(0, sigma) * median,
+    }
+    if kind not in samplers:
+        raise ValueError(f"Unknown latency distribution: {spec}")
+    sample = samplers[kind]
+    sample(*values)
+    return lambda: max(0.0, sample(*values)) / 1000
+
+
+def scripted_calls(script: List[Dict[str, Any]], message: str) -> List[Dict[str, Any]]:
+    """Tool calls the script makes for a user message"""
+    calls = []
+    for rule in script:
+        for match in re.finditer(rule["pattern"], message, re.IGNORECASE):
+            groups = {name: value.strip() for name, value in match.groupdict().items() if value}
+            arguments = {
+                key: value.format(**groups) if isinstance(value, str) else value
+                for key, value in rule.get("arguments", {}).items()
+            }
+            calls.append({"id": f"call_{uuid.uuid4().hex[:12]}", "name": rule["tool"], "arguments": json.dumps(arguments)})
+    return calls
+
+
+class FakeOpenAI:
+    """Scripted chat completions with simulated latency"""
+
+    def __init__(
+        self,
+        latency: str = FAKE_OPENAI_LATENCY,
+        token_interval_ms: float = FAKE_OPENAI_TOKEN_INTERVAL_MS,
+        reply_tokens: int = FAKE_OPENAI_REPLY_TOKENS,
+        error_rate: float = FAKE_OPENAI_ERROR_RATE,
+        script: Optional[List[Dict[str, Any]]] = None
+    ):
+        self.first_token = parse_latency(latency)
+        self.token_interval = token_interval_ms / 1000
+        self.reply_tokens = reply_tokens
+        self.error_rate = error_rate
+        self.script = DEFAULT_SCRIPT if script is None else script
+        self.in_flight = 0
+        self.stats = {'requests': 0, 'streamed': 0, 'tool_calls': 0, 'errors': 0, 'max_in_flight': 0}
+
+    def reply(self, body: Dict[str, Any]):
+        """Text or tool calls answering the last message"""
+        last = body["messages"][-1]
+        if last["role"] == "user" and body.get("tools") and body.get("tool_choice") != "none":
+            calls = scripted_calls(self.script, last.get("content") or "")
+            if calls:
+                self.stats['tool_calls'] += len(calls)
+                return None, calls
+        if last["role"] == "tool":
+            done = [m for m in body["messages"] if m["role"] == "tool"]
+            return f"Done, {len(done)} change{'s' if len(done) != 1 else ''} applied.", []
+        return " ".join(WORDS[i % len(WORDS)] for i in range(self.reply_tokens)), []
+
+    @staticmethod
+    def usage(body: Dict[str, Any], completion_tokens: int) -> Dict[str, int]:
+        prompt = sum(len(json.dumps(m.get("content") or "")) for m in body["messages"]) // 4
+        return {"prompt_tokens": prompt, "completion_tokens": completion_tokens, "total_tokens": prompt + completion_tokens}
+
+    async def complete(self, body: Dict[str, Any]):
+        self.stats['requests'] += 1
+        self.in_flight += 1
+        self.stats['max_in_flight'] = max(self.stats['max_in_flight'], self.in_flight)
+        if random.random() < self.error_rate:
+            self.in_flight -= 1
+            self.stats['errors'] += 1
+            return JSONResponse({"error": {"message": "Injected failure", "type": "server_error"}}, status_code=503)
+
+        text, calls = self.reply(body)
+        tokens = text.split(" ") if text else [json.dumps(c) for c in calls]
+        base = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "created": int(time.time()), "model": body.get("model", "gpt-3.5-turbo")}
+        if body.get("stream"):
+            self.stats['streamed'] += 1
+            return StreamingResponse(self._chunks(base, text, calls), media_type="text/event-stream")
+
+        try:
+            await asyncio.sleep(self.first_token() + self.token_interval * len(tokens))
+        finally:
+            self.in_flight -= 1
+        message = {"role": "assistant", "content": text}
+        if calls:
+            message["tool_calls"] = [
+                {"id": c["id"], "type": "function", "function": {"name": c["name"], "arguments": c["arguments"]}}
+                for c in calls
+            ]
+        return {
+            **base,
+            "object": "chat.completion",
+            "choices": [{"index": 0, "message": message, "finish_reason": "tool_calls" if calls else "stop"}],
+            "usage": self.usage(body, len(tokens)),
+        }
+
+    async def _chunks(self, base: Dict[str, Any], text: Optional[str], calls: List[Dict[str, Any]]):
+        def chunk(delta: Dict[str, Any], finish: Optional[str] = None) -> str:
+            payload = {**base, "object": "chat.completion.chunk",
+                       "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+            return f"data: {json.dumps(payload)}\n\n"
+
+        try:
+            await asyncio.sleep(self.first_token())
+            yield chunk({"role": "assistant", "content": ""})
+            for index, call in enumerate(calls):
+                # Name first, the arguments in two fragments, like the real API
+                arguments = call["arguments"]
+                half = len(arguments) // 2
+                yield chunk({"tool_calls": [{"index": index, "id": call["id"], "type": "function",
+                                             "function": {"name": call["name"], "arguments": ""}}]})
+                for fragment in (arguments[:half], arguments[half:]):
+                    await asyncio.sleep(self.token_interval)
+                    yield chunk({"tool_calls": [{"index": index, "function": {"arguments": fragment}}]})
+            for i, word in enumerate(text.split(" ") if text else []):
+                if i:
+                    await asyncio.sleep(self.token_interval)
+                yield chunk({"content": word if i == 0 else " " + word})
+            yield chunk({}, "tool_calls" if calls else "stop")
+            yield "data: [DONE]\n\n"
+        finally:
+            self.in_flight -= 1
+
+
+def create_app(fake: Optional[FakeOpenAI] = None) -> FastAPI:
+    if fake is None:
+        script = None
+        if FAKE_OPENAI_SCRIPT:
+            with open(FAKE_OPENAI_SCRIPT) as f:
+                script = json.load(f)
+        fake = FakeOpenAI(script=script)
+    app = FastAPI(title="Fake OpenAI")
+    app.state.fake = fake
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(body: Dict[str, Any]):
+        return await fake.complete(body)
+
+    @app.get("/v1/models")
+    def models():
+        return {"object": "list", "data": [{"id": "gpt-3.5-turbo", "object": "model", "owned_by": "fake"}]}
+
+    @app.get("/stats")
+    def stats():
+        return {**fake.stats, 'in_flight': fake.in_flight}
+
+    @app.post("/stats/reset")
+    def reset_stats():
+        fake.stats.update(dict.fromkeys(fake.stats, 0))
+        return {"status": "reset"}
+
+    return app
+
+
+app = create_app()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--latency", default=FAKE_OPENAI_LATENCY)
+    parser.add_argument("--token-interval-ms", type=float, default=FAKE_OPENAI_TOKEN_INTERVAL_MS)
+    parser.add_argument("--reply-tokens", type=int, default=FAKE_OPENAI_REPLY_TOKENS)
+    parser.add_argument("--error-rate", type=float, default=FAKE_OPENAI_ERROR_RATE)
+    parser.add_argument("--script", default=FAKE_OPENAI_SCRIPT)
+    args = parser.parse_args()
+
+    script = None
+    if args.script:
+        with open(args.script) as f:
+            script = json.load(f)
+
+    import uvicorn
+    fake = FakeOpenAI(args.latency, args.token_interval_ms, args.reply_tokens, args.error_rate, script)
+    print(f"🤖 Fake OpenAI on http://{args.host}:{args.port}/v1 (latency {args.latency})")
+    uvicorn.run(create_app(fake), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
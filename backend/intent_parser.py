@@ -0,0 +1,116 @@
+"""
+Intent Parser
+Deterministic fast path for simple chat commands
+
+"add task: X", "show my pending tasks", "mark task 3 as done" and
+"delete task 3" make up most chat traffic. They are recognised by a single
+compiled regex and executed directly through MCPServer tools, without an
+LLM round trip. Anything the pattern does not match in full is left to the
+model, so a partial or ambiguous match never takes the fast path.
+"""
+
+import logging
+import re
+from collections import namedtuple
+from typing import Any, Dict, List, Optional
+from sqlmodel import Session
+
+from mcp_server import MCPServer
+
+logger = logging.getLogger(__name__)
+
+Intent = namedtuple("Intent", "tool arguments")
+
+_TASK_REF = r"(?:task|todo|item)\s*(?:number\s*|no\.?\s*|#\s*)?"
+_STATUS_WORDS = {
+    "pending": "pending", "open": "pending", "incomplete": "pending", "unfinished": "pending",
+    "completed": "completed", "complete": "completed", "done": "completed", "finished": "completed",
+    "all": "all",
+}
+
+# One alternative per command form, the named group that matched is the
+# intent. Matched with fullmatch against the whole (normalised) message.
+_PATTERN = re.compile(
+    r"(?:please\s+|can\s+you\s+|could\s+you\s+)?(?:"
+    # add task: buy milk / create a new task - buy milk
+    r"(?P<add>(?:add|create|new)(?:\s+a)?(?:\s+new)?\s+(?:task|todo)\s*[:\-]\s*(?P<add_title>\S.*))"
+    # add buy milk to my list
+    r"|(?P<add_to_list>add\s+(?P<add_list_title>\S.*?)\s+to\s+my\s+(?:todo\s+|task\s+)?list)"
+    # show my pending tasks / list completed todos / what are my tasks
+    r"|(?P<list>(?:show|list|display|view|get|what\s+are)(?:\s+me)?(?:\s+all)?(?:\s+of)?(?:\s+my)?"
+    r"(?:\s+(?P<list_status>pending|open|incomplete|unfinished|completed|complete|done|finished|all))?"
+    r"\s+(?:tasks|todos|todo\s+list|task\s+list|list))"
+    # what's on my list
+    r"|(?P<list_all>what(?:'s|\s+is)\s+on\s+my\s+(?:todo\s+|task\s+)?list)"
+    # mark task 3 as done / set task #3 complete
+    r"|(?P<complete>(?:mark|set)\s+" + _TASK_REF + r"(?P<complete_id>\d+)\s+(?:as\s+)?(?:done|complete|completed|finished))"
+    # complete task 3 / finish task 3 / done with task 3
+    r"|(?P<complete_verb>(?:complete|finish|done\s+with)\s+" + _TASK_REF + r"(?P<complete_verb_id>\d+))"
+    # delete task 3 / remove task #3
+    r"|(?P<delete>(?:delete|remove)\s+" + _TASK_REF + r"(?P<delete_id>\d+))"
+    r")",
+    re.IGNORECASE
+)
+
+
+def _normalize(message: str) -> str:
+    return re.sub(r"\s+", " ", message).strip().rstrip(".!?").strip()
+
+
+def parse(message: str) -> Optional[Intent]:
+    """Intent of a message, or None when it should go to the LLM"""
+    text = _normalize(message)
+    match = _PATTERN.fullmatch(text)
+    if not match:
+        return None
+
+    groups = match.groupdict()
+    if groups["add"] or groups["add_to_list"]:
+        title = (groups["add_title"] or groups["add_list_title"]).strip()
+        # "add task: x and delete task 2" is more than one command
+        if re.search(r"\b(?:and|then)\s+(?:add|delete|remove|complete|mark|show|list)\b", title, re.IGNORECASE):
+            return None
+        return Intent("add_task", {"title": title})
+    if groups["list"] or groups["list_all"]:
+        status = _STATUS_WORDS.get((groups["list_status"] or "all").lower(), "all")
+        return Intent("list_tasks", {"status": status})
+    if groups["complete"] or groups["complete_verb"]:
+        return Intent("complete_task", {"task_id": int(groups["complete_id"] or groups["complete_verb_id"]), "completed": True})
+    if groups["delete"]:
+        return Intent("delete_task", {"task_id": int(groups["delete_id"])})
+    return None
+
+
+def _format_tasks(tasks: List[Dict[str, Any]], status: str) -> str:
+    label = {"pending": "pending ", "completed": "completed "}.get(status, "")
+    if not tasks:
+        return f"You have no {label}tasks."
+    lines = [f"📋 Your {label}tasks:", ""]
+    for task in tasks:
+        mark = "✅" if task["completed"] else "⏳"
+        lines.append(f"#{task['id']} {task['title']} {mark}")
+    lines.append("")
+    lines.append(f"Total: {len(tasks)}")
+    return "\n".join(lines)
+
+
+def reply_for(intent: Intent, result: Dict[str, Any]) -> str:
+    """User-facing text for a tool result"""
+    if result.get("status") == "error":
+        return f"I couldn't find task #{result['task_id']}. Say \"show my tasks\" to see their numbers."
+    if intent.tool == "add_task":
+        return f"✅ Added task #{result['task_id']}: **{result['title']}**"
+    if intent.tool == "list_tasks":
+        return _format_tasks(result["tasks"], intent.arguments["status"])
+    if intent.tool == "complete_task":
+        return f"🎉 Marked task #{result['task_id']} **{result['title']}** as completed!"
+    if intent.tool == "delete_task":
+        return f"🗑️ Deleted task #{result['task_id']}: **{result['title']}**"
+    return "Done."
+
+
+def execute(intent: Intent, user_id: str, mcp: MCPServer, session: Optional[Session] = None) -> Dict[str, Any]:
+    """Run the intent's MCP tool (blocking, database work), returns the tool result"""
+    result = mcp.tools[intent.tool](user_id=user_id, session=session, **intent.arguments)
+    logger.info(f"⚡ Local intent {intent.tool} for user {user_id}")
+    return result
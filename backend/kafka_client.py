@@ -0,0 +1,36 @@
+"""
+Kafka Client Factory
+Creates producers and consumers for the configured Kafka backend
+
+KAFKA_BACKEND=kafka (default) uses kafka-python against a real broker.
+KAFKA_BACKEND=memory uses the in-process broker in memory_broker.py, for
+tests, benchmarks and machines without Kafka. Both take kafka-python's
+KafkaProducer/KafkaConsumer arguments.
+"""
+
+import os
+
+KAFKA_BACKEND = os.getenv("KAFKA_BACKEND", "kafka")
+BOOTSTRAP_SERVERS = os.getenv("KAFKA_BOOTSTRAP_SERVERS", "localhost:9092")
+
+
+def create_producer(**configs):
+    """KafkaProducer for the configured backend"""
+    if KAFKA_BACKEND == "memory":
+        from memory_broker import MemoryProducer
+        return MemoryProducer(**configs)
+
+    from kafka import KafkaProducer
+    configs.setdefault('bootstrap_servers', BOOTSTRAP_SERVERS)
+    return KafkaProducer(**configs)
+
+
+def create_consumer(*topics, **configs):
+    """KafkaConsumer for the configured backend"""
+    if KAFKA_BACKEND == "memory":
+        from memory_broker import MemoryConsumer
+        return MemoryConsumer(*topics, **configs)
+
+    from kafka import KafkaConsumer
+    configs.setdefault('bootstrap_servers', BOOTSTRAP_SERVERS)
+    return KafkaConsumer(*topics, **configs)
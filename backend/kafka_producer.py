@@ -1,39 +1,162 @@
 """
 Kafka Producer Service
 Publishes events to Kafka topics
+
+The broker connection is made by a background thread, so importing this
+module or starting the API never waits for Kafka. A circuit breaker stops
+sending while the broker is down: fire-and-forget events are kept in a
+bounded local buffer and flushed in order once the broker is back, while
+publish()/publish_reminder() fail fast so callers can retry on their own.
 """
 
-from kafka import KafkaProducer
 import json
 import logging
+import os
+import threading
+from collections import deque
 from datetime import datetime
+from circuit_breaker import CircuitBreaker
+from kafka_client import BOOTSTRAP_SERVERS, create_producer
 
 logger = logging.getLogger(__name__)
 
+# Events kept while the broker is down, the oldest are dropped beyond this
+BUFFER_SIZE = int(os.getenv("KAFKA_BUFFER_SIZE", "10000"))
+SEND_TIMEOUT_SECONDS = float(os.getenv("KAFKA_SEND_TIMEOUT_SECONDS", "10"))
+# Longest a send() may block waiting for broker metadata
+MAX_BLOCK_MS = int(os.getenv("KAFKA_MAX_BLOCK_MS", "2000"))
+DRAIN_BATCH_SIZE = 500
+
+
+def _serialize_key(key):
+    return key if isinstance(key, bytes) else str(key).encode('utf-8')
+
 
 class TodoKafkaProducer:
     """Kafka producer for todo events"""
-    
-    def __init__(self, bootstrap_servers='localhost:9092'):
-        """Initialize Kafka producer"""
+
+    def __init__(self, bootstrap_servers=BOOTSTRAP_SERVERS, **configs):
+        """Initialize Kafka producer (connects lazily, see start())"""
+        self.configs = {
+            'bootstrap_servers': bootstrap_servers,
+            'value_serializer': lambda v: json.dumps(v).encode('utf-8'),
+            'key_serializer': _serialize_key,
+            'acks': 'all',
+            'retries': 3,
+            'max_block_ms': MAX_BLOCK_MS,
+            **configs
+        }
+        self.producer = None
+        self.breaker = CircuitBreaker('Kafka')
+        # (topic, value, key, headers) waiting for the broker, oldest first
+        self.buffer = deque()
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._closed = False
+
+    @property
+    def connected(self) -> bool:
+        return self.producer is not None and self.breaker.state == 'closed'
+
+    def start(self):
+        """Start the background connector (idempotent, never blocks)"""
+        with self._lock:
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name='kafka-producer', daemon=True)
+                self._thread.start()
+
+    def _connect(self):
         try:
-            self.producer = KafkaProducer(
-                bootstrap_servers=bootstrap_servers,
-                value_serializer=lambda v: json.dumps(v).encode('utf-8'),
-                acks='all',
-                retries=3
-            )
+            self.producer = create_producer(**self.configs)
+            self.breaker.record_success()
             logger.info("✅ Kafka producer initialized")
         except Exception as e:
             logger.error(f"❌ Failed to initialize Kafka: {e}")
-            self.producer = None
-    
+            self.breaker.trip()
+
+    def _run(self):
+        """Connect, then flush buffered events whenever the breaker allows"""
+        while not self._closed:
+            if (self.producer is None or self.buffer) and self.breaker.allow():
+                if self.producer is None:
+                    self._connect()
+                if self.producer is not None:
+                    self._drain()
+
+            self._wakeup.wait(timeout=max(0.05, self.breaker.retry_in() or 5.0))
+            self._wakeup.clear()
+
+    def _drain(self):
+        """Send buffered events in order, stopping at the first failure"""
+        while self.buffer and not self._closed:
+            batch = [self.buffer.popleft() for _ in range(min(DRAIN_BATCH_SIZE, len(self.buffer)))]
+            futures = []
+            try:
+                for topic, value, key, headers in batch:
+                    futures.append(self.producer.send(topic, value=value, key=key, headers=headers))
+                for future in futures:
+                    future.get(timeout=SEND_TIMEOUT_SECONDS)
+            except Exception as e:
+                unsent = [item for item, f in zip(batch, futures) if not (f.is_done and f.succeeded())]
+                unsent += batch[len(futures):]
+                self.buffer.extendleft(reversed(unsent))
+                self.breaker.trip()
+                logger.error(f"❌ Failed to flush buffered events ({len(self.buffer)} pending): {e}")
+                return
+            self.breaker.record_success()
+            logger.info(f"📤 Flushed {len(batch)} buffered events")
+
+    def _buffer(self, item):
+        self.buffer.append(item)
+        while len(self.buffer) > BUFFER_SIZE:
+            self.buffer.popleft()
+            self.dropped += 1
+        self._wakeup.set()
+
+    def _on_send_error(self, item, error):
+        logger.error(f"❌ Failed to publish event, buffering: {error}")
+        self.breaker.record_failure()
+        self._buffer(item)
+
+    def send_event(self, topic: str, value: dict, key=None, headers=None) -> bool:
+        """Send without waiting for the ack, returns False if the event was buffered"""
+        self.start()
+        item = (topic, value, key, headers)
+
+        # Queue behind buffered events to keep their order
+        if self.producer is None or self.buffer or not self.breaker.allow():
+            self._buffer(item)
+            return False
+
+        try:
+            future = self.producer.send(topic, value=value, key=key, headers=headers)
+        except Exception as e:
+            self._on_send_error(item, e)
+            return False
+        future.add_callback(lambda _: self.breaker.record_success())
+        future.add_errback(lambda e: self._on_send_error(item, e))
+        return True
+
+    def publish(self, topic: str, value: dict, key=None, headers=None) -> bool:
+        """Publish a raw message, returns True once the broker acked it"""
+        self.start()
+        if self.producer is None or not self.breaker.allow():
+            return False
+
+        try:
+            future = self.producer.send(topic, value=value, key=key, headers=headers)
+            future.get(timeout=SEND_TIMEOUT_SECONDS)
+            self.breaker.record_success()
+            return True
+        except Exception as e:
+            self.breaker.record_failure()
+            logger.error(f"❌ Failed to publish to {topic}: {e}")
+            return False
+
     def publish_task_event(self, event_type: str, task_id: int, user_id: str, task_data: dict):
-        """Publish task event to Kafka"""
-        if not self.producer:
-            logger.warning("⚠️  Kafka producer not available")
-            return
-        
+        """Publish task event to Kafka (buffered while the broker is down)"""
         event = {
             'event_type': event_type,
             'task_id': task_id,
@@ -41,40 +164,49 @@ class TodoKafkaProducer:
             'task_data': task_data,
             'timestamp': datetime.now().isoformat()
         }
-        
-        try:
-            future = self.producer.send('task-events', value=event)
-            future.get(timeout=10)
+
+        # Keyed by task so events of one task stay ordered on one partition
+        if self.send_event('task-events', event, key=str(task_id)):
             logger.info(f"📤 Published {event_type} event for task {task_id}")
-        except Exception as e:
-            logger.error(f"❌ Failed to publish event: {e}")
-    
-    def publish_reminder(self, task_id: int, user_id: str, title: str, due_at: str):
-        """Publish reminder event"""
-        if not self.producer:
-            return
-        
+        else:
+            logger.warning(f"⚠️  Kafka unavailable, buffered {event_type} event for task {task_id}")
+
+    def publish_reminder(self, task_id: int, user_id: str, title: str, due_at: str) -> bool:
+        """Publish reminder.due event, returns True once the broker acked it"""
         event = {
+            'event_type': 'reminder.due',
+            'reminder_id': f"{task_id}:{due_at}",
             'task_id': task_id,
             'user_id': user_id,
             'title': title,
             'due_at': due_at,
             'timestamp': datetime.now().isoformat()
         }
-        
-        try:
-            future = self.producer.send('reminders', value=event)
-            future.get(timeout=10)
+
+        if self.publish('reminders', event, key=user_id):
             logger.info(f"📤 Published reminder for task {task_id}")
-        except Exception as e:
-            logger.error(f"❌ Failed to publish reminder: {e}")
-    
+            return True
+        return False
+
+    def health(self) -> dict:
+        """Connection and circuit breaker state for /health"""
+        return {
+            'connected': self.producer is not None,
+            'circuit': self.breaker.snapshot(),
+            'buffered_events': len(self.buffer),
+            'dropped_events': self.dropped,
+        }
+
     def close(self):
         """Close producer"""
+        self._closed = True
+        self._wakeup.set()
+        if self._thread:
+            self._thread.join(timeout=5)
         if self.producer:
             self.producer.close()
             logger.info("⏹️  Kafka producer closed")
 
 
-# Global producer instance
+# Global producer instance (connects in the background on first use)
 kafka_producer = TodoKafkaProducer()
@@ -0,0 +1,376 @@
+"""
+Kafka Retry and Dead-Letter Handling
+Retry topics with backoff, a dead-letter topic and dependency-aware pausing
+
+A message whose handler fails is re-published to the consumer group's next
+retry topic ({group}.retry.1, .retry.2, ...), each with a longer delay, and
+to {group}.dlq once the attempts are used up. Failure metadata travels in
+message headers, so the payload is never rewritten. Retry partitions that
+are not due yet are paused on their own, so the main topic keeps flowing.
+
+Errors that mean a dependency is down (database unreachable, broker not
+acking) do not burn through retries: the consumer pauses every partition,
+rewinds to the failed message and resumes once the health check passes.
+
+Usage (DLQ replay):
+    python kafka_retry.py list recurring-task-service
+    python kafka_retry.py replay recurring-task-service [--limit 100] [--to-source]
+"""
+
+from kafka.structs import OffsetAndMetadata, TopicPartition
+import argparse
+import json
+import logging
+import os
+import time
+import traceback
+from collections import namedtuple
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+from sqlalchemy.exc import DBAPIError, DisconnectionError, OperationalError
+from kafka_client import BOOTSTRAP_SERVERS, create_consumer
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Delay before each retry attempt, one retry topic per entry
+RETRY_DELAYS = [float(s) for s in os.getenv("KAFKA_RETRY_DELAYS", "10,60,360").split(",")]
+# Health check backoff while a dependency is down
+HEALTH_CHECK_MIN_SECONDS = float(os.getenv("KAFKA_HEALTH_CHECK_MIN_SECONDS", "1"))
+HEALTH_CHECK_MAX_SECONDS = float(os.getenv("KAFKA_HEALTH_CHECK_MAX_SECONDS", "60"))
+POLL_TIMEOUT_MS = 1000
+MAX_ERROR_LENGTH = 1000
+
+
+# Stand-in for a consumed message when routing something built from several
+# messages (e.g. a reminder digest)
+FailedMessage = namedtuple('FailedMessage', 'topic partition offset key value headers')
+
+
+class DependencyUnavailable(Exception):
+    """Raised by a handler when a dependency it needs is down"""
+
+
+def is_dependency_failure(error: Exception) -> bool:
+    """True for errors that mean 'try again later', not 'bad message'"""
+    if isinstance(error, (DependencyUnavailable, OperationalError, DisconnectionError)):
+        return True
+    return isinstance(error, DBAPIError) and error.connection_invalidated
+
+
+def retry_topic(group: str, attempt: int) -> str:
+    return f"{group}.retry.{attempt}"
+
+
+def dlq_topic(group: str) -> str:
+    return f"{group}.dlq"
+
+
+def retry_topics(group: str, delays: List[float] = RETRY_DELAYS) -> List[str]:
+    return [retry_topic(group, attempt) for attempt in range(1, len(delays) + 1)]
+
+
+def header(message, name: str, default: Optional[str] = None) -> Optional[str]:
+    """Decoded value of a message header"""
+    for key, value in message.headers or []:
+        if key == name:
+            return value.decode('utf-8') if value is not None else default
+    return default
+
+
+def attempts_of(message) -> int:
+    """Number of failed attempts recorded on a message"""
+    return int(header(message, 'retry-attempt', '0'))
+
+
+def retry_at_of(message) -> float:
+    """Epoch time at which a retried message is due"""
+    return float(header(message, 'retry-at', '0'))
+
+
+class FailureRouter:
+    """Publishes failed messages to the next retry topic or the DLQ"""
+
+    def __init__(self, publish: Callable[..., bool], group: str, delays: List[float] = RETRY_DELAYS):
+        # publish(topic, value, key=None, headers=None) -> True once acked
+        self.publish = publish
+        self.group = group
+        self.delays = delays
+        self.stats = {'retried': 0, 'dead_lettered': 0}
+
+    def route(self, message, error: Exception) -> bool:
+        """Re-publish a failed message, returns False if that failed too"""
+        attempt = attempts_of(message) + 1
+        now = time.time()
+        headers = {
+            'retry-attempt': str(attempt),
+            'original-topic': header(message, 'original-topic', message.topic),
+            'original-partition': header(message, 'original-partition', str(message.partition)),
+            'original-offset': header(message, 'original-offset', str(message.offset)),
+            'first-failed-at': header(message, 'first-failed-at', datetime.fromtimestamp(now).isoformat()),
+            'failed-at': datetime.fromtimestamp(now).isoformat(),
+            'consumer-group': self.group,
+            'error-type': type(error).__name__,
+            'error': str(error)[:MAX_ERROR_LENGTH],
+        }
+
+        if attempt <= len(self.delays):
+            topic = retry_topic(self.group, attempt)
+            headers['retry-at'] = str(now + self.delays[attempt - 1])
+            stat = 'retried'
+        else:
+            topic = dlq_topic(self.group)
+            headers['traceback'] = "".join(traceback.format_exception(type(error), error, error.__traceback__))[-MAX_ERROR_LENGTH:]
+            stat = 'dead_lettered'
+
+        encoded = [(k, v.encode('utf-8')) for k, v in headers.items()]
+        if not self.publish(topic, message.value, key=message.key, headers=encoded):
+            return False
+
+        self.stats[stat] += 1
+        log = logger.warning if stat == 'retried' else logger.error
+        log(f"{'🔁' if stat == 'retried' else '☠️ '} {headers['original-topic']} offset "
+            f"{headers['original-offset']} -> {topic} (attempt {attempt}): {headers['error']}")
+        return True
+
+
+class DependencyGate:
+    """Pauses a consumer while a dependency is unhealthy"""
+
+    def __init__(
+        self,
+        consumer,
+        health_check: Optional[Callable[[], bool]] = None,
+        min_backoff: float = HEALTH_CHECK_MIN_SECONDS,
+        max_backoff: float = HEALTH_CHECK_MAX_SECONDS,
+        clock=time.monotonic,
+    ):
+        self.consumer = consumer
+        # Without a health check the consumer simply retries after the backoff
+        self.health_check = health_check
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.clock = clock
+
+        self.paused = False
+        self.backoff = min_backoff
+        self.next_check = 0.0
+        self.resumed_at = float('-inf')
+        self.pause_count = 0
+
+    def trip(self, error: Exception):
+        """Stop consuming every assigned partition"""
+        now = self.clock()
+        if now - self.resumed_at < self.max_backoff:
+            # Failing again right after a resume: back off further
+            self.backoff = min(self.backoff * 2, self.max_backoff)
+        else:
+            self.backoff = self.min_backoff
+
+        self.paused = True
+        self.pause_count += 1
+        logger.error(f"⏸️  Dependency unavailable, pausing consumption for {self.backoff:.0f}s: {error}")
+        self.consumer.pause(*self.consumer.assignment())
+        self.next_check = now + self.backoff
+
+    def hold(self, records: Dict[object, list]):
+        """Rewind records fetched while paused (e.g. after a rebalance)"""
+        for tp, messages in records.items():
+            self.consumer.seek(tp, messages[0].offset)
+        self.consumer.pause(*self.consumer.assignment())
+
+    def check(self, keep_paused=()) -> bool:
+        """Resume once the dependency is healthy again, returns True if open"""
+        if not self.paused:
+            return True
+        if self.clock() < self.next_check:
+            return False
+
+        try:
+            healthy = self.health_check() if self.health_check else True
+        except Exception:
+            healthy = False
+        if not healthy:
+            self.backoff = min(self.backoff * 2, self.max_backoff)
+            self.next_check = self.clock() + self.backoff
+            return False
+
+        self.paused = False
+        self.resumed_at = self.clock()
+        partitions = [tp for tp in self.consumer.assignment() if tp not in keep_paused]
+        self.consumer.resume(*partitions)
+        logger.info("▶️  Dependency healthy, resuming consumption")
+        return True
+
+
+class ResilientConsumer:
+    """Consumer loop with retry topics, a DLQ and dependency-aware pausing"""
+
+    def __init__(
+        self,
+        consumer,
+        handler: Callable[[dict], None],
+        router: FailureRouter,
+        health_check: Optional[Callable[[], bool]] = None,
+        clock=time.time,
+    ):
+        # The consumer must subscribe to the source topics and retry_topics(group)
+        # with enable_auto_commit=False
+        self.consumer = consumer
+        self.handler = handler
+        self.router = router
+        self.gate = DependencyGate(consumer, health_check)
+        self.clock = clock
+
+        self.retry_topics = set(retry_topics(router.group, router.delays))
+        # Retry partitions waiting for their head message to become due
+        self.delayed: Dict[object, float] = {}
+        self.stats = {'processed': 0, 'failed': 0}
+
+    def resume_due(self):
+        """Resume retry partitions whose head message is due"""
+        if not self.delayed:
+            return
+        now = self.clock()
+        due = [tp for tp, retry_at in self.delayed.items() if retry_at <= now]
+        for tp in due:
+            del self.delayed[tp]
+        if due and not self.gate.paused:
+            self.consumer.resume(*due)
+
+    def process_batch(self, records: Dict[object, list]) -> Dict[object, int]:
+        """Handle one poll result, returns the next offset per partition"""
+        positions: Dict[object, int] = {}
+        pending: List[Tuple[object, list]] = list(records.items())
+
+        while pending:
+            tp, messages = pending.pop(0)
+            for message in messages:
+                if tp.topic in self.retry_topics:
+                    retry_at = retry_at_of(message)
+                    if retry_at > self.clock():
+                        # Not due: rewind and park this partition only
+                        self.consumer.seek(tp, message.offset)
+                        self.consumer.pause(tp)
+                        self.delayed[tp] = retry_at
+                        break
+
+                try:
+                    self.handler(message.value)
+                    self.stats['processed'] += 1
+                except Exception as e:
+                    if is_dependency_failure(e) or not self.router.route(message, e):
+                        # Rewind everything not handled yet and wait for the dependency
+                        self.consumer.seek(tp, message.offset)
+                        for other, rest in pending:
+                            self.consumer.seek(other, rest[0].offset)
+                        self.gate.trip(e)
+                        return positions
+                    self.stats['failed'] += 1
+
+                positions[tp] = message.offset + 1
+
+        return positions
+
+    def poll_once(self, timeout_ms: int = POLL_TIMEOUT_MS):
+        """Poll, handle and commit one batch"""
+        self.resume_due()
+        if not self.gate.check(keep_paused=self.delayed):
+            # Keep polling while paused so the group membership stays alive
+            self.gate.hold(self.consumer.poll(timeout_ms=timeout_ms))
+            return
+
+        records = self.consumer.poll(timeout_ms=timeout_ms)
+        positions = self.process_batch(records)
+        if positions:
+            self.consumer.commit({tp: OffsetAndMetadata(offset, None) for tp, offset in positions.items()})
+
+    def run(self):
+        """Main consumer loop"""
+        while True:
+            self.poll_once()
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            **self.stats,
+            **self.router.stats,
+            'dependency_pauses': self.gate.pause_count,
+            'paused': self.gate.paused,
+            'delayed_partitions': len(self.delayed),
+        }
+
+
+# ----- DLQ replay -----
+
+def _dlq_consumer(group: str, commit: bool):
+    return create_consumer(
+        dlq_topic(group),
+        bootstrap_servers=BOOTSTRAP_SERVERS,
+        group_id=f"{group}.dlq-replay" if commit else None,
+        value_deserializer=lambda v: json.loads(v.decode('utf-8')),
+        auto_offset_reset='earliest',
+        enable_auto_commit=False,
+        consumer_timeout_ms=5000
+    )
+
+
+def list_dlq(group: str, limit: int):
+    """Print the dead-lettered messages of a consumer group"""
+    consumer = _dlq_consumer(group, commit=False)
+    for count, message in enumerate(consumer, start=1):
+        print(f"[{message.partition}:{message.offset}] "
+              f"{header(message, 'original-topic')}@{header(message, 'original-offset')} "
+              f"attempts={header(message, 'retry-attempt')} "
+              f"{header(message, 'error-type')}: {header(message, 'error')}")
+        print(f"    {json.dumps(message.value)[:200]}")
+        if count >= limit:
+            break
+    consumer.close()
+
+
+def replay_dlq(group: str, limit: int, to_source: bool = False) -> int:
+    """Re-publish dead-lettered messages, committing each one once acked"""
+    from kafka_producer import kafka_producer
+
+    consumer = _dlq_consumer(group, commit=True)
+    replayed = 0
+    for message in consumer:
+        # The first retry topic is only read by this group, the source topic by every group
+        topic = header(message, 'original-topic') if to_source else retry_topic(group, 1)
+        headers = [
+            (k, v) for k, v in message.headers or []
+            if k in ('original-topic', 'original-partition', 'original-offset', 'first-failed-at')
+        ]
+        if not kafka_producer.publish(topic, message.value, key=message.key, headers=headers):
+            logger.error("❌ Replay stopped: broker did not ack")
+            break
+
+        consumer.commit({
+            TopicPartition(message.topic, message.partition): OffsetAndMetadata(message.offset + 1, None)
+        })
+        replayed += 1
+        if replayed >= limit:
+            break
+
+    consumer.close()
+    logger.info(f"✅ Replayed {replayed} messages from {dlq_topic(group)}")
+    return replayed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and replay dead-lettered Kafka messages")
+    parser.add_argument("command", choices=["list", "replay"])
+    parser.add_argument("group", help="Consumer group, e.g. recurring-task-service")
+    parser.add_argument("--limit", type=int, default=1000)
+    parser.add_argument("--to-source", action="store_true",
+                        help="Replay to the original topic (seen by every consumer group)")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        list_dlq(args.group, args.limit)
+    else:
+        replay_dlq(args.group, args.limit, args.to_source)
+
+
+if __name__ == "__main__":
+    main()
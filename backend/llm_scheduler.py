@@ -0,0 +1,219 @@
+"""
+LLM Scheduler
+Fair-share admission control in front of the OpenAI calls
+
+At most max_concurrency calls are in flight per worker. Requests beyond
+that wait in per-user queues served by deficit round robin: each waiting
+user gets a quantum of prompt tokens per round, so a user sending many
+(or large) requests cannot push everyone else's out. Interactive
+requests (chat) are always served before background work (conversation
+summaries), which may also hold only a few of the slots.
+
+A request is rejected right away when its user already has
+SCHEDULER_MAX_QUEUED_PER_USER requests waiting (429) or the queue is
+full (503), and after max_wait seconds without a slot (503).
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+PRIORITIES = (INTERACTIVE, BACKGROUND)
+
+# Prompt tokens each waiting user may send per round
+SCHEDULER_QUANTUM_TOKENS = int(os.getenv("SCHEDULER_QUANTUM_TOKENS", "1000"))
+SCHEDULER_MAX_QUEUED = int(os.getenv("SCHEDULER_MAX_QUEUED", "256"))
+SCHEDULER_MAX_QUEUED_PER_USER = int(os.getenv("SCHEDULER_MAX_QUEUED_PER_USER", "4"))
+# Slots background work may hold, the rest stay free for interactive requests
+SCHEDULER_BACKGROUND_SLOTS = int(os.getenv("SCHEDULER_BACKGROUND_SLOTS", "2"))
+
+
+class Rejected(Exception):
+    """A request turned away by admission control"""
+
+    def __init__(self, status_code: int, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ('user_id', 'cost', 'future', 'queued_at')
+
+    def __init__(self, user_id: str, cost: int, future: asyncio.Future):
+        self.user_id = user_id
+        self.cost = cost
+        self.future = future
+        self.queued_at = time.monotonic()
+
+
+class _FairQueue:
+    """Per-user FIFO queues served by deficit round robin"""
+
+    def __init__(self, quantum: int):
+        self.quantum = quantum
+        # Users with waiting requests, in round order
+        self.users: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict()
+        self.deficit: Dict[str, int] = {}
+        self.size = 0
+
+    def push(self, waiter: _Waiter):
+        self.users.setdefault(waiter.user_id, deque()).append(waiter)
+        self.deficit.setdefault(waiter.user_id, 0)
+        self.size += 1
+
+    def remove(self, waiter: _Waiter):
+        waiters = self.users.get(waiter.user_id)
+        if waiters is not None and waiter in waiters:
+            waiters.remove(waiter)
+            self.size -= 1
+            if not waiters:
+                self._drop(waiter.user_id)
+
+    def queued(self, user_id: str) -> int:
+        return len(self.users.get(user_id, ()))
+
+    def _drop(self, user_id: str):
+        # An idle user does not keep its credit (DRR)
+        del self.users[user_id]
+        del self.deficit[user_id]
+
+    def pop(self) -> Optional[_Waiter]:
+        while self.users:
+            user_id, waiters = next(iter(self.users.items()))
+            head = waiters[0]
+            if self.deficit[user_id] < head.cost:
+                # Out of credit for this round: top up and go to the back
+                self.deficit[user_id] += self.quantum
+                self.users.move_to_end(user_id)
+                continue
+            self.deficit[user_id] -= head.cost
+            waiters.popleft()
+            self.size -= 1
+            if waiters:
+                # One request per turn, the credit left carries over
+                self.users.move_to_end(user_id)
+            else:
+                self._drop(user_id)
+            return head
+        return None
+
+
+class FairScheduler:
+    """Concurrency cap with per-user fair queuing and priorities"""
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_wait: float,
+        max_queued: int = SCHEDULER_MAX_QUEUED,
+        max_queued_per_user: int = SCHEDULER_MAX_QUEUED_PER_USER,
+        background_slots: int = SCHEDULER_BACKGROUND_SLOTS,
+        quantum: int = SCHEDULER_QUANTUM_TOKENS
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_wait = max_wait
+        self.max_queued = max_queued
+        self.max_queued_per_user = max_queued_per_user
+        self.background_slots = max(1, min(background_slots, max_concurrency))
+        self.queues = {priority: _FairQueue(quantum) for priority in PRIORITIES}
+        self.in_flight = {priority: 0 for priority in PRIORITIES}
+        self.waits: Dict[str, Deque[float]] = {priority: deque(maxlen=1000) for priority in PRIORITIES}
+        self.stats = {'admitted': 0, 'rejected_user_queue': 0, 'rejected_queue_full': 0,
+                      'rejected_timeout': 0, 'cancelled': 0}
+
+    def _free(self, priority: str) -> bool:
+        if sum(self.in_flight.values()) >= self.max_concurrency:
+            return False
+        return priority == INTERACTIVE or self.in_flight[BACKGROUND] < self.background_slots
+
+    def _dispatch(self):
+        """Hand free slots to waiting requests, interactive first"""
+        for priority in PRIORITIES:
+            queue = self.queues[priority]
+            while queue.size and self._free(priority):
+                waiter = queue.pop()
+                self._grant(priority, waiter)
+
+    def _grant(self, priority: str, waiter: _Waiter):
+        self.in_flight[priority] += 1
+        self.stats['admitted'] += 1
+        self.waits[priority].append(time.monotonic() - waiter.queued_at)
+        if waiter.future is not None:
+            waiter.future.set_result(None)
+
+    def _reject(self, reason: str, status_code: int) -> Rejected:
+        self.stats[f'rejected_{reason}'] += 1
+        logger.warning(f"⚠️  LLM request rejected: {reason}")
+        return Rejected(status_code, reason, retry_after=max(1.0, self.max_wait / 2))
+
+    async def acquire(self, user_id: str, priority: str = INTERACTIVE, cost: int = 1):
+        """Wait for a slot, raises Rejected when the request is turned away"""
+        queue = self.queues[priority]
+        if not queue.size and self._free(priority):
+            self._grant(priority, _Waiter(user_id, cost, None))
+            return
+        if queue.queued(user_id) >= self.max_queued_per_user:
+            raise self._reject('user_queue', 429)
+        if sum(q.size for q in self.queues.values()) >= self.max_queued:
+            raise self._reject('queue_full', 503)
+
+        waiter = _Waiter(user_id, max(1, cost), asyncio.get_running_loop().create_future())
+        queue.push(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout=self.max_wait)
+        except asyncio.TimeoutError:
+            if waiter.future.done():
+                return
+            queue.remove(waiter)
+            waiter.future.cancel()
+            raise self._reject('timeout', 503)
+        except asyncio.CancelledError:
+            if waiter.future.done():
+                # Granted just as the caller went away: pass the slot on
+                self.release(priority)
+            else:
+                queue.remove(waiter)
+                waiter.future.cancel()
+            self.stats['cancelled'] += 1
+            raise
+
+    def release(self, priority: str = INTERACTIVE):
+        self.in_flight[priority] -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, user_id: str, priority: str = INTERACTIVE, cost: int = 1):
+        """Hold a slot for one call"""
+        await self.acquire(user_id, priority, cost)
+        try:
+            yield
+        finally:
+            self.release(priority)
+
+    def metrics(self) -> Dict[str, Any]:
+        def percentile(values: List[float], q: float) -> Optional[float]:
+            if not values:
+                return None
+            return round(sorted(values)[min(len(values) - 1, int(q * len(values)))] * 1000, 1)
+
+        return {
+            **self.stats,
+            'max_concurrency': self.max_concurrency,
+            'in_flight': dict(self.in_flight),
+            'queued': {priority: queue.size for priority, queue in self.queues.items()},
+            'users_waiting': {priority: len(queue.users) for priority, queue in self.queues.items()},
+            'wait_ms': {
+                priority: {'p50': percentile(list(waits), 0.5), 'p95': percentile(list(waits), 0.95)}
+                for priority, waits in self.waits.items()
+            }
+        }
@@ -0,0 +1,73 @@
+"""
+Event Loop Monitor
+Measures event loop lag: how late a periodic timer callback actually runs
+
+A coroutine sleeps for a fixed interval and records how much later than
+scheduled it woke up. Anything that blocks the loop (a synchronous HTTP or
+database call inside an async endpoint) shows up directly as lag.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+INTERVAL_SECONDS = float(os.getenv("LOOP_MONITOR_INTERVAL_SECONDS", "0.1"))
+# Lag above this is logged as a stall
+STALL_SECONDS = float(os.getenv("LOOP_MONITOR_STALL_SECONDS", "0.5"))
+SAMPLES = 600
+
+
+class EventLoopMonitor:
+    """Samples event loop lag in the background"""
+
+    def __init__(self, interval: float = INTERVAL_SECONDS, stall_threshold: float = STALL_SECONDS):
+        self.interval = interval
+        self.stall_threshold = stall_threshold
+        self.samples: Deque[float] = deque(maxlen=SAMPLES)
+        self.max_lag = 0.0
+        self.stalls = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start sampling on the running loop"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+
+    async def _run(self):
+        while True:
+            scheduled = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.perf_counter() - scheduled)
+            self.samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag >= self.stall_threshold:
+                self.stalls += 1
+                logger.warning(f"⚠️  Event loop blocked for {lag * 1000:.0f}ms")
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Lag percentiles (ms) over the last SAMPLES intervals"""
+        samples = sorted(self.samples)
+        pick = lambda p: round(samples[min(len(samples) - 1, int(len(samples) * p))] * 1000, 2) if samples else 0
+        return {
+            'lag_ms': {
+                'p50': pick(0.50),
+                'p99': pick(0.99),
+                'max_recent': round(samples[-1] * 1000, 2) if samples else 0,
+                'max_since_start': round(self.max_lag * 1000, 2),
+            },
+            'stalls': self.stalls,
+            'samples': len(samples),
+        }
+
+
+# Shared monitor, started by the app on startup
+loop_monitor = EventLoopMonitor()
@@ -4,23 +4,50 @@ Main FastAPI application for Todo App Phase III
 [From]: speckit.plan §2.1
 """
 
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from sqlmodel import Session, select
+from sqlmodel import Session, select, or_, and_
 from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
 from typing import List
+import asyncio
+import json
+import numpy as np
 import os
+import time
 
 from database import engine, get_session, create_db_and_tables
-from models import Task, TaskCreate, TaskUpdate, TaskResponse
-from models import Conversation, Message, ChatRequest, ChatResponse
-from ai_agent import create_ai_agent
+from models import Task, TaskCreate, TaskCreateResponse, TaskUpdate, TaskResponse
+from models import Conversation, Message, ChatRequest, ChatResponse, ConversationInfo, MessageInfo
+from models import ChatSearchResponse, ClassifyRequest, ClassifyResponse
+from ai_agent_broken import create_ai_agent
+from conversation_store import (
+    CONVERSATION_PAGE_SIZE, MAX_PAGE_SIZE, MESSAGE_PAGE_SIZE,
+    get_conversation, get_messages, history_cache, list_conversations, load_context, remember_exchange, save_exchange
+)
+from chat_search import CHAT_SEARCH_MAX_OFFSET, CHAT_SEARCH_PAGE_SIZE, message_index, search as search_messages
+from conversation_summary import summarizer
+from llm_scheduler import Rejected
+from response_cache import response_cache
+from mcp_server import MCPServer
+from priority_classifier import classify_priorities, priority_counts, save_priorities
+from task_index import DUPLICATE_THRESHOLD, task_index
+from tool_executor import ToolExecutor, TurnUnitOfWork
+from usage_metrics import CHAT_DEBUG, new_usage, usage_ledger
+import intent_parser
+from loop_monitor import loop_monitor
+from auth import authorized_socket_user, authorized_user, metrics_operator
+from recurrence import RecurrenceRule, expand
 
 # Get OpenAI API key
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
 # Create AI agent
 ai_agent = create_ai_agent(OPENAI_API_KEY)
+mcp = MCPServer()
+tool_executor = ToolExecutor(mcp)
 
 # Create FastAPI app
 app = FastAPI(title="Todo App API - Phase III", version="1.0.0")
@@ -32,15 +59,31 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Paged listings return their next cursor in a header
+    expose_headers=["X-Next-Cursor"],
 )
 
+@app.exception_handler(Rejected)
+async def llm_rejected(request: Request, exc: Rejected):
+    """Chat request turned away by the LLM scheduler"""
+    return JSONResponse(
+        status_code=exc.status_code,
+        content={"detail": "Too many chat requests, please retry shortly", "reason": exc.reason},
+        headers={"Retry-After": str(int(exc.retry_after))}
+    )
+
 # Startup event
 @app.on_event("startup")
-def on_startup():
+async def on_startup():
     """Initialize database on startup"""
     create_db_and_tables()
     print("✅ Database initialized")
     
+    loop_monitor.start()
+    
+    # Connects in the background, events are buffered until Kafka is reachable
+    kafka_producer.start()
+    
     # Check AI agent status
     if hasattr(ai_agent, 'client') and ai_agent.client:
         print("✅ AI Agent initialized successfully")
@@ -54,17 +97,29 @@ def read_root():
 
 @app.get("/health")
 def health_check():
-    return {"status": "healthy", "service": "todo-api"}
+    return {
+        "status": "healthy",
+        "service": "todo-api",
+        "kafka": kafka_producer.health(),
+        "event_loop": loop_monitor.snapshot(),
+        "ai_agent": ai_agent.metrics() if hasattr(ai_agent, 'metrics') else None,
+        "history_cache": history_cache.metrics(),
+        "response_cache": response_cache.metrics(),
+        "summarizer": summarizer.metrics(),
+        "task_index": task_index.metrics(),
+        "chat_usage": usage_ledger.metrics(),
+        "chat_search": message_index.metrics()
+    }
 
 # Tasks endpoints
-@app.get("/api/{user_id}/tasks", response_model=List[TaskResponse])
+@app.get("/api/{user_id}/tasks", response_model=List[TaskResponse], dependencies=[Depends(authorized_user)])
 def get_tasks(user_id: str, session: Session = Depends(get_session)):
     """Get all tasks for a user"""
     statement = select(Task).where(Task.user_id == user_id)
     tasks = session.exec(statement).all()
     return tasks
 
-@app.get("/api/{user_id}/tasks/{task_id}", response_model=TaskResponse)
+@app.get("/api/{user_id}/tasks/{task_id}", response_model=TaskResponse, dependencies=[Depends(authorized_user)])
 def get_task(user_id: str, task_id: int, session: Session = Depends(get_session)):
     """Get a specific task"""
     task = session.get(Task, task_id)
@@ -72,16 +127,69 @@ def get_task(user_id: str, task_id: int, session: Session = Depends(get_session)
         raise HTTPException(status_code=404, detail="Task not found")
     return task
 
-@app.post("/api/{user_id}/tasks", response_model=TaskResponse)
+@app.post("/api/{user_id}/tasks", response_model=TaskCreateResponse, dependencies=[Depends(authorized_user)])
 def create_task(user_id: str, task: TaskCreate, session: Session = Depends(get_session)):
-    """Create a new task"""
+    """Create a new task, warning about likely duplicates"""
+    duplicates = task_index.similar(
+        user_id, f"{task.title} {task.description}", k=3, min_score=DUPLICATE_THRESHOLD
+    )
     db_task = Task(**task.dict(), user_id=user_id)
     session.add(db_task)
     session.commit()
     session.refresh(db_task)
-    return db_task
+    return TaskCreateResponse(**db_task.model_dump(), possible_duplicates=duplicates)
+
+# Titles (or stored tasks) per classification call
+MAX_CLASSIFY_TITLES = int(os.getenv("MAX_CLASSIFY_TITLES", "50000"))
+
+@app.post("/api/{user_id}/tasks/classify", response_model=ClassifyResponse, dependencies=[Depends(authorized_user)])
+def classify_tasks(user_id: str, request: ClassifyRequest, session: Session = Depends(get_session)):
+    """Suggested priority of many titles, or of the user's stored tasks (optionally saved)"""
+    started = time.perf_counter()
+    if len(request.titles) > MAX_CLASSIFY_TITLES:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_CLASSIFY_TITLES} titles per call")
+    if request.task_ids is not None and len(request.task_ids) > MAX_CLASSIFY_TITLES:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_CLASSIFY_TITLES} task_ids per call")
+    
+    if request.titles:
+        if request.write_back:
+            raise HTTPException(status_code=400, detail="write_back applies to stored tasks, not titles")
+        priorities = classify_priorities(request.titles)
+        return ClassifyResponse(
+            priorities=priorities,
+            counts=priority_counts(priorities),
+            ms=round((time.perf_counter() - started) * 1000, 1)
+        )
+    
+    statement = select(Task.id, Task.title, Task.priority).where(Task.user_id == user_id).order_by(Task.id)
+    if request.task_ids is not None:
+        statement = statement.where(Task.id.in_(request.task_ids))
+    if request.after_id is not None:
+        statement = statement.where(Task.id > request.after_id)
+    # All of the user's tasks are classified a page at a time, one extra row tells if more follow
+    rows = session.exec(statement.limit(MAX_CLASSIFY_TITLES + 1)).all()
+    next_after_id = None
+    if len(rows) > MAX_CLASSIFY_TITLES:
+        rows = rows[:MAX_CLASSIFY_TITLES]
+        next_after_id = rows[-1].id
+    priorities = classify_priorities([row.title for row in rows])
+    
+    updated = 0
+    if request.write_back:
+        changed = {row.id: priority for row, priority in zip(rows, priorities) if row.priority != priority}
+        updated = save_priorities(session, user_id, changed)
+        session.commit()
+    
+    return ClassifyResponse(
+        priorities=priorities,
+        task_ids=[row.id for row in rows],
+        counts=priority_counts(priorities),
+        updated=updated,
+        next_after_id=next_after_id,
+        ms=round((time.perf_counter() - started) * 1000, 1)
+    )
 
-@app.put("/api/{user_id}/tasks/{task_id}", response_model=TaskResponse)
+@app.put("/api/{user_id}/tasks/{task_id}", response_model=TaskResponse, dependencies=[Depends(authorized_user)])
 def update_task(
     user_id: str, 
     task_id: int, 
@@ -101,90 +209,398 @@ def update_task(
     session.add(db_task)
     session.commit()
     session.refresh(db_task)
+    
+    # Let the reminder scheduler pick up due date changes
+    kafka_producer.publish_task_event('updated', db_task.id, user_id, task_event_data(db_task))
     return db_task
 
-@app.delete("/api/{user_id}/tasks/{task_id}")
+@app.delete("/api/{user_id}/tasks/{task_id}", dependencies=[Depends(authorized_user)])
 def delete_task(user_id: str, task_id: int, session: Session = Depends(get_session)):
     """Delete a task"""
     task = session.get(Task, task_id)
     if not task or task.user_id != user_id:
         raise HTTPException(status_code=404, detail="Task not found")
     
+    title = task.title
     session.delete(task)
     session.commit()
+    
+    kafka_producer.publish_task_event('deleted', task_id, user_id, {'title': title})
     return {"message": "Task deleted successfully"}
 
+# Calendar endpoint
+@app.get("/api/{user_id}/calendar", dependencies=[Depends(authorized_user)])
+def get_calendar(
+    user_id: str,
+    range_start: datetime = Query(..., alias="from"),
+    range_end: datetime = Query(..., alias="to"),
+    session: Session = Depends(get_session)
+):
+    """Occurrences of all tasks in [from, to), recurring tasks expanded on the fly"""
+    if range_end <= range_start or range_end - range_start > timedelta(days=366):
+        raise HTTPException(status_code=400, detail="Range must be positive and at most one year")
+    
+    # One query: recurring series plus concrete tasks due in the range
+    statement = select(Task).where(
+        Task.user_id == user_id,
+        or_(
+            and_(Task.is_recurring == True, Task.parent_task_id == None),
+            and_(Task.due_date >= range_start, Task.due_date < range_end)
+        )
+    )
+    tasks = session.exec(statement).all()
+    
+    # Dates already materialized as concrete occurrences are not expanded again
+    materialized = {
+        (task.parent_task_id, task.due_date.date())
+        for task in tasks if task.parent_task_id and task.due_date
+    }
+    
+    owners, times = [], []
+    for index, task in enumerate(tasks):
+        if task.is_recurring and task.parent_task_id is None:
+            try:
+                rule = RecurrenceRule.from_task(task)
+            except ValueError:
+                continue
+            occurrences = expand(rule, task.due_date or task.created_at, range_start, range_end)
+        elif task.due_date:
+            occurrences = np.array([task.due_date], dtype='datetime64[s]')
+        else:
+            continue
+        owners.append(np.full(len(occurrences), index))
+        times.append(occurrences)
+    
+    if times:
+        owners = np.concatenate(owners)
+        times = np.concatenate(times)
+        order = np.argsort(times, kind='stable')
+        owners, times = owners[order], times[order]
+    
+    occurrences = []
+    for index, when in zip(owners, times):
+        task = tasks[index]
+        when = when.astype(datetime)
+        if task.parent_task_id is None and task.is_recurring and (task.id, when.date()) in materialized:
+            continue
+        occurrences.append({
+            "task_id": task.id,
+            "title": task.title,
+            "priority": task.priority,
+            "completed": task.completed,
+            "recurring": task.is_recurring,
+            "date": when.isoformat()
+        })
+    
+    return {
+        "from": range_start.isoformat(),
+        "to": range_end.isoformat(),
+        "count": len(occurrences),
+        "occurrences": occurrences
+    }
+
+DISCONNECT_POLL_SECONDS = 0.5
+
+
+async def cancel_on_disconnect(request: Request, coro):
+    """Await coro, cancelling it if the HTTP client goes away first"""
+    task = asyncio.ensure_future(coro)
+    while True:
+        done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+        if done:
+            return task.result()
+        if await request.is_disconnected():
+            task.cancel()
+            print(f"⚠️  Client disconnected, cancelled {request.url.path}")
+            raise HTTPException(status_code=499, detail="Client closed request")
+
 # Chat endpoint with AI integration
-@app.post("/api/{user_id}/chat", response_model=ChatResponse)
+@app.post("/api/{user_id}/chat", response_model=ChatResponse, dependencies=[Depends(authorized_user)])
 async def chat_with_ai(
     user_id: str, 
     chat_request: ChatRequest, 
-    session: Session = Depends(get_session)
+    request: Request
 ):
     """Chat with AI assistant"""
+    started = time.perf_counter()
+    await check_conversation(user_id, chat_request.conversation_id)
+    context = await run_in_threadpool(load_context, user_id, chat_request.conversation_id)
     
-    # Process message with AI agent
-    result = await ai_agent.process_message(
-        message=chat_request.message,
-        user_id=user_id,
-        conversation_id=chat_request.conversation_id
-    )
-    
-    # Handle tool calls if any
-    if result.get("raw_tool_calls"):
-        for tool_call in result["raw_tool_calls"]:
-            try:
-                await handle_tool_call(tool_call, user_id, session)
-            except Exception as e:
-                print(f"Error handling tool call: {e}")
+    # Tool rounds commit as they go, a failed turn reverts them (see TurnUnitOfWork)
+    uow = TurnUnitOfWork(tool_executor, user_id, chat_request.message)
+    try:
+        # Process message with AI agent (awaited, the event loop stays free);
+        # tool rounds run in the threadpool and are fed back to the model
+        result = await cancel_on_disconnect(request, ai_agent.process_message(
+            message=chat_request.message,
+            user_id=user_id,
+            conversation_id=chat_request.conversation_id,
+            history=context.messages,
+            summary=context.summary,
+            run_tools=lambda tool_calls: run_in_threadpool(uow.run, tool_calls)
+        ))
+        turn = await run_in_threadpool(persist_turn, uow, chat_request.conversation_id, result)
+    finally:
+        await run_in_threadpool(uow.close)
+    summarizer.schedule(ai_agent, turn["conversation_id"])
+    usage = account_turn(user_id, turn["conversation_id"], result, uow.results, started)
     
     return ChatResponse(
-        conversation_id=result["conversation_id"],
-        response=result["response"],
-        tool_calls=result["tool_calls"]
+        conversation_id=turn["conversation_id"],
+        response=turn["response"],
+        tool_calls=result.get("tool_calls", []),
+        message_id=turn["message_id"],
+        prompt_tokens=result.get("prompt_tokens"),
+        tool_timings=[
+            {k: tool_result[k] for k in ("name", "ok", "ms", "batch") if k in tool_result}
+            for tool_result in uow.results
+        ],
+        cached=result.get("cached", False),
+        debug=usage if CHAT_DEBUG else None
     )
 
-async def handle_tool_call(tool_call: dict, user_id: str, session: Session):
-    """Handle tool calls from AI agent."""
-    tool_name = tool_call["name"]
-    arguments = tool_call["arguments"]
-    
-    # Ensure user_id matches
-    arguments["user_id"] = user_id
-    
-    if tool_name == "add_task":
-        # Create task from AI request
-        task_data = TaskCreate(
-            title=arguments["title"],
-            description=arguments.get("description", "")
-        )
-        db_task = Task(**task_data.dict(), user_id=user_id)
-        session.add(db_task)
-        session.commit()
-        print(f"✅ AI added task: {arguments['title']}")
-        
-    elif tool_name == "list_tasks":
-        # Tasks will be listed in the AI response
-        print(f"✅ AI listed tasks for user: {user_id}")
-        
-    elif tool_name == "complete_task":
-        # Mark task as completed
-        task_id = arguments["task_id"]
-        task = session.get(Task, task_id)
-        if task and task.user_id == user_id:
-            task.completed = True
-            session.add(task)
-            session.commit()
-            print(f"✅ AI completed task: {task_id}")
-        
-    elif tool_name == "delete_task":
-        # Delete task
-        task_id = arguments["task_id"]
-        task = session.get(Task, task_id)
-        if task and task.user_id == user_id:
-            session.delete(task)
-            session.commit()
-            print(f"✅ AI deleted task: {task_id}")
+
+def account_turn(user_id: str, conversation_id: int, result: dict, tool_results: list, started: float) -> dict:
+    """Add a finished turn to the usage ledger, returns its usage record"""
+    usage = {
+        **(result.get("usage") or new_usage()),
+        "tool_ms": round(sum(tool_result.get("ms", 0) for tool_result in tool_results), 1),
+        "tool_calls": len(tool_results),
+        "total_ms": round((time.perf_counter() - started) * 1000, 1)
+    }
+    return usage_ledger.record(user_id, conversation_id, usage)
+
+
+@app.get("/metrics/chat")
+def chat_metrics(top: int = Query(10, ge=1, le=100), operator: bool = Depends(metrics_operator)):
+    """
+    Chat token, cost and latency totals, with the most expensive users and
+    conversations. Who they are (ids) is only shown with METRICS_TOKEN.
+    """
+    return usage_ledger.snapshot(top, identified=operator)
+
+
+@app.get("/api/{user_id}/chat/usage", dependencies=[Depends(authorized_user)])
+def chat_usage(user_id: str, top: int = Query(10, ge=1, le=100)):
+    """A user's chat usage totals and their most expensive conversations"""
+    return usage_ledger.user_snapshot(user_id, top)
+
+
+@app.get(
+    "/api/{user_id}/chat/conversations",
+    response_model=List[ConversationInfo], dependencies=[Depends(authorized_user)]
+)
+async def list_chat_conversations(
+    user_id: str,
+    response: Response,
+    limit: int = Query(CONVERSATION_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    before: str = None
+):
+    """User's conversations, most recently active first; X-Next-Cursor (as before) pages further"""
+    try:
+        page = await run_in_threadpool(list_conversations, user_id, limit, before)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if page.next_cursor:
+        response.headers["X-Next-Cursor"] = page.next_cursor
+    return page.items
+
+
+@app.get(
+    "/api/{user_id}/chat/conversations/{conversation_id}/messages",
+    response_model=List[MessageInfo], dependencies=[Depends(authorized_user)]
+)
+async def list_chat_messages(
+    user_id: str,
+    conversation_id: int,
+    response: Response,
+    limit: int = Query(MESSAGE_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    before: str = None,
+    after: str = None
+):
+    """
+    Latest messages of a conversation in order. X-Next-Cursor pages back
+    (as before), or forward from a cursor given as after (polling).
+    """
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either before or after")
+    try:
+        page = await run_in_threadpool(get_messages, user_id, conversation_id, limit, before, after)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if page is None:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    if page.next_cursor:
+        response.headers["X-Next-Cursor"] = page.next_cursor
+    return page.items
+
+
+@app.get("/api/{user_id}/chat/search", response_model=ChatSearchResponse, dependencies=[Depends(authorized_user)])
+async def search_chat(
+    user_id: str,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(CHAT_SEARCH_PAGE_SIZE, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=CHAT_SEARCH_MAX_OFFSET)
+):
+    """User's messages matching q (web search syntax on PostgreSQL), best first, with snippets"""
+    return await run_in_threadpool(search_messages, user_id, q, limit, offset)
+
+
+def persist_turn(uow: TurnUnitOfWork, conversation_id: int, result: dict) -> dict:
+    """
+    Finish a chat turn: run the tool calls still pending and store the
+    exchange, in one transaction.
+
+    Either those task changes and both messages are committed, or nothing
+    is (and the turn's earlier tool rounds are reverted). A tool call that fails is rolled back to its savepoint and
+    reported, the rest of the turn still commits (see tool_executor).
+    """
+    response = result["response"]
+    pending = []
+    session = uow.open()
+    intent = result.get("intent")
+    if intent:
+        # Local intent: run the MCP tool and build the reply from its result
+        started = time.perf_counter()
+        tool_result = intent_parser.execute(intent, uow.user_id, mcp, session)
+        response = intent_parser.reply_for(intent, tool_result)
+        pending.append({
+            "name": intent.tool, "ok": tool_result.get("status") != "error", "result": tool_result,
+            "ms": round((time.perf_counter() - started) * 1000, 1), "batch": 1
+        })
+        uow.results += pending
+
+    # Calls the agent left to the caller (single-pass agents)
+    if result.get("raw_tool_calls"):
+        pending += uow.run(result["raw_tool_calls"])
+
+    conversation_id, messages = save_exchange(session, uow.user_id, conversation_id, uow.user_message, response)
+    uow.commit()
+
+    remember_exchange(conversation_id, messages)
+    return {
+        "conversation_id": conversation_id,
+        "message_id": messages[-1].id,
+        "response": response,
+        "tool_results": pending
+    }
+
+
+async def chat_events(user_id: str, message: str, conversation_id: int = None):
+    """
+    Chat turn as a stream of events:
+    token* -> (tool_call* -> tool_result* -> token*)* -> done (or error)
+
+    Tokens are forwarded as the model produces them. Each round of tool
+    calls is executed, committed and fed back to the model. A turn that
+    ends in an error is compensated: its tool changes are reverted and
+    no messages are kept.
+    """
+    started = time.perf_counter()
+    first_token_ms = None
+    final = None
+
+    context = await run_in_threadpool(load_context, user_id, conversation_id)
+    uow = TurnUnitOfWork(tool_executor, user_id, message)
+    try:
+        async for event in ai_agent.stream_message(
+            message, user_id, conversation_id, context.messages, context.summary,
+            run_tools=lambda tool_calls: run_in_threadpool(uow.run, tool_calls)
+        ):
+            if event["type"] == "token" and first_token_ms is None:
+                first_token_ms = round((time.perf_counter() - started) * 1000, 1)
+            if event["type"] == "done":
+                final = event
+                break
+            yield event
+
+        if final is None:
+            # The model call failed and the error was sent, uow.close() reverts the turn
+            return
+
+        intent = final.get("intent")
+        pending = ([{"name": intent.tool, "arguments": intent.arguments}] if intent else []) + final["raw_tool_calls"]
+        for tool_call in pending:
+            yield {"type": "tool_call", "name": tool_call["name"], "arguments": tool_call["arguments"]}
+
+        turn = await run_in_threadpool(persist_turn, uow, conversation_id, final)
+    finally:
+        await run_in_threadpool(uow.close)
+    summarizer.schedule(ai_agent, turn["conversation_id"])
+    usage = account_turn(user_id, turn["conversation_id"], final, uow.results, started)
+    if intent:
+        # The reply of a local intent is only known once its tool has run
+        first_token_ms = round((time.perf_counter() - started) * 1000, 1)
+        yield {"type": "token", "content": turn["response"]}
+    for tool_result in turn["tool_results"]:
+        yield {"type": "tool_result", **tool_result}
+
+    yield {
+        "type": "done",
+        "conversation_id": turn["conversation_id"],
+        "message_id": turn["message_id"],
+        "response": turn["response"],
+        "tool_calls": final.get("tool_calls") or [tool_call["name"] for tool_call in pending],
+        "prompt_tokens": final.get("prompt_tokens"),
+        "cached": final.get("cached", False),
+        "ttft_ms": first_token_ms,
+        "total_ms": usage["total_ms"],
+        **({"debug": usage} if CHAT_DEBUG else {})
+    }
+
+
+def sse(event: dict) -> str:
+    """Format an event as a Server-Sent Events frame"""
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+async def check_conversation(user_id: str, conversation_id: int):
+    if conversation_id is not None:
+        if await run_in_threadpool(get_conversation, user_id, conversation_id) is None:
+            raise HTTPException(status_code=404, detail="Conversation not found")
+
+
+# Streaming chat over Server-Sent Events
+@app.post("/api/{user_id}/chat/stream", dependencies=[Depends(authorized_user)])
+async def chat_stream(user_id: str, chat_request: ChatRequest):
+    """Chat with AI assistant, streaming tokens and tool calls as SSE"""
+    await check_conversation(user_id, chat_request.conversation_id)
+
+    async def frames():
+        # Starlette cancels this generator when the client disconnects,
+        # which closes the upstream OpenAI stream as well
+        async for event in chat_events(user_id, chat_request.message, chat_request.conversation_id):
+            yield sse(event)
+
+    return StreamingResponse(
+        frames(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# Streaming chat over WebSocket (one connection, many turns)
+@app.websocket("/api/{user_id}/chat/ws", dependencies=[Depends(authorized_socket_user)])
+async def chat_websocket(websocket: WebSocket, user_id: str):
+    """Receives {"message", "conversation_id"}, sends the chat events as JSON"""
+    await websocket.accept()
+    try:
+        while True:
+            data = await websocket.receive_json()
+            try:
+                chat_request = ChatRequest(**data)
+                await check_conversation(user_id, chat_request.conversation_id)
+            except HTTPException as e:
+                await websocket.send_json({"type": "error", "message": e.detail})
+                continue
+            except ValueError as e:
+                await websocket.send_json({"type": "error", "message": str(e)})
+                continue
+
+            async for event in chat_events(user_id, chat_request.message, chat_request.conversation_id):
+                await websocket.send_json(event)
+    except WebSocketDisconnect:
+        print(f"⚠️  Chat WebSocket closed for user {user_id}")
 
 if __name__ == "__main__":
     import uvicorn
@@ -193,7 +609,7 @@ if __name__ == "__main__":
 from event_handler import event_bus
 
 # Add to task creation endpoint
-@app.post("/api/{user_id}/tasks")
+@app.post("/api/{user_id}/tasks", dependencies=[Depends(authorized_user)])
 def create_task_with_events(user_id: str, task: TaskCreate):
     # ... existing creation code ...
     
@@ -207,7 +623,7 @@ def create_task_with_events(user_id: str, task: TaskCreate):
     return db_task
 
 # Add to task completion endpoint
-@app.patch("/api/{user_id}/tasks/{task_id}/complete")
+@app.patch("/api/{user_id}/tasks/{task_id}/complete", dependencies=[Depends(authorized_user)])
 def complete_task_with_events(user_id: str, task_id: int):
     # ... existing completion code ...
     
@@ -223,10 +639,35 @@ def complete_task_with_events(user_id: str, task_id: int):
 # Import Kafka producer
 from kafka_producer import kafka_producer
 
+
+def task_event_data(task: Task) -> dict:
+    """Task fields carried by task-events (consumed by the reminder scheduler)"""
+    return {
+        'title': task.title,
+        'description': task.description,
+        'priority': task.priority,
+        'tags': task.tags,
+        'completed': task.completed,
+        'is_recurring': task.is_recurring,
+        'recurrence_type': task.recurrence_type,
+        'recurrence_interval': task.recurrence_interval,
+        'recurrence_rule': task.recurrence_rule,
+        'parent_task_id': task.parent_task_id,
+        'due_date': task.due_date.isoformat() if task.due_date else None,
+        'reminder_time': task.reminder_time.isoformat() if task.reminder_time else None
+    }
+
 # Update task creation to publish events
-@app.post("/api/{user_id}/tasks/advanced")
+@app.post("/api/{user_id}/tasks/advanced", dependencies=[Depends(authorized_user)])
 def create_advanced_task(user_id: str, task_data: dict):
     """Create task with advanced features"""
+    recurrence_rule = task_data.get('recurrence_rule')
+    if recurrence_rule:
+        try:
+            recurrence_rule = RecurrenceRule.parse(recurrence_rule).to_string()
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid recurrence rule: {e}")
+    
     with Session(engine) as session:
         task = Task(
             user_id=user_id,
@@ -235,34 +676,18 @@ def create_advanced_task(user_id: str, task_data: dict):
             priority=task_data.get('priority', 'medium'),
             tags=task_data.get('tags', ''),
             due_date=task_data.get('due_date'),
+            reminder_time=task_data.get('reminder_time'),
             is_recurring=task_data.get('is_recurring', False),
             recurrence_type=task_data.get('recurrence_type'),
-            recurrence_interval=task_data.get('recurrence_interval', 1)
+            recurrence_interval=task_data.get('recurrence_interval', 1),
+            recurrence_rule=recurrence_rule
         )
         session.add(task)
         session.commit()
         session.refresh(task)
         
-        # Publish event to Kafka
-        kafka_producer.publish_task_event(
-            'created',
-            task.id,
-            user_id,
-            {
-                'title': task.title,
-                'priority': task.priority,
-                'tags': task.tags,
-                'is_recurring': task.is_recurring
-            }
-        )
-        
-        # Publish reminder if due date set
-        if task.due_date:
-            kafka_producer.publish_reminder(
-                task.id,
-                user_id,
-                task.title,
-                task.due_date.isoformat()
-            )
+        # Publish event to Kafka; the reminder scheduler fires the
+        # reminder when due_date/reminder_time arrives
+        kafka_producer.publish_task_event('created', task.id, user_id, task_event_data(task))
         
         return task
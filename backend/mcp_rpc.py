@@ -0,0 +1,275 @@
+"""
+MCP JSON-RPC Server
+Standalone process serving the MCPServer tools over stdio and HTTP
+
+Other agents and services call the task tools through JSON-RPC 2.0
+instead of importing the backend: "initialize", "ping", "tools/list"
+and "tools/call" ({"name": ..., "arguments": {...}}), MCP style.
+
+- stdio: one JSON message per line. Requests are pipelined, each line
+  is dispatched as soon as it is read and answered when it completes,
+  so responses may come out of order (match them by id).
+- HTTP: POST /rpc with a request or a batch (JSON array), whose calls
+  run concurrently. tools/call acts as any user_id it is given, so
+  callers authenticate with MCP_SERVICE_TOKEN as a bearer token. Without
+  a token configured, only loopback clients are served and --http
+  refuses to bind anything but a loopback address.
+
+Tool calls run in a thread pool of MCP_MAX_CONCURRENCY workers sharing
+the process's database connection pool (sized to match by default).
+The tool list is serialized once at startup and spliced into every
+tools/list response.
+
+Usage:
+    python mcp_rpc.py --stdio
+    python mcp_rpc.py --http [--port 8765]     (or: uvicorn mcp_rpc:app --port 8765)
+    MCP_SERVICE_TOKEN=... python mcp_rpc.py --http --host 0.0.0.0
+"""
+
+import argparse
+import asyncio
+import inspect
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from ipaddress import ip_address
+from typing import Any, Dict, Optional
+
+from fastapi import Depends, FastAPI, HTTPException, Request, Response, Security, status
+from fastapi.security import HTTPAuthorizationCredentials
+
+from auth import security, shared_token_matches
+from database import DATABASE_MAX_OVERFLOW, DATABASE_POOL_SIZE
+from mcp_server import MCPServer
+
+logger = logging.getLogger(__name__)
+
+# Tool calls run at once, more wait for a worker (and a database connection)
+MCP_MAX_CONCURRENCY = int(os.getenv("MCP_MAX_CONCURRENCY", str(DATABASE_POOL_SIZE + DATABASE_MAX_OVERFLOW)))
+MCP_MAX_MESSAGE_BYTES = int(os.getenv("MCP_MAX_MESSAGE_BYTES", str(1024 * 1024)))
+PROTOCOL_VERSION = "2024-11-05"
+# Shared token of the services allowed to call tools over HTTP, unset: loopback only
+MCP_SERVICE_TOKEN = os.getenv("MCP_SERVICE_TOKEN")
+
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+
+class RPCError(Exception):
+    """A JSON-RPC error response"""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+def _dumps(value: Any) -> bytes:
+    return json.dumps(value, separators=(",", ":"), default=str).encode()
+
+
+def _mcp_tool(definition: Dict[str, Any]) -> Dict[str, Any]:
+    """MCP tool description of an OpenAI function definition"""
+    function = definition["function"]
+    return {"name": function["name"], "description": function.get("description", ""), "inputSchema": function["parameters"]}
+
+
+class MCPDispatcher:
+    """JSON-RPC front of an MCPServer, shared by all transports and clients"""
+
+    def __init__(self, server: Optional[MCPServer] = None, max_concurrency: int = MCP_MAX_CONCURRENCY):
+        self.server = server or MCPServer()
+        self.pool = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="mcp-tool")
+        self.signatures = {name: inspect.signature(tool) for name, tool in self.server.tools.items()}
+        definitions = self.server.get_tool_definitions()
+        # Serialized once, tools/list only splices these bytes into the response
+        self.tool_lists = {
+            "mcp": _dumps({"tools": [_mcp_tool(d) for d in definitions]}),
+            "openai": _dumps({"tools": definitions}),
+        }
+        self.server_info = _dumps({
+            "protocolVersion": PROTOCOL_VERSION,
+            "capabilities": {"tools": {"listChanged": False}},
+            "serverInfo": {"name": "todo-mcp", "version": "1.0"},
+        })
+        self.in_flight = 0
+        self.stats = {'requests': 0, 'tool_calls': 0, 'tool_errors': 0, 'rpc_errors': 0, 'max_in_flight': 0}
+
+    @staticmethod
+    def _response(request_id: Any, result: bytes) -> bytes:
+        return b'{"jsonrpc":"2.0","id":' + _dumps(request_id) + b',"result":' + result + b'}'
+
+    def _error(self, request_id: Any, code: int, message: str) -> bytes:
+        self.stats['rpc_errors'] += 1
+        return _dumps({"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}})
+
+    async def _call_tool(self, params: Dict[str, Any]) -> bytes:
+        name = params.get("name")
+        arguments = params.get("arguments") or {}
+        if name not in self.server.tools:
+            raise RPCError(INVALID_PARAMS, f"Unknown tool: {name}")
+        try:
+            self.signatures[name].bind(**arguments)
+        except TypeError as e:
+            raise RPCError(INVALID_PARAMS, f"Invalid arguments for {name}: {e}")
+
+        self.stats['tool_calls'] += 1
+        self.in_flight += 1
+        self.stats['max_in_flight'] = max(self.stats['max_in_flight'], self.in_flight)
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self.pool, lambda: self.server.tools[name](**arguments))
+            failed = isinstance(result, dict) and result.get("status") == "error"
+        except Exception as e:
+            logger.error(f"❌ MCP tool {name} failed: {e}")
+            result, failed = {"status": "error", "message": str(e)}, True
+        finally:
+            self.in_flight -= 1
+        self.stats['tool_errors'] += failed
+        text = json.dumps(result, default=str)
+        return _dumps({"content": [{"type": "text", "text": text}], "isError": failed})
+
+    async def handle(self, message: Any) -> Optional[bytes]:
+        """Response to one JSON-RPC message, None for a notification"""
+        if not isinstance(message, dict) or message.get("jsonrpc") != "2.0" or not isinstance(message.get("method"), str):
+            return self._error(message.get("id") if isinstance(message, dict) else None, INVALID_REQUEST, "Invalid request")
+        self.stats['requests'] += 1
+        notification = "id" not in message
+        request_id = message.get("id")
+        method = message["method"]
+        params = message.get("params") or {}
+        try:
+            if method == "tools/call":
+                result = await self._call_tool(params)
+            elif method == "tools/list":
+                result = self.tool_lists.get(params.get("format", "mcp"))
+                if result is None:
+                    raise RPCError(INVALID_PARAMS, "format is 'mcp' or 'openai'")
+            elif method == "initialize":
+                result = self.server_info
+            elif method == "ping":
+                result = b"{}"
+            elif method.startswith("notifications/"):
+                return None
+            else:
+                raise RPCError(METHOD_NOT_FOUND, f"Method not found: {method}")
+        except RPCError as e:
+            return None if notification else self._error(request_id, e.code, e.message)
+        except Exception as e:
+            logger.error(f"❌ MCP request {method} failed: {e}")
+            return None if notification else self._error(request_id, INTERNAL_ERROR, str(e))
+        return None if notification else self._response(request_id, result)
+
+    async def handle_payload(self, payload: bytes) -> Optional[bytes]:
+        """Response to a request or a batch, None if nothing needs an answer"""
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            return self._error(None, PARSE_ERROR, "Parse error")
+        if not isinstance(message, list):
+            return await self.handle(message)
+        if not message:
+            return self._error(None, INVALID_REQUEST, "Empty batch")
+        responses = [r for r in await asyncio.gather(*(self.handle(m) for m in message)) if r is not None]
+        return b"[" + b",".join(responses) + b"]" if responses else None
+
+    def metrics(self) -> Dict[str, Any]:
+        return {**self.stats, 'in_flight': self.in_flight, 'max_concurrency': self.pool._max_workers}
+
+
+async def serve_stdio(dispatcher: MCPDispatcher, stdin=None, stdout=None):
+    """Answer newline-delimited JSON-RPC on stdin/stdout until stdin closes"""
+    loop = asyncio.get_running_loop()
+    source = stdin or sys.stdin.buffer
+    out = stdout or sys.stdout.buffer
+    pending = set()
+
+    async def answer(line: bytes):
+        response = await dispatcher.handle_payload(line)
+        if response is not None:
+            # Written from the event loop thread, responses never interleave
+            out.write(response + b"\n")
+            out.flush()
+
+    while True:
+        # Blocking reads happen off the loop (works for pipes, files and ttys)
+        line = await loop.run_in_executor(None, source.readline, MCP_MAX_MESSAGE_BYTES)
+        if not line:
+            break
+        if line.strip():
+            # Pipelined: the next line is read while this one runs
+            task = asyncio.create_task(answer(line))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+    if pending:
+        await asyncio.gather(*pending)
+
+
+dispatcher = MCPDispatcher()
+app = FastAPI(title="Todo MCP Server")
+
+
+def _is_loopback(host: Optional[str]) -> bool:
+    try:
+        return host is not None and ip_address(host).is_loopback
+    except ValueError:
+        return host == "localhost"
+
+
+def trusted_caller(request: Request, credentials: Optional[HTTPAuthorizationCredentials] = Security(security)):
+    """A service holding MCP_SERVICE_TOKEN, or (with no token configured) a loopback client"""
+    if MCP_SERVICE_TOKEN:
+        if not shared_token_matches(credentials.credentials if credentials else None, MCP_SERVICE_TOKEN):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid service token",
+                headers={"WWW-Authenticate": "Bearer"},
+            )
+    elif not _is_loopback(request.client.host if request.client else None):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="MCP_SERVICE_TOKEN is not set, loopback only")
+
+
+@app.post("/rpc", dependencies=[Depends(trusted_caller)])
+async def rpc(request: Request):
+    response = await dispatcher.handle_payload(await request.body())
+    if response is None:
+        return Response(status_code=204)
+    return Response(content=response, media_type="application/json")
+
+
+@app.get("/health")
+def health():
+    return {"status": "healthy", "service": "todo-mcp", "mcp": dispatcher.metrics()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    transport = parser.add_mutually_exclusive_group(required=True)
+    transport.add_argument("--stdio", action="store_true")
+    transport.add_argument("--http", action="store_true")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    if args.stdio:
+        # stdout carries the protocol, anything printed goes to stderr
+        protocol_out = sys.stdout.buffer
+        sys.stdout = sys.stderr
+        logging.basicConfig(stream=sys.stderr, level=logging.INFO)
+        print("🔌 MCP server on stdio", file=sys.stderr)
+        asyncio.run(serve_stdio(dispatcher, stdout=protocol_out))
+    else:
+        if not MCP_SERVICE_TOKEN and not _is_loopback(args.host):
+            parser.error(f"--host {args.host} needs MCP_SERVICE_TOKEN (tools/call acts as any user)")
+        import uvicorn
+        print(f"🔌 MCP server on http://{args.host}:{args.port}/rpc")
+        uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,11 +2,39 @@
 MCP Server - Exposes task operations as tools for AI agent
 """
 
-from typing import Dict, Any, Optional
-from sqlmodel import Session, select
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional, Tuple
+from sqlmodel import Session, select, or_
 from database import engine
 from models import Task
 from datetime import datetime
+import task_context
+from priority_classifier import classify_priority
+from task_index import task_index, unresolved_message
+
+
+@contextmanager
+def _session_scope(session: Optional[Session]):
+    """Use the caller's session (the caller commits) or a new committed one"""
+    if session is not None:
+        yield session
+        session.flush()
+        return
+    with Session(engine) as own:
+        yield own
+        own.commit()
+
+
+def _not_resolved(task_id: Optional[int], task: Optional[str], candidates: List[Dict[str, Any]]) -> Dict[str, Any]:
+    if task_id is None and task:
+        # Nothing is changed on a guess: the model confirms a candidate by id
+        return {
+            "task_id": None,
+            "status": "error",
+            "message": unresolved_message(task, candidates),
+            "candidates": [{"task_id": c["id"], "title": c["title"], "score": c["score"]} for c in candidates]
+        }
+    return {"task_id": task_id, "status": "error", "message": "Task not found"}
 
 
 class MCPServer:
@@ -22,7 +50,21 @@ class MCPServer:
             "update_task": self.update_task,
         }
     
-    def add_task(self, user_id: str, title: str, description: str = "") -> Dict[str, Any]:
+    def resolve_task_id(
+        self, user_id: str, task_id: Optional[int] = None, task: Optional[str] = None
+    ) -> Tuple[Optional[int], List[Dict[str, Any]]]:
+        """
+        Task id, or the user's task a fuzzy reference ("the milk one")
+        surely points to. An unclear reference resolves to None and the
+        candidates to confirm.
+        """
+        if task_id is not None:
+            return task_id, []
+        if task:
+            return task_index.resolve(user_id, task)
+        return None, []
+    
+    def add_task(self, user_id: str, title: str, description: str = "", session: Optional[Session] = None) -> Dict[str, Any]:
         """
         Add a new task.
         
@@ -30,19 +72,20 @@ class MCPServer:
             user_id: User identifier
             title: Task title
             description: Task description (optional)
+            session: Open session to run in, committed by the caller (optional)
             
         Returns:
             Dict with task_id, status, and title
         """
-        with Session(engine) as session:
+        with _session_scope(session) as session:
             task = Task(
                 user_id=user_id,
                 title=title,
-                description=description
+                description=description,
+                priority=classify_priority(title)
             )
             session.add(task)
-            session.commit()
-            session.refresh(task)
+            session.flush()
             
             return {
                 "task_id": task.id,
@@ -50,18 +93,30 @@ class MCPServer:
                 "title": task.title
             }
     
-    def list_tasks(self, user_id: str, status: str = "all") -> Dict[str, Any]:
+    def list_tasks(
+        self,
+        user_id: str,
+        status: str = "all",
+        query: Optional[str] = None,
+        offset: int = 0,
+        compact: bool = False,
+        session: Optional[Session] = None
+    ) -> Dict[str, Any]:
         """
         List user's tasks.
         
         Args:
             user_id: User identifier
             status: Filter by status (all/pending/completed)
+            query: What the user asked, ranks the compact result (optional)
+            offset: Ranked tasks to skip, next_offset of the previous page (compact only)
+            compact: Ranked, token-budgeted table for the model instead of every task
+            session: Open session to run in, committed by the caller (optional)
             
         Returns:
-            Dict with tasks array
+            Dict with tasks array, or the task_context encoding when compact
         """
-        with Session(engine) as session:
+        with _session_scope(session) as session:
             statement = select(Task).where(Task.user_id == user_id)
             
             if status == "pending":
@@ -71,6 +126,9 @@ class MCPServer:
             
             tasks = session.exec(statement).all()
             
+            if compact:
+                return {"status": status, **task_context.encode_tasks(tasks, query, offset)}
+            
             return {
                 "tasks": [
                     {
@@ -84,31 +142,38 @@ class MCPServer:
                 ]
             }
     
-    def complete_task(self, user_id: str, task_id: int) -> Dict[str, Any]:
+    def complete_task(
+        self,
+        user_id: str,
+        task_id: Optional[int] = None,
+        completed: Optional[bool] = None,
+        session: Optional[Session] = None,
+        task: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
         Mark task as complete.
         
         Args:
             user_id: User identifier
             task_id: Task identifier
+            completed: New state (optional, toggles when omitted)
+            session: Open session to run in, committed by the caller (optional)
+            task: Words of the task's title, used when task_id is not given
             
         Returns:
             Dict with task_id, status, and title
         """
-        with Session(engine) as session:
-            task = session.get(Task, task_id)
+        reference = task
+        task_id, candidates = self.resolve_task_id(user_id, task_id, reference)
+        with _session_scope(session) as session:
+            task = session.get(Task, task_id) if task_id is not None else None
             
             if not task or task.user_id != user_id:
-                return {
-                    "task_id": task_id,
-                    "status": "error",
-                    "message": "Task not found"
-                }
+                return _not_resolved(task_id, reference, candidates)
             
-            task.completed = not task.completed
+            task.completed = (not task.completed) if completed is None else completed
             task.updated_at = datetime.now()
             session.add(task)
-            session.commit()
             
             return {
                 "task_id": task.id,
@@ -116,30 +181,35 @@ class MCPServer:
                 "title": task.title
             }
     
-    def delete_task(self, user_id: str, task_id: int) -> Dict[str, Any]:
+    def delete_task(
+        self,
+        user_id: str,
+        task_id: Optional[int] = None,
+        session: Optional[Session] = None,
+        task: Optional[str] = None
+    ) -> Dict[str, Any]:
         """
         Delete a task.
         
         Args:
             user_id: User identifier
             task_id: Task identifier
+            session: Open session to run in, committed by the caller (optional)
+            task: Words of the task's title, used when task_id is not given
             
         Returns:
             Dict with task_id, status, and title
         """
-        with Session(engine) as session:
-            task = session.get(Task, task_id)
+        reference = task
+        task_id, candidates = self.resolve_task_id(user_id, task_id, reference)
+        with _session_scope(session) as session:
+            task = session.get(Task, task_id) if task_id is not None else None
             
             if not task or task.user_id != user_id:
-                return {
-                    "task_id": task_id,
-                    "status": "error",
-                    "message": "Task not found"
-                }
+                return _not_resolved(task_id, reference, candidates)
             
             title = task.title
             session.delete(task)
-            session.commit()
             
             return {
                 "task_id": task_id,
@@ -150,9 +220,11 @@ class MCPServer:
     def update_task(
         self, 
         user_id: str, 
-        task_id: int, 
+        task_id: Optional[int] = None, 
         title: Optional[str] = None, 
-        description: Optional[str] = None
+        description: Optional[str] = None,
+        session: Optional[Session] = None,
+        task: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Update a task.
@@ -162,19 +234,19 @@ class MCPServer:
             task_id: Task identifier
             title: New title (optional)
             description: New description (optional)
+            session: Open session to run in, committed by the caller (optional)
+            task: Words of the task's current title, used when task_id is not given
             
         Returns:
             Dict with task_id, status, and title
         """
-        with Session(engine) as session:
-            task = session.get(Task, task_id)
+        reference = task
+        task_id, candidates = self.resolve_task_id(user_id, task_id, reference)
+        with _session_scope(session) as session:
+            task = session.get(Task, task_id) if task_id is not None else None
             
             if not task or task.user_id != user_id:
-                return {
-                    "task_id": task_id,
-                    "status": "error",
-                    "message": "Task not found"
-                }
+                return _not_resolved(task_id, reference, candidates)
             
             if title:
                 task.title = title
@@ -183,7 +255,6 @@ class MCPServer:
             
             task.updated_at = datetime.now()
             session.add(task)
-            session.commit()
             
             return {
                 "task_id": task.id,
@@ -214,7 +285,7 @@ class MCPServer:
                 "type": "function",
                 "function": {
                     "name": "list_tasks",
-                    "description": "List user's tasks",
+                    "description": "List user's tasks, most relevant first, as a compact table",
                     "parameters": {
                         "type": "object",
                         "properties": {
@@ -222,7 +293,9 @@ class MCPServer:
                             "status": {
                                 "type": "string",
                                 "enum": ["all", "pending", "completed"]
-                            }
+                            },
+                            "query": {"type": "string"},
+                            "offset": {"type": "integer"}
                         },
                         "required": ["user_id"]
                     }
@@ -232,14 +305,15 @@ class MCPServer:
                 "type": "function",
                 "function": {
                     "name": "complete_task",
-                    "description": "Mark a task as complete or incomplete",
+                    "description": "Mark a task as complete or incomplete, by id or by words of its title",
                     "parameters": {
                         "type": "object",
                         "properties": {
                             "user_id": {"type": "string"},
-                            "task_id": {"type": "integer"}
+                            "task_id": {"type": "integer"},
+                            "task": {"type": "string"}
                         },
-                        "required": ["user_id", "task_id"]
+                        "required": ["user_id"]
                     }
                 }
             },
@@ -247,14 +321,15 @@ class MCPServer:
                 "type": "function",
                 "function": {
                     "name": "delete_task",
-                    "description": "Delete a task",
+                    "description": "Delete a task, by id or by words of its title",
                     "parameters": {
                         "type": "object",
                         "properties": {
                             "user_id": {"type": "string"},
-                            "task_id": {"type": "integer"}
+                            "task_id": {"type": "integer"},
+                            "task": {"type": "string"}
                         },
-                        "required": ["user_id", "task_id"]
+                        "required": ["user_id"]
                     }
                 }
             },
@@ -268,10 +343,11 @@ class MCPServer:
                         "properties": {
                             "user_id": {"type": "string"},
                             "task_id": {"type": "integer"},
+                            "task": {"type": "string"},
                             "title": {"type": "string"},
                             "description": {"type": "string"}
                         },
-                        "required": ["user_id", "task_id"]
+                        "required": ["user_id"]
                     }
                 }
             }
@@ -0,0 +1,444 @@
+"""
+In-Memory Kafka Broker
+kafka-python compatible producer and consumer backed by an in-process broker
+
+Topics are lists of append-only partition logs. Consumer groups get range
+assignments that are rebalanced whenever a member joins, leaves or changes
+its subscription, committed offsets are kept per group, and records are
+stored serialized, so producers and consumers run unchanged against it
+(see kafka_client.py). Only the kafka-python API used in this repo is
+implemented. Everything lives in one process: run producers and consumers
+as threads.
+"""
+
+import itertools
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set
+from kafka.consumer.fetcher import ConsumerRecord
+from kafka.errors import IllegalStateError, KafkaTimeoutError, NoBrokersAvailable
+from kafka.future import Future
+from kafka.partitioner.default import murmur2
+from kafka.producer.future import RecordMetadata
+from kafka.structs import OffsetAndMetadata, TopicPartition
+
+DEFAULT_PARTITIONS = int(os.getenv("KAFKA_MEMORY_PARTITIONS", "3"))
+MAX_POLL_RECORDS = 500
+AUTO_COMMIT_INTERVAL_MS = 5000
+
+
+class _Group:
+    """Members, assignment and committed offsets of a consumer group"""
+
+    def __init__(self):
+        self.members: Dict[int, "MemoryConsumer"] = {}
+        self.generation = 0
+        self.assignments: Dict[int, Set[TopicPartition]] = {}
+        self.committed: Dict[TopicPartition, OffsetAndMetadata] = {}
+
+
+class MemoryBroker:
+    """Partitioned topics and consumer groups shared by one process"""
+
+    def __init__(self, default_partitions: int = DEFAULT_PARTITIONS):
+        self.default_partitions = default_partitions
+        # Guards everything below, notified on every append
+        self.lock = threading.Condition()
+        self.topics: Dict[str, List[List[ConsumerRecord]]] = {}
+        self.groups: Dict[str, _Group] = defaultdict(_Group)
+        self.available = True
+        self._member_ids = itertools.count(1)
+
+    def reset(self):
+        """Drop every topic and group"""
+        with self.lock:
+            self.topics.clear()
+            self.groups.clear()
+            self.available = True
+
+    def set_available(self, available: bool):
+        """Simulate a broker outage (producers fail, consumers see nothing)"""
+        with self.lock:
+            self.available = available
+            self.lock.notify_all()
+
+    # ----- Topics -----
+
+    def create_topic(self, topic: str, partitions: Optional[int] = None):
+        """Create a topic (no-op if it exists), rebalancing subscribed groups"""
+        with self.lock:
+            if topic in self.topics:
+                return
+            self.topics[topic] = [[] for _ in range(partitions or self.default_partitions)]
+            for group in self.groups.values():
+                if any(topic in m.subscription for m in group.members.values()):
+                    self._rebalance(group)
+
+    def partitions_for(self, topic: str) -> Set[int]:
+        with self.lock:
+            self.create_topic(topic)
+            return set(range(len(self.topics[topic])))
+
+    def append(self, topic: str, partition: int, key, value, headers, timestamp_ms: int) -> int:
+        """Append a serialized record, returns its offset"""
+        with self.lock:
+            log = self.topics[topic][partition]
+            offset = len(log)
+            log.append(ConsumerRecord(
+                topic, partition, offset, timestamp_ms, 0, key, value, headers or [], None,
+                len(key) if key is not None else -1,
+                len(value) if value is not None else -1,
+                -1,
+            ))
+            self.lock.notify_all()
+            return offset
+
+    def fetch(self, tp: TopicPartition, offset: int, max_records: int) -> List[ConsumerRecord]:
+        with self.lock:
+            return self.topics[tp.topic][tp.partition][offset:offset + max_records]
+
+    def end_offset(self, tp: TopicPartition) -> int:
+        with self.lock:
+            return len(self.topics[tp.topic][tp.partition])
+
+    # ----- Consumer groups -----
+
+    def join(self, group_id: str, consumer: "MemoryConsumer") -> int:
+        """Add a member to a group, returns its member id"""
+        with self.lock:
+            member_id = next(self._member_ids)
+            self.groups[group_id].members[member_id] = consumer
+            self._rebalance(self.groups[group_id])
+            return member_id
+
+    def leave(self, group_id: str, member_id: int):
+        with self.lock:
+            group = self.groups[group_id]
+            if group.members.pop(member_id, None) is not None:
+                self._rebalance(group)
+
+    def resubscribe(self, group_id: str):
+        with self.lock:
+            self._rebalance(self.groups[group_id])
+
+    def _rebalance(self, group: _Group):
+        """Range-assign every subscribed topic's partitions over the members"""
+        assignments: Dict[int, Set[TopicPartition]] = {m: set() for m in group.members}
+        topics = sorted({t for m in group.members.values() for t in m.subscription})
+        for topic in topics:
+            self.create_topic(topic)
+            members = sorted(m for m, c in group.members.items() if topic in c.subscription)
+            partitions = len(self.topics[topic])
+            per_member, extra = divmod(partitions, len(members))
+            start = 0
+            for i, member_id in enumerate(members):
+                count = per_member + (1 if i < extra else 0)
+                assignments[member_id].update(TopicPartition(topic, p) for p in range(start, start + count))
+                start += count
+
+        group.assignments = assignments
+        group.generation += 1
+        self.lock.notify_all()
+
+    def commit(self, group_id: str, offsets: Dict[TopicPartition, OffsetAndMetadata]):
+        with self.lock:
+            self.groups[group_id].committed.update(offsets)
+
+    def committed(self, group_id: str, tp: TopicPartition) -> Optional[OffsetAndMetadata]:
+        with self.lock:
+            return self.groups[group_id].committed.get(tp)
+
+    def lag(self, group_id: str) -> int:
+        """Records not yet committed by a group, over its subscribed topics"""
+        with self.lock:
+            group = self.groups[group_id]
+            total = 0
+            for tps in group.assignments.values():
+                for tp in tps:
+                    committed = group.committed.get(tp)
+                    total += self.end_offset(tp) - (committed.offset if committed else 0)
+            return total
+
+
+# Process-wide broker used by kafka_client.py
+broker = MemoryBroker()
+
+
+class _SentFuture(Future):
+    """Already-resolved send() result with kafka-python's get()"""
+
+    def get(self, timeout=None):
+        if self.failed():
+            raise self.exception
+        return self.value
+
+
+class MemoryProducer:
+    """KafkaProducer-compatible producer for the in-memory broker"""
+
+    def __init__(self, broker: MemoryBroker = broker, **configs):
+        if not broker.available:
+            raise NoBrokersAvailable()
+        self.broker = broker
+        self.value_serializer = configs.get('value_serializer')
+        self.key_serializer = configs.get('key_serializer')
+        self._round_robin = itertools.count()
+        self._closed = False
+
+    def _partition(self, topic: str, key: Optional[bytes]) -> int:
+        partitions = len(self.broker.partitions_for(topic))
+        if key is None:
+            return next(self._round_robin) % partitions
+        # Same hashing as kafka-python's DefaultPartitioner
+        return (murmur2(key) & 0x7fffffff) % partitions
+
+    def send(self, topic: str, value=None, key=None, headers=None, partition=None, timestamp_ms=None):
+        """Append a record, returns a future resolved with its RecordMetadata"""
+        if self._closed:
+            raise IllegalStateError("Producer is closed")
+
+        future = _SentFuture()
+        if not self.broker.available:
+            return future.failure(KafkaTimeoutError("Broker unavailable"))
+
+        key_bytes = self.key_serializer(key) if self.key_serializer and key is not None else key
+        value_bytes = self.value_serializer(value) if self.value_serializer and value is not None else value
+        if partition is None:
+            partition = self._partition(topic, key_bytes)
+        timestamp_ms = timestamp_ms or int(time.time() * 1000)
+
+        offset = self.broker.append(topic, partition, key_bytes, value_bytes, headers, timestamp_ms)
+        tp = TopicPartition(topic, partition)
+        return future.success(RecordMetadata(
+            topic, partition, tp, offset, timestamp_ms, 0, None,
+            len(key_bytes) if key_bytes is not None else -1,
+            len(value_bytes) if value_bytes is not None else -1,
+            -1,
+        ))
+
+    def flush(self, timeout=None):
+        pass
+
+    def partitions_for(self, topic: str) -> Set[int]:
+        return self.broker.partitions_for(topic)
+
+    def metrics(self) -> dict:
+        return {}
+
+    def close(self, timeout=None):
+        self._closed = True
+
+
+class MemoryConsumer:
+    """KafkaConsumer-compatible group consumer for the in-memory broker"""
+
+    def __init__(self, *topics, broker: MemoryBroker = broker, **configs):
+        self.broker = broker
+        self.group_id = configs.get('group_id')
+        self.value_deserializer = configs.get('value_deserializer')
+        self.key_deserializer = configs.get('key_deserializer')
+        self.auto_offset_reset = configs.get('auto_offset_reset', 'latest')
+        self.enable_auto_commit = configs.get('enable_auto_commit', True) and self.group_id is not None
+        self.auto_commit_interval = configs.get('auto_commit_interval_ms', AUTO_COMMIT_INTERVAL_MS) / 1000
+        self.max_poll_records = configs.get('max_poll_records', MAX_POLL_RECORDS)
+        self.consumer_timeout = configs.get('consumer_timeout_ms', float('inf')) / 1000
+
+        self.subscription: Set[str] = set()
+        self._assignment: Set[TopicPartition] = set()
+        self._positions: Dict[TopicPartition, int] = {}
+        self._paused: Set[TopicPartition] = set()
+        self._generation = -1
+        self._next_partition = 0
+        self._last_auto_commit = time.monotonic()
+        self._buffer: List[ConsumerRecord] = []
+        self._closed = False
+
+        # Consumers without a group_id get every partition and never commit
+        self._group = self.group_id if self.group_id is not None else f"__standalone-{id(self)}"
+        self._member_id = None
+        if topics:
+            self.subscribe(topics)
+
+    # ----- Subscription and rebalancing -----
+
+    def subscribe(self, topics: Iterable[str]):
+        self.subscription = set(topics)
+        for topic in self.subscription:
+            self.broker.create_topic(topic)
+        if self._member_id is None:
+            self._member_id = self.broker.join(self._group, self)
+        else:
+            self.broker.resubscribe(self._group)
+
+    def unsubscribe(self):
+        self._revoke(self._assignment)
+        self.subscription = set()
+        self.broker.resubscribe(self._group)
+
+    def _sync_assignment(self):
+        """Adopt the group's latest assignment (called by the broker lock holder)"""
+        group = self.broker.groups[self._group]
+        if group.generation == self._generation:
+            return
+        self._generation = group.generation
+        assignment = group.assignments.get(self._member_id, set())
+
+        # Eager rebalance: everything is revoked (auto-committed if enabled) and
+        # positions restart from the committed offsets, pauses are reset
+        self._revoke(self._assignment)
+        self._assignment = set(assignment)
+        self._paused = set()
+        self._buffer = []
+        for tp in self._assignment:
+            self._positions[tp] = self._reset_position(tp)
+
+    def _revoke(self, partitions: Set[TopicPartition]):
+        if not partitions:
+            return
+        if self.enable_auto_commit:
+            self.commit({tp: OffsetAndMetadata(self._positions[tp], None) for tp in partitions if tp in self._positions})
+        for tp in partitions:
+            self._positions.pop(tp, None)
+
+    def _reset_position(self, tp: TopicPartition) -> int:
+        committed = self.broker.committed(self._group, tp) if self.group_id is not None else None
+        if committed is not None:
+            return committed.offset
+        return 0 if self.auto_offset_reset == 'earliest' else self.broker.end_offset(tp)
+
+    def assignment(self) -> Set[TopicPartition]:
+        with self.broker.lock:
+            self._sync_assignment()
+            return set(self._assignment)
+
+    # ----- Fetching -----
+
+    def _fetch(self, max_records: int) -> Dict[TopicPartition, List[ConsumerRecord]]:
+        records: Dict[TopicPartition, List[ConsumerRecord]] = {}
+        if not self.broker.available:
+            return records
+        partitions = sorted(self._assignment - self._paused)
+        # Rotate the starting partition so busy partitions cannot starve others
+        for i in range(len(partitions)):
+            if max_records <= 0:
+                break
+            tp = partitions[(self._next_partition + i) % len(partitions)]
+            fetched = self.broker.fetch(tp, self._positions[tp], max_records)
+            if fetched:
+                records[tp] = [self._deserialize(r) for r in fetched]
+                self._positions[tp] = fetched[-1].offset + 1
+                max_records -= len(fetched)
+        self._next_partition += 1
+        return records
+
+    def _deserialize(self, record: ConsumerRecord) -> ConsumerRecord:
+        key, value = record.key, record.value
+        if self.key_deserializer and key is not None:
+            key = self.key_deserializer(key)
+        if self.value_deserializer and value is not None:
+            value = self.value_deserializer(value)
+        return record._replace(key=key, value=value)
+
+    def poll(self, timeout_ms: int = 0, max_records: Optional[int] = None, update_offsets: bool = True):
+        """Fetch records from the assigned, unpaused partitions"""
+        if self._closed:
+            raise IllegalStateError("Consumer is closed")
+        self._maybe_auto_commit()
+
+        deadline = time.monotonic() + timeout_ms / 1000
+        with self.broker.lock:
+            while True:
+                self._sync_assignment()
+                records = self._fetch(max_records or self.max_poll_records)
+                remaining = deadline - time.monotonic()
+                if records or remaining <= 0:
+                    return records
+                self.broker.lock.wait(remaining)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        deadline = time.monotonic() + self.consumer_timeout
+        while not self._buffer:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise StopIteration()
+            for messages in self.poll(timeout_ms=int(min(remaining, 1.0) * 1000)).values():
+                self._buffer.extend(messages)
+        return self._buffer.pop(0)
+
+    # ----- Positions and offsets -----
+
+    def pause(self, *partitions: TopicPartition):
+        with self.broker.lock:
+            self._paused.update(tp for tp in partitions if tp in self._assignment)
+
+    def resume(self, *partitions: TopicPartition):
+        with self.broker.lock:
+            self._paused.difference_update(partitions)
+
+    def paused(self) -> Set[TopicPartition]:
+        return set(self._paused)
+
+    def seek(self, partition: TopicPartition, offset: int):
+        with self.broker.lock:
+            if partition not in self._assignment:
+                raise IllegalStateError(f"No current assignment for partition {partition}")
+            self._positions[partition] = offset
+            self._buffer = [r for r in self._buffer if (r.topic, r.partition) != partition]
+
+    def seek_to_beginning(self, *partitions: TopicPartition):
+        for tp in partitions or self.assignment():
+            self.seek(tp, 0)
+
+    def seek_to_end(self, *partitions: TopicPartition):
+        for tp in partitions or self.assignment():
+            self.seek(tp, self.broker.end_offset(tp))
+
+    def position(self, partition: TopicPartition) -> int:
+        return self._positions[partition]
+
+    def committed(self, partition: TopicPartition) -> Optional[int]:
+        offset = self.broker.committed(self._group, partition)
+        return offset.offset if offset else None
+
+    def end_offsets(self, partitions: Iterable[TopicPartition]) -> Dict[TopicPartition, int]:
+        return {tp: self.broker.end_offset(tp) for tp in partitions}
+
+    def beginning_offsets(self, partitions: Iterable[TopicPartition]) -> Dict[TopicPartition, int]:
+        return {tp: 0 for tp in partitions}
+
+    def partitions_for_topic(self, topic: str) -> Set[int]:
+        return self.broker.partitions_for(topic)
+
+    def topics(self) -> Set[str]:
+        with self.broker.lock:
+            return set(self.broker.topics)
+
+    def commit(self, offsets: Optional[Dict[TopicPartition, OffsetAndMetadata]] = None):
+        """Commit the given offsets, or the current positions"""
+        if self.group_id is None:
+            raise IllegalStateError("Requires group_id")
+        if offsets is None:
+            offsets = {tp: OffsetAndMetadata(p, None) for tp, p in self._positions.items()}
+        self.broker.commit(self.group_id, offsets)
+
+    def _maybe_auto_commit(self):
+        if self.enable_auto_commit and time.monotonic() - self._last_auto_commit >= self.auto_commit_interval:
+            self._last_auto_commit = time.monotonic()
+            self.commit()
+
+    def close(self, autocommit: bool = True):
+        if self._closed:
+            return
+        if autocommit and self.enable_auto_commit:
+            self.commit()
+        self._closed = True
+        if self._member_id is not None:
+            self.broker.leave(self._group, self._member_id)
+
+    def metrics(self) -> dict:
+        return {}
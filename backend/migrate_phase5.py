@@ -4,6 +4,7 @@ Adds advanced features to tasks table
 """
 
 from sqlmodel import create_engine, text
+import glob
 import os
 from dotenv import load_dotenv
 
@@ -20,21 +21,32 @@ engine = create_engine(DATABASE_URL, echo=True)
 def run_migration():
     print("🔄 Running Phase V migration...")
     
+    failed = 0
     with engine.connect() as conn:
-        # Read SQL file
-        with open('migrations/add_advanced_features.sql', 'r') as f:
-            sql = f.read()
+        # Read SQL files (every statement is idempotent)
+        for path in sorted(glob.glob('migrations/*.sql')):
+            print(f"📄 Applying {path}")
+            with open(path, 'r') as f:
+                sql = f.read()
+            
+            # Execute each statement in a savepoint: on PostgreSQL a failed
+            # statement would otherwise abort every statement after it
+            for statement in sql.split(';'):
+                if statement.strip():
+                    try:
+                        with conn.begin_nested():
+                            conn.execute(text(statement))
+                    except Exception as e:
+                        failed += 1
+                        print(f"⚠️  Statement failed (may already exist): {e}")
+            
+            # Committed per file, a later file's problems never undo it
+            conn.commit()
         
-        # Execute each statement
-        for statement in sql.split(';'):
-            if statement.strip():
-                try:
-                    conn.execute(text(statement))
-                except Exception as e:
-                    print(f"⚠️  Statement failed (may already exist): {e}")
-        
-        conn.commit()
-        print("✅ Phase V migration completed!")
+        if failed:
+            print(f"⚠️  Phase V migration completed, {failed} statements failed (see above)")
+        else:
+            print("✅ Phase V migration completed!")
 
 if __name__ == "__main__":
     run_migration()
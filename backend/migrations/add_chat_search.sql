@@ -0,0 +1,15 @@
+-- Chat history search: a stored tsvector of each message, indexed with its user
+-- The vector is computed once on write, ranking reads it instead of re-parsing content.
+-- btree_gin (PostgreSQL contrib) lets one GIN index hold user_id and the vector,
+-- so a search only visits the user's own postings.
+
+ALTER TABLE messages ADD COLUMN IF NOT EXISTS search_vector tsvector
+GENERATED ALWAYS AS (to_tsvector('english', content)) STORED;
+
+CREATE EXTENSION IF NOT EXISTS btree_gin;
+
+CREATE INDEX IF NOT EXISTS idx_messages_user_search
+ON messages USING GIN (user_id, search_vector);
+
+-- Replaced by idx_messages_user_search
+DROP INDEX IF EXISTS idx_messages_content_search;
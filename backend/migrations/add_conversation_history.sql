@@ -0,0 +1,4 @@
+-- Conversation history: messages are loaded as the latest N of a conversation
+
+CREATE INDEX IF NOT EXISTS idx_messages_conversation_created
+ON messages (conversation_id, created_at);
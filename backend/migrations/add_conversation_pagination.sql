@@ -0,0 +1,17 @@
+-- Conversation list: message counts kept on the row, recent-first listing by index
+
+ALTER TABLE conversations
+ADD COLUMN IF NOT EXISTS message_count INTEGER NOT NULL DEFAULT 0;
+
+-- Backfill the counts of existing conversations (one grouped pass over messages)
+UPDATE conversations c
+SET message_count = counts.total
+FROM (
+    SELECT conversation_id, COUNT(*) AS total
+    FROM messages
+    GROUP BY conversation_id
+) counts
+WHERE counts.conversation_id = c.id;
+
+CREATE INDEX IF NOT EXISTS idx_conversations_user_updated
+ON conversations (user_id, updated_at);
@@ -0,0 +1,8 @@
+-- Rolling conversation summary: older messages are folded into a summary
+
+ALTER TABLE conversations
+ADD COLUMN IF NOT EXISTS summary TEXT;
+
+-- Id of the last message included in the summary
+ALTER TABLE conversations
+ADD COLUMN IF NOT EXISTS summarized_through INTEGER;
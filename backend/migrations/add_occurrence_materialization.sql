@@ -0,0 +1,15 @@
+-- Recurring Task Materializer: idempotent occurrences
+
+-- Date of the occurrence within its series (parent_task_id)
+ALTER TABLE tasks
+ADD COLUMN IF NOT EXISTS occurrence_date DATE;
+
+-- One task per series and date, lets the job skip existing occurrences
+CREATE UNIQUE INDEX IF NOT EXISTS uq_tasks_occurrence
+ON tasks (parent_task_id, occurrence_date)
+WHERE parent_task_id IS NOT NULL AND occurrence_date IS NOT NULL;
+
+-- Recurring series ordered by user for chunked runs
+CREATE INDEX IF NOT EXISTS idx_tasks_recurring_series
+ON tasks (user_id)
+WHERE is_recurring = true AND parent_task_id IS NULL;
@@ -0,0 +1,5 @@
+-- Recurrence Engine: RRULE-style recurrence rules
+
+-- RRULE string such as FREQ=WEEKLY with BYDAY=MO,WE (NULL = recurrence_type/interval)
+ALTER TABLE tasks
+ADD COLUMN IF NOT EXISTS recurrence_rule VARCHAR(255);
@@ -0,0 +1,18 @@
+-- Reminder Scheduler: fire tracking and time index
+
+-- Last reminder time claimed for firing (set before the publish)
+ALTER TABLE tasks
+ADD COLUMN IF NOT EXISTS reminder_fired_at TIMESTAMP;
+
+-- Last reminder time the broker acked (set after the publish, the reminder counts as fired)
+ALTER TABLE tasks
+ADD COLUMN IF NOT EXISTS reminder_published_at TIMESTAMP;
+
+-- Claims made before reminder_published_at existed were published in the same transaction
+UPDATE tasks SET reminder_published_at = reminder_fired_at
+WHERE reminder_published_at IS NULL AND reminder_fired_at IS NOT NULL;
+
+-- Index the effective reminder time of open tasks for sliding-window loads
+CREATE INDEX IF NOT EXISTS idx_tasks_reminder_at
+ON tasks ((COALESCE(reminder_time, due_date)), id)
+WHERE completed = false;
@@ -1,5 +1,6 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import Optional, List
+from sqlalchemy import Index
 from sqlmodel import Field, SQLModel
 from enum import Enum
 
@@ -18,10 +19,14 @@ class Task(SQLModel, table=True):
     tags: str = Field(default="")
     due_date: Optional[datetime] = None
     reminder_time: Optional[datetime] = None
+    reminder_fired_at: Optional[datetime] = None
+    reminder_published_at: Optional[datetime] = None
     is_recurring: bool = Field(default=False)
     recurrence_type: Optional[str] = None
     recurrence_interval: int = Field(default=1)
+    recurrence_rule: Optional[str] = Field(default=None, max_length=255)
     parent_task_id: Optional[int] = None
+    occurrence_date: Optional[date] = None
 
     __tablename__ = "tasks"
 
@@ -54,21 +59,35 @@ class TaskResponse(SQLModel):
     updated_at: datetime
 
 
+class TaskCreateResponse(TaskResponse):
+    """Created task, with the user's existing tasks it likely duplicates"""
+    possible_duplicates: List[dict] = []
+
+
 class Conversation(SQLModel, table=True):
     """Conversation model for chat sessions."""
 
     __tablename__ = "conversations"
+    # Conversations are listed as "user's most recently active first"
+    __table_args__ = (Index("idx_conversations_user_updated", "user_id", "updated_at"),)
 
     id: Optional[int] = Field(default=None, primary_key=True)
     user_id: str = Field(index=True, nullable=False)
     created_at: datetime = Field(default_factory=datetime.now)
     updated_at: datetime = Field(default_factory=datetime.now)
+    # Maintained by save_exchange, listings never count messages
+    message_count: int = Field(default=0, nullable=False)
+    # Rolling summary of messages up to and including summarized_through
+    summary: Optional[str] = Field(default=None)
+    summarized_through: Optional[int] = Field(default=None)
 
 
 class Message(SQLModel, table=True):
     """Message model for chat history."""
 
     __tablename__ = "messages"
+    # History is read as "latest N messages of a conversation"
+    __table_args__ = (Index("idx_messages_conversation_created", "conversation_id", "created_at"),)
 
     id: Optional[int] = Field(default=None, primary_key=True)
     conversation_id: int = Field(foreign_key="conversations.id", index=True)
@@ -78,6 +97,29 @@ class Message(SQLModel, table=True):
     created_at: datetime = Field(default_factory=datetime.now)
 
 
+class ClassifyRequest(SQLModel):
+    """Schema for batch priority classification."""
+    # Titles to classify, or leave empty to classify stored tasks
+    titles: List[str] = []
+    # Stored tasks to classify (all of the user's when omitted, a page at a time)
+    task_ids: Optional[List[int]] = None
+    # Continue the user's stored tasks after this id (next_after_id of the previous page)
+    after_id: Optional[int] = None
+    # Save the suggested priorities of stored tasks
+    write_back: bool = False
+
+
+class ClassifyResponse(SQLModel):
+    """Schema for batch priority classification results."""
+    priorities: List[str]
+    task_ids: Optional[List[int]] = None
+    counts: dict
+    updated: int = 0
+    # More stored tasks follow, pass as after_id
+    next_after_id: Optional[int] = None
+    ms: float
+
+
 class ChatRequest(SQLModel):
     """Schema for chat request."""
     message: str = Field(min_length=1)
@@ -89,6 +131,50 @@ class ChatResponse(SQLModel):
     conversation_id: int
     response: str
     tool_calls: List[str] = []
+    message_id: Optional[int] = None
+    prompt_tokens: Optional[int] = None
+    # Per tool call: name, ok, ms and the size of the batch it ran in
+    tool_timings: List[dict] = []
+    # Answered from the response cache, without calling the model
+    cached: bool = False
+    # The turn's usage record (tokens, model, LLM/tool time), with CHAT_DEBUG
+    debug: Optional[dict] = None
+
+
+class ConversationInfo(SQLModel):
+    """Schema for a conversation in the conversation list."""
+    id: int
+    created_at: datetime
+    updated_at: datetime
+    message_count: int
+
+
+class MessageInfo(SQLModel):
+    """Schema for a stored chat message."""
+    id: int
+    role: str
+    content: str
+    created_at: datetime
+
+
+class ChatSearchHit(SQLModel):
+    """Schema for a message matching a chat search."""
+    message_id: int
+    conversation_id: int
+    role: str
+    created_at: datetime
+    rank: float
+    # Excerpt around the matches, matched words wrapped in **
+    snippet: str
+
+
+class ChatSearchResponse(SQLModel):
+    """Schema for a page of chat search results."""
+    query: str
+    results: List[ChatSearchHit]
+    next_offset: Optional[int] = None
+    backend: str
+    ms: float
 
 # ===== Phase V: Advanced Features =====
 
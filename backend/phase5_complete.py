@@ -4,7 +4,7 @@ from typing import Optional, List
 from datetime import datetime
 import uvicorn
 import json
-from kafka import KafkaProducer, KafkaConsumer
+from kafka_producer import TodoKafkaProducer
 from enum import Enum
 import asyncio
 
@@ -43,19 +43,12 @@ KAFKA_BOOTSTRAP = "todo-kafka:9092"
 KAFKA_TOPIC_TASKS = "todo-tasks"
 KAFKA_TOPIC_EVENTS = "todo-events"
 
-try:
-    producer = KafkaProducer(
-        bootstrap_servers=[KAFKA_BOOTSTRAP],
-        value_serializer=lambda x: json.dumps(x).encode('utf-8'),
-        acks='all',
-        retries=3
-    )
-    KAFKA_ENABLED = True
-    print(f"✅ Kafka Producer connected to {KAFKA_BOOTSTRAP}")
-except Exception as e:
-    print(f"⚠️ Kafka Producer disabled: {e}")
-    producer = None
-    KAFKA_ENABLED = False
+# Connects in the background on startup, events are buffered while Kafka is down
+producer = TodoKafkaProducer(bootstrap_servers=[KAFKA_BOOTSTRAP])
+
+@app.on_event("startup")
+def start_kafka():
+    producer.start()
 
 # ===== IN-MEMORY STORAGE =====
 tasks_db = {}
@@ -74,7 +67,7 @@ async def root():
             "Reminders",
             "Backward compatible with Phase III"
         ],
-        "kafka": "enabled" if KAFKA_ENABLED else "disabled",
+        "kafka": "connected" if producer.connected else "reconnecting",
         "endpoints": {
             "phase3_compatible": "POST /api/{user_id}/tasks",
             "phase5_advanced": "POST /api/{user_id}/tasks/advanced",
@@ -89,7 +82,7 @@ async def health():
         "status": "healthy",
         "phase": "V",
         "timestamp": datetime.utcnow().isoformat(),
-        "kafka": KAFKA_ENABLED,
+        "kafka": producer.health(),
         "tasks_count": len(tasks_db)
     }
 
@@ -143,29 +136,21 @@ async def create_advanced_task(user_id: str, task: TaskCreatePhase5):
     tasks_db[task_id_counter] = task_data
     
     # Send event to Kafka
-    kafka_event_sent = False
-    if KAFKA_ENABLED and producer:
-        try:
-            event = {
-                "event_type": "TASK_CREATED_ADVANCED",
-                "event_id": f"evt_{task_id_counter}_{datetime.utcnow().timestamp()}",
-                "timestamp": datetime.utcnow().isoformat(),
-                "user_id": user_id,
-                "task_id": task_id_counter,
-                "task_data": task_data,
-                "features_used": ["priority", "tags", "due_date", "kafka"]
-            }
-            
-            # Send to both topics for demonstration
-            producer.send(KAFKA_TOPIC_TASKS, task_data)
-            producer.send(KAFKA_TOPIC_EVENTS, event)
-            producer.flush()
-            
-            kafka_event_sent = True
-            print(f"📨 Phase V task sent to Kafka: {task.title}")
-            
-        except Exception as e:
-            print(f"❌ Kafka error: {e}")
+    event = {
+        "event_type": "TASK_CREATED_ADVANCED",
+        "event_id": f"evt_{task_id_counter}_{datetime.utcnow().timestamp()}",
+        "timestamp": datetime.utcnow().isoformat(),
+        "user_id": user_id,
+        "task_id": task_id_counter,
+        "task_data": task_data,
+        "features_used": ["priority", "tags", "due_date", "kafka"]
+    }
+    
+    # Send to both topics for demonstration (never blocks, buffered while Kafka is down)
+    kafka_event_sent = producer.send_event(KAFKA_TOPIC_TASKS, task_data)
+    kafka_event_sent = producer.send_event(KAFKA_TOPIC_EVENTS, event) and kafka_event_sent
+    if kafka_event_sent:
+        print(f"📨 Phase V task sent to Kafka: {task.title}")
     
     task_id_counter += 1
     
@@ -173,9 +158,10 @@ async def create_advanced_task(user_id: str, task: TaskCreatePhase5):
         "message": "Advanced task created successfully (Phase V)",
         "task": task_data,
         "kafka": {
-            "enabled": KAFKA_ENABLED,
+            "connected": producer.connected,
             "event_sent": kafka_event_sent,
-            "topics": [KAFKA_TOPIC_TASKS, KAFKA_TOPIC_EVENTS] if kafka_event_sent else None
+            "event_buffered": not kafka_event_sent,
+            "topics": [KAFKA_TOPIC_TASKS, KAFKA_TOPIC_EVENTS]
         },
         "advanced_features": [
             "priority_system",
@@ -222,7 +208,7 @@ async def get_stats():
         "phase_v_tasks": phase_v_tasks,
         "phase_iii_tasks": phase_iii_tasks,
         "priority_distribution": priorities,
-        "kafka_enabled": KAFKA_ENABLED
+        "kafka_connected": producer.connected
     }
 
 if __name__ == "__main__":
@@ -244,9 +230,8 @@ if __name__ == "__main__":
     print("  • GET  /api/stats                     (Statistics)")
     print("  • GET  /health                        (Health check)")
     print("")
-    print(f"📊 Kafka: {'✅ CONNECTED' if KAFKA_ENABLED else '⚠️ DISABLED'}")
-    if KAFKA_ENABLED:
-        print(f"   Topics: {KAFKA_TOPIC_TASKS}, {KAFKA_TOPIC_EVENTS}")
+    print(f"📊 Kafka: {KAFKA_BOOTSTRAP} (connects in the background)")
+    print(f"   Topics: {KAFKA_TOPIC_TASKS}, {KAFKA_TOPIC_EVENTS}")
     print("=" * 60)
     
     uvicorn.run(app, host="0.0.0.0", port=8000, log_level="info")
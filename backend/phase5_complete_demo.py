@@ -4,7 +4,8 @@ from typing import Optional, List
 from datetime import datetime
 import uvicorn
 import json
-from kafka import KafkaProducer, KafkaConsumer
+from kafka_client import create_consumer
+from kafka_producer import TodoKafkaProducer
 from enum import Enum
 import threading
 import time
@@ -34,46 +35,45 @@ print("="*70)
 # ===== KAFKA SETUP =====
 class KafkaManager:
     def __init__(self):
-        self.producer = None
-        self.consumers = {}
-        self.connected = False
-        self.setup_kafka()
+        # Nothing connects at import: the producer reconnects in the background
+        # with backoff and buffers events while Kafka is down
+        self.producer = TodoKafkaProducer(
+            bootstrap_servers=[KAFKA_BOOTSTRAP],
+            api_version=(2, 0, 2),
+            request_timeout_ms=5000
+        )
+        self.consumer_started = False
     
-    def setup_kafka(self):
-        try:
-            self.producer = KafkaProducer(
-                bootstrap_servers=[KAFKA_BOOTSTRAP],
-                value_serializer=lambda x: json.dumps(x).encode('utf-8'),
-                api_version=(2, 0, 2),
-                request_timeout_ms=5000
-            )
-            
-            # Test connection
-            test_msg = {'phase': 'V', 'test': True, 'timestamp': time.time()}
-            future = self.producer.send(TOPICS['events'], test_msg)
-            future.get(timeout=5)
-            
-            self.connected = True
-            print("✅ Kafka Producer: CONNECTED")
-            
-            # Start background consumer for demo
+    @property
+    def connected(self):
+        return self.producer.connected
+    
+    def start(self):
+        """Start the background producer and demo consumer (never blocks)"""
+        self.producer.start()
+        if not self.consumer_started:
+            self.consumer_started = True
             self.start_event_consumer()
-            
-        except Exception as e:
-            print(f"⚠️ Kafka Producer: DISCONNECTED - {str(e)[:80]}")
-            self.connected = False
     
     def start_event_consumer(self):
         """Start a background consumer to show real-time events"""
         def consume_events():
-            consumer = KafkaConsumer(
-                TOPICS['events'],
-                bootstrap_servers=[KAFKA_BOOTSTRAP],
-                auto_offset_reset='earliest',
-                enable_auto_commit=True,
-                group_id='phase5-demo-group',
-                value_deserializer=lambda x: json.loads(x.decode('utf-8'))
-            )
+            backoff = 1
+            while True:
+                try:
+                    consumer = create_consumer(
+                        TOPICS['events'],
+                        bootstrap_servers=[KAFKA_BOOTSTRAP],
+                        auto_offset_reset='earliest',
+                        enable_auto_commit=True,
+                        group_id='phase5-demo-group',
+                        value_deserializer=lambda x: json.loads(x.decode('utf-8'))
+                    )
+                    break
+                except Exception as e:
+                    print(f"⚠️ Kafka Consumer: retrying in {backoff}s - {str(e)[:80]}")
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, 60)
             
             print(f"👂 Listening for events on '{TOPICS['events']}' topic...")
             event_count = 0
@@ -89,33 +89,29 @@ class KafkaManager:
         thread.start()
     
     def send_event(self, event_type: str, data: dict):
-        if not self.connected or not self.producer:
-            return {"status": "kafka_disconnected", "mode": "simulated"}
+        event = {
+            "event_type": event_type,
+            "event_id": f"{event_type}_{int(time.time())}",
+            "timestamp": datetime.utcnow().isoformat(),
+            "data": data,
+            "phase": "V"
+        }
         
-        try:
-            event = {
-                "event_type": event_type,
-                "event_id": f"{event_type}_{int(time.time())}",
-                "timestamp": datetime.utcnow().isoformat(),
-                "data": data,
-                "phase": "V"
-            }
-            
-            future = self.producer.send(TOPICS['events'], event)
-            result = future.get(timeout=5)
-            
-            return {
-                "status": "sent",
-                "topic": TOPICS['events'],
-                "partition": result.partition,
-                "offset": result.offset,
-                "event_id": event["event_id"]
-            }
-        except Exception as e:
-            return {"status": "failed", "error": str(e)}
+        # Never blocks the event loop: buffered while the circuit is open
+        sent = self.producer.send_event(TOPICS['events'], event)
+        return {
+            "status": "sent" if sent else "buffered",
+            "topic": TOPICS['events'],
+            "event_id": event["event_id"],
+            "circuit": self.producer.breaker.state
+        }
 
 kafka_manager = KafkaManager()
 
+@app.on_event("startup")
+def start_kafka():
+    kafka_manager.start()
+
 # ===== MODELS =====
 class Priority(str, Enum):
     LOW = "low"
@@ -176,7 +172,7 @@ async def health():
     return {
         "status": "healthy",
         "phase": "V",
-        "kafka": kafka_manager.connected,
+        "kafka": kafka_manager.producer.health(),
         "tasks_count": len(demo_tasks),
         "timestamp": datetime.utcnow().isoformat()
     }
@@ -185,6 +181,7 @@ async def health():
 async def kafka_status():
     return {
         "connected": kafka_manager.connected,
+        "producer": kafka_manager.producer.health(),
         "bootstrap_server": KAFKA_BOOTSTRAP,
         "topics": TOPICS,
         "test_event": kafka_manager.send_event("STATUS_CHECK", {"check": "api"})
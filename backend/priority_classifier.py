@@ -0,0 +1,94 @@
+"""
+Priority Classifier
+Keyword priority of many task titles in one pass
+
+Same rule as AIAgent.analyze_priority: a title containing a high-priority
+keyword is high, else one containing a low-priority keyword is low, else
+medium. Instead of a Python loop over keywords per title, the titles are
+joined into one string that each keyword scans with a single compiled
+literal search, and the matches are mapped back to their titles by
+offset with a binary search. One combined alternation regex measured
+slower than the per-title loop (no literal fast path), so it is not used.
+"""
+
+import re
+from datetime import datetime
+from typing import Dict, List
+
+import numpy as np
+from sqlalchemy import case, update
+from sqlmodel import Session
+
+import task_state
+from models import Task
+
+HIGH_KEYWORDS = ['urgent', 'asap', 'critical', 'important', 'high']
+LOW_KEYWORDS = ['low', 'someday', 'maybe', 'optional']
+
+# Substring matches, like the `word in title` checks they replace
+_LITERALS = {keyword: re.compile(re.escape(keyword)) for keyword in HIGH_KEYWORDS + LOW_KEYWORDS}
+_SEPARATOR = "\n"
+
+
+def _keyword_rows(text: str, starts: np.ndarray, keywords: List[str]) -> np.ndarray:
+    """Indexes of the titles in which any of the keywords occurs"""
+    positions = []
+    for keyword in keywords:
+        # A literal pattern is a plain substring search over the whole batch
+        positions += [match.start() for match in _LITERALS[keyword].finditer(text)]
+    return np.searchsorted(starts, positions, side="right") - 1
+
+
+def classify_priorities(titles: List[str]) -> List[str]:
+    """'high', 'medium' or 'low' for each title"""
+    if not titles:
+        return []
+    # No keyword contains the separator, so matches never span two titles
+    # Lowered per title: lower() may change the length of some characters
+    lowered = [(title or "").lower() for title in titles]
+    text = _SEPARATOR.join(lowered)
+    lengths = np.fromiter(map(len, lowered), dtype=np.int64, count=len(lowered)) + 1
+    starts = np.concatenate(([0], np.cumsum(lengths[:-1])))
+
+    priorities = np.full(len(lowered), "medium", dtype=object)
+    priorities[_keyword_rows(text, starts, LOW_KEYWORDS)] = "low"
+    priorities[_keyword_rows(text, starts, HIGH_KEYWORDS)] = "high"
+    return priorities.tolist()
+
+
+def classify_priority(title: str) -> str:
+    """Priority of a single title (a few substring checks beat any batching here)"""
+    title = (title or "").lower()
+    if any(word in title for word in HIGH_KEYWORDS):
+        return "high"
+    if any(word in title for word in LOW_KEYWORDS):
+        return "low"
+    return "medium"
+
+
+def priority_counts(priorities: List[str]) -> Dict[str, int]:
+    return {priority: priorities.count(priority) for priority in ("high", "medium", "low")}
+
+
+def save_priorities(session: Session, user_id: str, priorities: Dict[int, str]) -> int:
+    """Set the priority of many tasks with one UPDATE, the caller commits"""
+    if not priorities:
+        return 0
+    by_priority: Dict[str, List[int]] = {}
+    for task_id, priority in priorities.items():
+        by_priority.setdefault(priority, []).append(task_id)
+    result = session.execute(
+        update(Task)
+        .where(Task.user_id == user_id, Task.id.in_(list(priorities)))
+        .values(
+            priority=case(
+                *[(Task.id.in_(ids), priority) for priority, ids in by_priority.items()],
+                else_=Task.priority
+            ),
+            updated_at=datetime.now()
+        )
+        .execution_options(synchronize_session=False)
+    )
+    # Bulk UPDATE bypasses the flush events that track task changes
+    task_state.touch(session, user_id)
+    return result.rowcount
@@ -0,0 +1,260 @@
+"""
+Recurrence Engine
+Calendar-correct, RRULE-like recurrence rules with vectorized expansion
+
+Rules are stored on tasks as a subset of RFC 5545 RRULE strings, e.g.
+"FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,WE;UNTIL=20261231T000000" or
+"FREQ=MONTHLY;BYMONTHDAY=-1;COUNT=12". Tasks without a rule fall back to
+recurrence_type/recurrence_interval.
+
+Occurrences keep the time of day of the series start. Monthly and yearly
+rules without BYMONTHDAY keep the start's day of month, clamped to the end
+of shorter months (Jan 31 -> Feb 28 -> Mar 31), so series never drift.
+Explicit BYMONTHDAY values follow RRULE and skip months without that day.
+"""
+
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import List, Optional
+import numpy as np
+
+FREQUENCIES = ('daily', 'weekly', 'monthly', 'yearly')
+WEEKDAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+
+# Upper bound on periods generated for COUNT rules
+MAX_PERIODS = 100000
+
+# numpy's day 0 (1970-01-01) is a Thursday
+_EPOCH_WEEKDAY = 3
+
+
+@dataclass
+class RecurrenceRule:
+    """RRULE-like recurrence rule"""
+    freq: str
+    interval: int = 1
+    by_weekday: List[int] = field(default_factory=list)    # 0 = Monday
+    by_month_day: List[int] = field(default_factory=list)  # 1..31 or -31..-1
+    until: Optional[datetime] = None
+    count: Optional[int] = None
+
+    def __post_init__(self):
+        self.freq = self.freq.lower()
+        if self.freq not in FREQUENCIES:
+            raise ValueError(f"Unsupported recurrence frequency: {self.freq}")
+        if self.interval < 1:
+            raise ValueError("Recurrence interval must be at least 1")
+        if self.count is not None and self.count < 1:
+            raise ValueError("Recurrence count must be at least 1")
+        if any(d == 0 or not -31 <= d <= 31 for d in self.by_month_day):
+            raise ValueError("BYMONTHDAY values must be in 1..31 or -31..-1")
+        if self.by_weekday and self.freq == 'yearly':
+            raise ValueError("BYDAY is not supported for yearly rules")
+
+    @classmethod
+    def parse(cls, rule: str) -> "RecurrenceRule":
+        """Parse an RRULE string such as FREQ=WEEKLY;BYDAY=MO,FR"""
+        parts = {}
+        for part in rule.strip().removeprefix('RRULE:').split(';'):
+            if part:
+                key, _, value = part.partition('=')
+                parts[key.strip().upper()] = value.strip()
+
+        if 'FREQ' not in parts:
+            raise ValueError("Recurrence rule needs FREQ")
+        try:
+            by_weekday = [WEEKDAYS.index(d.upper()) for d in parts['BYDAY'].split(',')] if 'BYDAY' in parts else []
+        except ValueError:
+            raise ValueError(f"Invalid BYDAY: {parts['BYDAY']}")
+
+        return cls(
+            freq=parts['FREQ'],
+            interval=int(parts.get('INTERVAL', 1)),
+            by_weekday=sorted(set(by_weekday)),
+            by_month_day=sorted({int(d) for d in parts['BYMONTHDAY'].split(',')}) if 'BYMONTHDAY' in parts else [],
+            until=_parse_until(parts['UNTIL']) if 'UNTIL' in parts else None,
+            count=int(parts['COUNT']) if 'COUNT' in parts else None,
+        )
+
+    @classmethod
+    def from_task(cls, task) -> Optional["RecurrenceRule"]:
+        """Rule of a recurring task (recurrence_rule, else type/interval)"""
+        if not task.is_recurring:
+            return None
+        if getattr(task, 'recurrence_rule', None):
+            return cls.parse(task.recurrence_rule)
+        return cls(freq=task.recurrence_type or 'daily', interval=task.recurrence_interval or 1)
+
+    def to_string(self) -> str:
+        """Serialize back to an RRULE string"""
+        parts = [f"FREQ={self.freq.upper()}"]
+        if self.interval != 1:
+            parts.append(f"INTERVAL={self.interval}")
+        if self.by_weekday:
+            parts.append("BYDAY=" + ",".join(WEEKDAYS[d] for d in self.by_weekday))
+        if self.by_month_day:
+            parts.append("BYMONTHDAY=" + ",".join(str(d) for d in self.by_month_day))
+        if self.until:
+            parts.append(f"UNTIL={self.until.strftime('%Y%m%dT%H%M%S')}")
+        if self.count:
+            parts.append(f"COUNT={self.count}")
+        return ";".join(parts)
+
+
+def _parse_until(value: str) -> datetime:
+    value = value.rstrip('Z')
+    for fmt in ('%Y%m%dT%H%M%S', '%Y%m%d'):
+        try:
+            return datetime.strptime(value, fmt)
+        except ValueError:
+            pass
+    return datetime.fromisoformat(value)
+
+
+def _weekday(days: np.ndarray) -> np.ndarray:
+    """Weekday (0 = Monday) of datetime64[D] values"""
+    return (days.astype(np.int64) + _EPOCH_WEEKDAY) % 7
+
+
+def _period_index(rule: RecurrenceRule, start: np.datetime64, day: np.datetime64) -> int:
+    """Index of the period (of `interval` units) that contains `day`"""
+    if rule.freq == 'daily':
+        units = (day - start).astype(np.int64)
+    elif rule.freq == 'weekly':
+        monday = lambda d: d - _weekday(np.array([d]))[0]
+        units = (monday(day) - monday(start)).astype(np.int64) // 7
+    elif rule.freq == 'monthly':
+        units = (day.astype('datetime64[M]') - start.astype('datetime64[M]')).astype(np.int64)
+    else:
+        units = (day.astype('datetime64[Y]') - start.astype('datetime64[Y]')).astype(np.int64)
+    return max(0, int(units) // rule.interval)
+
+
+def _month_days(rule: RecurrenceRule, months: np.ndarray, start_day: int) -> np.ndarray:
+    """Candidate days (2-D, NaT where invalid) for each month in `months`"""
+    first = months.astype('datetime64[D]')
+    next_first = (months + 1).astype('datetime64[D]')
+    length = (next_first - first).astype(np.int64)
+
+    if rule.by_weekday:
+        # Every matching weekday in the month
+        offsets = np.arange(31)
+        days = first[:, None] + offsets[None, :]
+        valid = (offsets[None, :] < length[:, None]) & np.isin(_weekday(days), rule.by_weekday)
+        if rule.by_month_day:
+            day_of_month = offsets[None, :] + 1
+            from_end = day_of_month - length[:, None] - 1
+            valid &= np.isin(day_of_month, rule.by_month_day) | np.isin(from_end, rule.by_month_day)
+    elif rule.by_month_day:
+        month_day = np.array(rule.by_month_day)
+        offsets = np.where(month_day > 0, month_day - 1, length[:, None] + month_day)
+        days = first[:, None] + offsets
+        valid = (offsets >= 0) & (offsets < length[:, None])
+    else:
+        # Start's day of month, clamped to the month length
+        offsets = np.minimum(start_day - 1, length - 1)[:, None]
+        days = first[:, None] + offsets
+        valid = np.ones(days.shape, dtype=bool)
+
+    return np.sort(np.where(valid, days, np.datetime64('NaT')), axis=1)
+
+
+def _generate(rule: RecurrenceRule, start: np.datetime64, start_date: datetime, periods: np.ndarray) -> np.ndarray:
+    """Occurrence days (datetime64[D], sorted) for the given period indexes"""
+    step = periods * rule.interval
+
+    if rule.freq == 'daily':
+        days = (start + step)[:, None]
+    elif rule.freq == 'weekly':
+        week_start = start - _weekday(np.array([start]))[0]
+        weekdays = np.array(rule.by_weekday or [start_date.weekday()])
+        days = (week_start + step * 7)[:, None] + weekdays[None, :]
+    elif rule.freq == 'monthly':
+        months = start.astype('datetime64[M]') + step
+        days = _month_days(rule, months, start_date.day)
+    else:
+        years = start.astype('datetime64[Y]') + step
+        if rule.by_month_day:
+            # BYMONTHDAY applies to every month of the year
+            months = (years.astype('datetime64[M]')[:, None] + np.arange(12)[None, :]).ravel()
+        else:
+            months = years.astype('datetime64[M]') + (start_date.month - 1)
+        days = _month_days(rule, months, start_date.day)
+
+    days = days.ravel()
+    days = days[~np.isnat(days)]
+
+    if rule.freq == 'daily' and rule.by_weekday:
+        days = days[np.isin(_weekday(days), rule.by_weekday)]
+    if rule.freq in ('daily', 'weekly') and rule.by_month_day:
+        day_of_month = (days - days.astype('datetime64[M]').astype('datetime64[D]')).astype(np.int64) + 1
+        length = ((days.astype('datetime64[M]') + 1).astype('datetime64[D]')
+                  - days.astype('datetime64[M]').astype('datetime64[D]')).astype(np.int64)
+        from_end = day_of_month - length - 1
+        days = days[np.isin(day_of_month, rule.by_month_day) | np.isin(from_end, rule.by_month_day)]
+
+    return days[days >= start]
+
+
+def expand(
+    rule: RecurrenceRule,
+    dtstart: datetime,
+    range_start: datetime,
+    range_end: datetime
+) -> np.ndarray:
+    """
+    Occurrences of a series within [range_start, range_end).
+
+    Args:
+        rule: Recurrence rule
+        dtstart: Start of the series (first possible occurrence)
+        range_start: Inclusive start of the range
+        range_end: Exclusive end of the range
+
+    Returns:
+        Sorted datetime64[s] array of occurrences
+    """
+    start = np.datetime64(dtstart.date(), 'D')
+    time_of_day = np.timedelta64(dtstart.hour * 3600 + dtstart.minute * 60 + dtstart.second, 's')
+    last = min(range_end, rule.until) if rule.until else range_end
+
+    if rule.count is None:
+        first_period = _period_index(rule, start, np.datetime64(max(dtstart, range_start).date(), 'D'))
+        last_period = _period_index(rule, start, np.datetime64(last.date(), 'D'))
+        days = _generate(rule, start, dtstart, np.arange(first_period, last_period + 1))
+    else:
+        # COUNT is counted from the start of the series
+        chunks, found, period = [], 0, 0
+        chunk = max(rule.count, 16)
+        last_day = np.datetime64(last.date(), 'D')
+        while found < rule.count and period < MAX_PERIODS:
+            days = _generate(rule, start, dtstart, np.arange(period, period + chunk))
+            chunks.append(days)
+            found += len(days)
+            period += chunk
+            if len(days) and days[-1] > last_day:
+                break
+        days = np.concatenate(chunks)[:rule.count]
+
+    occurrences = days.astype('datetime64[s]') + time_of_day
+    mask = (occurrences >= np.datetime64(max(dtstart, range_start), 's')) & (occurrences < np.datetime64(range_end, 's'))
+    if rule.until:
+        mask &= occurrences <= np.datetime64(rule.until, 's')
+    return occurrences[mask]
+
+
+def next_occurrence(rule: RecurrenceRule, dtstart: datetime, after: datetime) -> Optional[datetime]:
+    """First occurrence strictly after `after`, or None when the series ended"""
+    # One period of the largest unit (plus BYMONTHDAY gaps) always contains
+    # the next occurrence unless the series ended
+    span_days = {'daily': 1, 'weekly': 7, 'monthly': 31, 'yearly': 366}[rule.freq] * rule.interval
+    window_start = max(after, dtstart)
+    for attempt in range(1, 5):
+        window_end = window_start + timedelta(days=span_days * 12 ** attempt)
+        occurrences = expand(rule, dtstart, window_start, window_end)
+        occurrences = occurrences[occurrences > np.datetime64(after, 's')]
+        if len(occurrences):
+            return occurrences[0].astype(datetime)
+        if rule.until and window_end > rule.until:
+            return None
+    return None
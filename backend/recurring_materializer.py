@@ -0,0 +1,278 @@
+"""
+Recurring Task Materializer
+Scheduled job that creates upcoming occurrences of every recurring task
+
+Occurrences for the next HORIZON_DAYS days are generated inside PostgreSQL
+with one INSERT ... SELECT per chunk of users (generate_series over the
+occurrence index), so the nightly run never loads tasks into Python.
+RRULE series are expanded by the recurrence engine, only their ids and
+due dates come back to PostgreSQL, as two arrays unnested into a single
+INSERT ... SELECT that copies the rest from the template. Each
+occurrence is keyed by (parent_task_id, occurrence_date) and conflicts are
+skipped, so the job is idempotent and can be re-run or overlap safely.
+
+When a series changes or is deleted, its uncompleted occurrences from
+today on are deleted first (replace_series / prune_series), so they do
+not linger on the old schedule.
+
+The nightly run is the todo-recurring-materializer CronJob (todo-chart,
+k8s).
+
+Usage:
+    python recurring_materializer.py [--horizon-days 30] [--chunk-size 5000]
+"""
+
+import argparse
+import logging
+import os
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import text
+from sqlmodel import Session
+from database import engine
+from recurrence import RecurrenceRule, expand
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+HORIZON_DAYS = int(os.getenv("RECURRING_HORIZON_DAYS", "30"))
+# Recurring series (templates) per transaction
+CHUNK_SIZE = int(os.getenv("RECURRING_CHUNK_SIZE", "5000"))
+
+TEMPLATE_FILTER = "is_recurring = true AND parent_task_id IS NULL AND due_date IS NOT NULL"
+
+OCCURRENCE_COLUMNS = """
+    user_id, title, description, completed, created_at, updated_at,
+    priority, tags, due_date, is_recurring, recurrence_type,
+    recurrence_interval, parent_task_id, occurrence_date
+"""
+
+ON_CONFLICT = """
+    ON CONFLICT (parent_task_id, occurrence_date)
+    WHERE parent_task_id IS NOT NULL AND occurrence_date IS NOT NULL
+    DO NOTHING
+"""
+
+# Occurrence k of a series is due_date + k * step, always computed from the
+# series start so month/year steps clamp to short months without drifting.
+# The k range is bounded with the shortest/longest possible step length.
+MATERIALIZE_SQL = """
+    WITH templates AS (
+        SELECT t.*,
+               CASE t.recurrence_type
+                   WHEN 'weekly' THEN make_interval(weeks => t.recurrence_interval)
+                   WHEN 'monthly' THEN make_interval(months => t.recurrence_interval)
+                   WHEN 'yearly' THEN make_interval(years => t.recurrence_interval)
+                   ELSE make_interval(days => t.recurrence_interval)
+               END AS step,
+               t.recurrence_interval * CASE t.recurrence_type
+                   WHEN 'weekly' THEN 7 WHEN 'monthly' THEN 28 WHEN 'yearly' THEN 365 ELSE 1
+               END AS min_step_days,
+               t.recurrence_interval * CASE t.recurrence_type
+                   WHEN 'weekly' THEN 7 WHEN 'monthly' THEN 31 WHEN 'yearly' THEN 366 ELSE 1
+               END AS max_step_days
+        FROM tasks t
+        WHERE {template_filter} AND t.recurrence_rule IS NULL
+          AND t.recurrence_interval >= 1
+          {scope}
+    ),
+    occurrences AS (
+        SELECT tp.*, tp.due_date + k * tp.step AS due_at
+        FROM templates tp
+        CROSS JOIN LATERAL generate_series(
+            GREATEST(1, FLOOR(EXTRACT(EPOCH FROM (:window_start - tp.due_date)) / 86400 / tp.max_step_days))::int,
+            CEIL(EXTRACT(EPOCH FROM (:window_end - tp.due_date)) / 86400 / tp.min_step_days)::int
+        ) AS k
+    )
+    INSERT INTO tasks ({columns})
+    SELECT user_id, title, description, false, :now, :now,
+           priority, tags, due_at, true, recurrence_type,
+           recurrence_interval, id, CAST(due_at AS DATE)
+    FROM occurrences
+    WHERE due_at >= :window_start AND due_at < :window_end
+    {on_conflict}
+"""
+
+RULE_TEMPLATES_SQL = """
+    SELECT id, due_date, recurrence_rule
+    FROM tasks
+    WHERE {template_filter} AND recurrence_rule IS NOT NULL
+      {scope}
+"""
+
+# Occurrences (template id, due date) expanded in Python, one statement per chunk
+INSERT_RULE_OCCURRENCES_SQL = f"""
+    INSERT INTO tasks ({OCCURRENCE_COLUMNS})
+    SELECT t.user_id, t.title, t.description, false, :now, :now,
+           t.priority, t.tags, o.due_at, true, t.recurrence_type,
+           t.recurrence_interval, t.id, CAST(o.due_at AS DATE)
+    FROM unnest(CAST(:parent_ids AS integer[]), CAST(:due_dates AS timestamp[])) AS o(parent_task_id, due_at)
+    JOIN tasks t ON t.id = o.parent_task_id
+    {ON_CONFLICT}
+"""
+
+# Occurrences of a series the user has not acted on yet
+PRUNE_SQL = """
+    DELETE FROM tasks
+    WHERE parent_task_id = :template_id AND occurrence_date >= :today AND completed = false
+"""
+
+CHUNK_BOUNDARY_SQL = """
+    SELECT user_id FROM tasks
+    WHERE {template_filter} {after}
+    ORDER BY user_id
+    OFFSET :chunk_size LIMIT 1
+"""
+
+
+def _scope(user_from: Optional[str], user_to: Optional[str], template_id: Optional[int], alias: str = "") -> str:
+    """SQL restricting templates to a user_id range or a single series"""
+    clauses = []
+    if user_from is not None:
+        clauses.append(f"AND {alias}user_id >= :user_from")
+    if user_to is not None:
+        clauses.append(f"AND {alias}user_id < :user_to")
+    if template_id is not None:
+        clauses.append(f"AND {alias}id = :template_id")
+    return " ".join(clauses)
+
+
+def _materialize_rule_templates(session: Session, scope: str, params: Dict) -> int:
+    """Expand RRULE templates (BYDAY, COUNT, ...) with the recurrence engine"""
+    templates = session.execute(
+        text(RULE_TEMPLATES_SQL.format(template_filter=TEMPLATE_FILTER, scope=scope)), params
+    ).all()
+
+    parent_ids: List[int] = []
+    due_dates: List[datetime] = []
+    for t in templates:
+        try:
+            rule = RecurrenceRule.parse(t.recurrence_rule)
+        except ValueError as e:
+            logger.warning(f"⚠️  Skipping task {t.id}: invalid recurrence rule ({e})")
+            continue
+        occurrences = expand(rule, t.due_date, params['window_start'], params['window_end'])
+        upcoming = [due_at for due_at in occurrences.astype(datetime) if due_at > t.due_date]
+        parent_ids += [t.id] * len(upcoming)
+        due_dates += upcoming
+
+    if not parent_ids:
+        return 0
+    return session.execute(
+        text(INSERT_RULE_OCCURRENCES_SQL),
+        {'parent_ids': parent_ids, 'due_dates': due_dates, 'now': params['now']}
+    ).rowcount
+
+
+def materialize_chunk(
+    session: Session,
+    window_start: datetime,
+    window_end: datetime,
+    user_from: Optional[str] = None,
+    user_to: Optional[str] = None,
+    template_id: Optional[int] = None
+) -> int:
+    """Create missing occurrences in [window_start, window_end) for one chunk"""
+    params = {
+        'window_start': window_start,
+        'window_end': window_end,
+        'now': datetime.now(),
+        'user_from': user_from,
+        'user_to': user_to,
+        'template_id': template_id,
+    }
+
+    sql = MATERIALIZE_SQL.format(
+        template_filter=TEMPLATE_FILTER,
+        scope=_scope(user_from, user_to, template_id, alias="t."),
+        columns=OCCURRENCE_COLUMNS,
+        on_conflict=ON_CONFLICT,
+    )
+    created = session.execute(text(sql), params).rowcount
+    created += _materialize_rule_templates(session, _scope(user_from, user_to, template_id), params)
+    return created
+
+
+def chunk_boundaries(session: Session, chunk_size: int) -> List[Optional[str]]:
+    """user_id boundaries splitting the templates into ~chunk_size ranges"""
+    boundaries: List[Optional[str]] = [None]
+    while True:
+        after = "" if boundaries[-1] is None else "AND user_id > :after"
+        boundary = session.execute(
+            text(CHUNK_BOUNDARY_SQL.format(template_filter=TEMPLATE_FILTER, after=after)),
+            {'after': boundaries[-1], 'chunk_size': chunk_size}
+        ).scalar()
+        boundaries.append(boundary)
+        if boundary is None:
+            return boundaries
+
+
+def materialize_all(horizon_days: int = HORIZON_DAYS, chunk_size: int = CHUNK_SIZE) -> int:
+    """Materialize the next `horizon_days` of occurrences for every recurring task"""
+    started = time.monotonic()
+    window_start = datetime.now()
+    window_end = window_start + timedelta(days=horizon_days)
+
+    with Session(engine) as session:
+        boundaries = chunk_boundaries(session, chunk_size)
+
+    total = 0
+    for user_from, user_to in zip(boundaries, boundaries[1:]):
+        # One transaction per chunk keeps locks and WAL bursts short
+        with Session(engine) as session:
+            created = materialize_chunk(session, window_start, window_end, user_from, user_to)
+            session.commit()
+        total += created
+        logger.info(f"♻️  Users [{user_from or ''}, {user_to or '∞'}): {created} occurrences created")
+
+    logger.info(
+        f"✅ Materialized {total} occurrences up to {window_end:%Y-%m-%d} "
+        f"in {time.monotonic() - started:.1f}s ({len(boundaries) - 1} chunks)"
+    )
+    return total
+
+
+def materialize_series(template_id: int, horizon_days: int = HORIZON_DAYS) -> int:
+    """Materialize the upcoming occurrences of a single recurring task"""
+    window_start = datetime.now()
+    with Session(engine) as session:
+        created = materialize_chunk(
+            session, window_start, window_start + timedelta(days=horizon_days), template_id=template_id
+        )
+        session.commit()
+    return created
+
+
+def prune_series(session: Session, template_id: int, today: date) -> int:
+    """Delete the series' uncompleted occurrences from today on (completed ones are history)"""
+    return session.execute(text(PRUNE_SQL), {'template_id': template_id, 'today': today}).rowcount
+
+
+def replace_series(template_id: int, horizon_days: int = HORIZON_DAYS) -> Tuple[int, int]:
+    """
+    Regenerate a changed series in one transaction: prune its pending
+    occurrences, then materialize from the template as it is now (nothing
+    when it was deleted or is no longer recurring). Returns (deleted, created).
+    """
+    window_start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    with Session(engine) as session:
+        deleted = prune_series(session, template_id, window_start.date())
+        created = materialize_chunk(
+            session, window_start, window_start + timedelta(days=horizon_days), template_id=template_id
+        )
+        session.commit()
+    return deleted, created
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Materialize upcoming recurring task occurrences")
+    parser.add_argument("--horizon-days", type=int, default=HORIZON_DAYS)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    materialize_all(args.horizon_days, args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
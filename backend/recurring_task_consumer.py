@@ -1,90 +1,79 @@
 """
 Recurring Task Consumer
-Listens for completed tasks and creates next occurrence if recurring
+Listens for recurring task changes and keeps their upcoming occurrences current
+
+Occurrences are created ahead of time by recurring_materializer.py (nightly);
+this consumer only covers series created or changed since the last run.
+A changed or deleted series has its pending future occurrences replaced.
+Failed events go through retry topics to a dead-letter topic (kafka_retry.py),
+and consumption pauses while the database is unreachable.
 """
 
-from kafka import KafkaConsumer
+from kafka_client import BOOTSTRAP_SERVERS, create_consumer
 import json
-from sqlmodel import Session, select
-from database import engine
-from models import Task
-from datetime import datetime, timedelta
 import logging
+from sqlalchemy import text
+from database import engine
+from kafka_producer import kafka_producer
+from kafka_retry import FailureRouter, ResilientConsumer, retry_topics
+from recurring_materializer import materialize_series, replace_series
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-
-def calculate_next_date(current_date, recurrence_type, interval):
-    """Calculate next occurrence date"""
-    if recurrence_type == 'daily':
-        return current_date + timedelta(days=interval)
-    elif recurrence_type == 'weekly':
-        return current_date + timedelta(weeks=interval)
-    elif recurrence_type == 'monthly':
-        return current_date + timedelta(days=30 * interval)
-    elif recurrence_type == 'yearly':
-        return current_date + timedelta(days=365 * interval)
-    return current_date + timedelta(days=1)
+GROUP_ID = 'recurring-task-service'
 
 
-def process_completed_task(event):
-    """Process completed task and create next occurrence if recurring"""
-    task_data = event.get('task_data', {})
+def process_recurring_task(event):
+    """Materialize a new recurring task, regenerate an updated one, prune a deleted one"""
+    event_type = event.get('event_type')
+    if event_type not in ('created', 'updated', 'deleted'):
+        return
     
-    if not task_data.get('is_recurring'):
+    task_data = event.get('task_data', {})
+    if task_data.get('parent_task_id'):
         return
     
     task_id = event.get('task_id')
-    user_id = event.get('user_id')
-    
-    logger.info(f"♻️  Creating next occurrence for task {task_id}")
-    
-    # Calculate next due date
-    next_due = calculate_next_date(
-        datetime.now(),
-        task_data.get('recurrence_type', 'daily'),
-        task_data.get('recurrence_interval', 1)
-    )
+    if event_type == 'created':
+        if task_data.get('is_recurring'):
+            created = materialize_series(task_id)
+            logger.info(f"♻️  Materialized {created} occurrences for task {task_id}")
+        return
     
-    # Create new task
-    with Session(engine) as session:
-        new_task = Task(
-            user_id=user_id,
-            title=task_data.get('title'),
-            description=task_data.get('description', ''),
-            priority=task_data.get('priority', 'medium'),
-            tags=task_data.get('tags', ''),
-            due_date=next_due,
-            is_recurring=True,
-            recurrence_type=task_data.get('recurrence_type'),
-            recurrence_interval=task_data.get('recurrence_interval', 1),
-            parent_task_id=task_id
-        )
-        session.add(new_task)
-        session.commit()
-        logger.info(f"✅ Created next occurrence: Task {new_task.id}")
+    # The rule or due date may have changed, or the task stopped recurring or is gone
+    deleted, created = replace_series(task_id)
+    if deleted or created:
+        logger.info(f"♻️  Replaced occurrences of task {task_id}: {deleted} deleted, {created} created")
+
+
+def database_healthy() -> bool:
+    """Health check used to resume consumption after a database outage"""
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))
+    return True
 
 
 def main():
     """Main consumer loop"""
-    consumer = KafkaConsumer(
+    consumer = create_consumer(
         'task-events',
-        bootstrap_servers='localhost:9092',
-        group_id='recurring-task-service',
+        *retry_topics(GROUP_ID),
+        bootstrap_servers=BOOTSTRAP_SERVERS,
+        group_id=GROUP_ID,
         value_deserializer=lambda v: json.loads(v.decode('utf-8')),
-        auto_offset_reset='earliest'
+        auto_offset_reset='earliest',
+        enable_auto_commit=False
     )
     
     logger.info("✅ Recurring task consumer started")
     
-    for message in consumer:
-        event = message.value
-        if event.get('event_type') == 'completed':
-            try:
-                process_completed_task(event)
-            except Exception as e:
-                logger.error(f"❌ Error processing event: {e}")
+    ResilientConsumer(
+        consumer,
+        handler=process_recurring_task,
+        router=FailureRouter(kafka_producer.publish, GROUP_ID),
+        health_check=database_healthy
+    ).run()
 
 
 if __name__ == "__main__":
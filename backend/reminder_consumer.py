@@ -1,41 +1,137 @@
 """
 Reminder Consumer
-Processes reminder events
+Processes reminder events, batched into per-user digests
+
+Digests that fail to send go through retry topics to a dead-letter topic
+(kafka_retry.py). While the notification channel is down, consumption
+pauses and the failed digests are held until it recovers.
 """
 
-from kafka import KafkaConsumer
+from kafka_client import BOOTSTRAP_SERVERS, create_consumer
+from kafka.structs import OffsetAndMetadata
 import json
 import logging
+import time
+from kafka_producer import kafka_producer
+from kafka_retry import (
+    FailedMessage, FailureRouter, ResilientConsumer, is_dependency_failure, retry_topics
+)
+from reminder_digest import ReminderDigester
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+GROUP_ID = 'reminder-service'
+METRICS_INTERVAL_SECONDS = 60
+
 
 def process_reminder(event):
-    """Process reminder event"""
-    task_id = event.get('task_id')
-    title = event.get('title')
-    logger.info(f"🔔 REMINDER: {title} (Task {task_id})")
+    """Process a reminder event or a per-user digest (one notification)"""
+    reminders = event.get('reminders') or [event]
+    if len(reminders) == 1:
+        task_id = reminders[0].get('task_id')
+        title = reminders[0].get('title')
+        logger.info(f"🔔 REMINDER: {title} (Task {task_id})")
+    else:
+        titles = ", ".join(r.get('title', '') for r in reminders[:5])
+        more = f" and {len(reminders) - 5} more" if len(reminders) > 5 else ""
+        logger.info(f"🔔 {len(reminders)} REMINDERS for {event.get('user_id')}: {titles}{more}")
     # In production: send email/push notification
+    # (raise DependencyUnavailable when the provider is down)
+
+
+def send_digests(digests, router: FailureRouter, retries: ResilientConsumer) -> list:
+    """Send digests, returns the ones held back because a dependency is down"""
+    for i, (digest, positions) in enumerate(digests):
+        try:
+            process_reminder(digest)
+        except Exception as e:
+            partition, offset = positions[0] if positions else (None, None)
+            failed = FailedMessage(
+                'reminders',
+                partition.partition if partition else None,
+                offset,
+                None,
+                digest,
+                None
+            )
+            if is_dependency_failure(e) or not router.route(failed, e):
+                retries.gate.trip(e)
+                return digests[i:]
+    return []
+
+
+def commit_offsets(consumer, pending_positions: list, consumed: dict, committed: dict):
+    """Commit up to the oldest reminder that is still buffered in a digest"""
+    pending = {}
+    for partition, offset in pending_positions:
+        pending[partition] = min(offset, pending.get(partition, offset))
+
+    offsets = {
+        partition: pending.get(partition, next_offset)
+        for partition, next_offset in consumed.items()
+        if pending.get(partition, next_offset) != committed.get(partition)
+    }
+    if offsets:
+        consumer.commit({p: OffsetAndMetadata(o, None) for p, o in offsets.items()})
+        committed.update(offsets)
 
 
 def main():
     """Main consumer loop"""
-    consumer = KafkaConsumer(
+    consumer = create_consumer(
         'reminders',
-        bootstrap_servers='localhost:9092',
-        group_id='reminder-service',
+        *retry_topics(GROUP_ID),
+        bootstrap_servers=BOOTSTRAP_SERVERS,
+        group_id=GROUP_ID,
         value_deserializer=lambda v: json.loads(v.decode('utf-8')),
-        auto_offset_reset='earliest'
+        auto_offset_reset='earliest',
+        enable_auto_commit=False
     )
+    router = FailureRouter(kafka_producer.publish, GROUP_ID)
+    # Retried digests skip the digester and go straight to process_reminder
+    retries = ResilientConsumer(consumer, handler=process_reminder, router=router)
+    digester = ReminderDigester()
+    held = []
+    consumed = {}
+    committed = {}
+    last_metrics = time.monotonic()
     
     logger.info("✅ Reminder consumer started")
     
-    for message in consumer:
-        try:
-            process_reminder(message.value)
-        except Exception as e:
-            logger.error(f"❌ Error processing reminder: {e}")
+    while True:
+        retries.resume_due()
+        retries.gate.check(keep_paused=retries.delayed)
+        
+        deadline = digester.next_deadline()
+        timeout = 1.0 if deadline is None else min(1.0, max(0.0, deadline - time.monotonic()))
+        records = consumer.poll(timeout_ms=int(timeout * 1000))
+        
+        if retries.gate.paused:
+            retries.gate.hold(records)
+            records = {}
+        
+        retried = {tp: messages for tp, messages in records.items() if tp.topic in retries.retry_topics}
+        consumed.update(retries.process_batch(retried))
+        
+        for partition, messages in records.items():
+            if partition.topic in retries.retry_topics:
+                continue
+            for message in messages:
+                digester.add(message.value, position=(partition, message.offset))
+                consumed[partition] = message.offset + 1
+        
+        if not retries.gate.paused:
+            held = send_digests([*held, *digester.flush_due()], router, retries)
+        
+        held_positions = [p for _, positions in held for p in positions]
+        commit_offsets(consumer, digester.pending_positions() + held_positions, consumed, committed)
+        
+        if time.monotonic() - last_metrics >= METRICS_INTERVAL_SECONDS:
+            last_metrics = time.monotonic()
+            digester.prune()
+            metrics = {**digester.metrics(), **retries.metrics(), 'held_digests': len(held)}
+            logger.info(f"📊 Reminder digest metrics: {json.dumps(metrics)}")
 
 
 if __name__ == "__main__":
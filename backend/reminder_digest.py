@@ -0,0 +1,215 @@
+"""
+Reminder Digest
+Coalesces reminder.due events per user into one notification
+
+Reminders for the same user that arrive within the digest window are sent
+as a single digest, duplicates (same reminder_id) are dropped, and each user
+gets at most MAX_DIGESTS_PER_HOUR notifications. When the cap is reached the
+user's reminders keep coalescing until the next send is allowed.
+"""
+
+import heapq
+import os
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+WINDOW_SECONDS = float(os.getenv("REMINDER_DIGEST_WINDOW_SECONDS", "60"))
+# Send right away once this many reminders are buffered for a user
+MAX_DIGEST_SIZE = int(os.getenv("REMINDER_DIGEST_MAX_SIZE", "50"))
+MAX_DIGESTS_PER_HOUR = int(os.getenv("REMINDER_DIGESTS_PER_HOUR", "6"))
+DEDUP_CAPACITY = 100000
+LATENCY_SAMPLES = 1000
+
+# Upper bounds of the digest size histogram buckets
+SIZE_BUCKETS = (1, 5, 20, 50)
+
+
+class _UserBuffer:
+    """Pending reminders of one user"""
+
+    __slots__ = ('reminders', 'positions', 'first_at', 'deadline', 'sent_at')
+
+    def __init__(self):
+        self.reminders: "OrderedDict[str, dict]" = OrderedDict()
+        self.positions: List[Any] = []
+        self.first_at: Optional[float] = None
+        self.deadline: Optional[float] = None
+        self.sent_at: Deque[float] = deque()
+
+
+class ReminderDigester:
+    """Per-user reminder batching with deduplication and rate caps"""
+
+    def __init__(
+        self,
+        window_seconds: float = WINDOW_SECONDS,
+        max_digest_size: int = MAX_DIGEST_SIZE,
+        max_digests_per_hour: int = MAX_DIGESTS_PER_HOUR,
+        dedup_capacity: int = DEDUP_CAPACITY,
+        clock=time.monotonic,
+    ):
+        self.window_seconds = window_seconds
+        self.max_digest_size = max_digest_size
+        self.max_digests_per_hour = max_digests_per_hour
+        self.dedup_capacity = dedup_capacity
+        self.clock = clock
+
+        self.users: Dict[str, _UserBuffer] = {}
+        # (deadline, user_id); entries whose deadline changed are skipped
+        self.deadlines: List[Tuple[float, str]] = []
+        # Recently sent reminder ids, oldest first
+        self.sent_ids: "OrderedDict[str, None]" = OrderedDict()
+
+        self.stats = {
+            'reminders_in': 0,
+            'reminders_sent': 0,
+            'duplicates_dropped': 0,
+            'digests_sent': 0,
+            'rate_limited': 0,
+        }
+        self.size_histogram = {f"<={bound}": 0 for bound in SIZE_BUCKETS}
+        self.size_histogram[f">{SIZE_BUCKETS[-1]}"] = 0
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+
+    @staticmethod
+    def reminder_id(event: dict) -> str:
+        """Stable id of a reminder (task + due time)"""
+        return event.get('reminder_id') or f"{event.get('task_id')}:{event.get('due_at')}"
+
+    def add(self, event: dict, position: Any = None, now: Optional[float] = None) -> bool:
+        """Buffer a reminder, returns False if it was a duplicate"""
+        now = self.clock() if now is None else now
+        self.stats['reminders_in'] += 1
+
+        reminder_id = self.reminder_id(event)
+        user_id = event.get('user_id', '')
+        buffer = self.users.get(user_id)
+
+        if reminder_id in self.sent_ids or (buffer and reminder_id in buffer.reminders):
+            self.stats['duplicates_dropped'] += 1
+            return False
+
+        if buffer is None:
+            buffer = self.users[user_id] = _UserBuffer()
+        if buffer.first_at is None:
+            buffer.first_at = now
+            self._set_deadline(user_id, buffer, self._allowed_at(buffer, now + self.window_seconds))
+
+        buffer.reminders[reminder_id] = event
+        if position is not None:
+            buffer.positions.append(position)
+
+        if len(buffer.reminders) >= self.max_digest_size:
+            self._set_deadline(user_id, buffer, self._allowed_at(buffer, now))
+        return True
+
+    def _allowed_at(self, buffer: _UserBuffer, at: float) -> float:
+        """Earliest time >= at when the user's rate cap allows a send"""
+        if len(buffer.sent_at) < self.max_digests_per_hour:
+            return at
+        return max(at, buffer.sent_at[-self.max_digests_per_hour] + 3600)
+
+    def _set_deadline(self, user_id: str, buffer: _UserBuffer, deadline: float):
+        if buffer.deadline != deadline:
+            buffer.deadline = deadline
+            heapq.heappush(self.deadlines, (deadline, user_id))
+
+    def next_deadline(self) -> Optional[float]:
+        """Clock time of the next digest flush"""
+        while self.deadlines:
+            deadline, user_id = self.deadlines[0]
+            buffer = self.users.get(user_id)
+            if buffer is not None and buffer.deadline == deadline:
+                return deadline
+            heapq.heappop(self.deadlines)
+        return None
+
+    def flush_due(self, now: Optional[float] = None) -> List[Tuple[dict, List[Any]]]:
+        """Build every digest whose deadline passed, with the positions it covers"""
+        now = self.clock() if now is None else now
+        digests = []
+
+        while True:
+            deadline = self.next_deadline()
+            if deadline is None or deadline > now:
+                return digests
+            _, user_id = heapq.heappop(self.deadlines)
+            buffer = self.users[user_id]
+
+            while buffer.sent_at and buffer.sent_at[0] <= now - 3600:
+                buffer.sent_at.popleft()
+            if len(buffer.sent_at) >= self.max_digests_per_hour:
+                self.stats['rate_limited'] += 1
+                self._set_deadline(user_id, buffer, self._allowed_at(buffer, now))
+                continue
+
+            digests.append(self._build_digest(user_id, buffer, now))
+
+    def _build_digest(self, user_id: str, buffer: _UserBuffer, now: float) -> Tuple[dict, List[Any]]:
+        reminders = list(buffer.reminders.values())
+        positions = buffer.positions
+
+        for reminder_id in buffer.reminders:
+            self.sent_ids[reminder_id] = None
+        while len(self.sent_ids) > self.dedup_capacity:
+            self.sent_ids.popitem(last=False)
+
+        size = len(reminders)
+        self.stats['digests_sent'] += 1
+        self.stats['reminders_sent'] += size
+        self._record_size(size)
+        self.latencies.append(now - buffer.first_at)
+
+        buffer.sent_at.append(now)
+        buffer.reminders = OrderedDict()
+        buffer.positions = []
+        buffer.first_at = None
+        buffer.deadline = None
+
+        digest = {
+            'event_type': 'reminder.digest',
+            'user_id': user_id,
+            'count': size,
+            'reminders': reminders,
+            'timestamp': datetime.now().isoformat()
+        }
+        return digest, positions
+
+    def _record_size(self, size: int):
+        for bound in SIZE_BUCKETS:
+            if size <= bound:
+                self.size_histogram[f"<={bound}"] += 1
+                return
+        self.size_histogram[f">{SIZE_BUCKETS[-1]}"] += 1
+
+    def prune(self, now: Optional[float] = None):
+        """Drop idle users whose rate window has expired"""
+        now = self.clock() if now is None else now
+        idle = [
+            user_id for user_id, buffer in self.users.items()
+            if not buffer.reminders and (not buffer.sent_at or buffer.sent_at[-1] <= now - 3600)
+        ]
+        for user_id in idle:
+            del self.users[user_id]
+
+    def pending_positions(self) -> List[Any]:
+        """Positions of reminders still waiting in a buffer"""
+        return [p for buffer in self.users.values() if buffer.reminders for p in buffer.positions]
+
+    def metrics(self) -> Dict[str, Any]:
+        """Digest size and latency metrics"""
+        latencies = sorted(self.latencies)
+        sent = self.stats['digests_sent']
+        return {
+            **self.stats,
+            'pending_users': sum(1 for b in self.users.values() if b.reminders),
+            'avg_digest_size': round(self.stats['reminders_sent'] / sent, 2) if sent else 0,
+            'digest_size_histogram': dict(self.size_histogram),
+            'latency_seconds': {
+                'p50': round(latencies[len(latencies) // 2], 3) if latencies else 0,
+                'p95': round(latencies[int(len(latencies) * 0.95)], 3) if latencies else 0,
+                'max': round(latencies[-1], 3) if latencies else 0,
+            }
+        }
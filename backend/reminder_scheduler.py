@@ -0,0 +1,313 @@
+"""
+Reminder Scheduler
+Fires reminder.due events when a task's reminder time arrives
+
+Upcoming reminders are loaded from the tasks table in sliding windows
+(ordered by the idx_tasks_reminder_at index) and kept in a min-heap, so
+memory is bounded by the window, not by the number of pending reminders.
+Task events reschedule or cancel entries that are already in memory.
+
+Firing is claim, publish, mark, with no transaction open while the
+broker is waited on:
+- claim: a batch of due reminders is checked (still open, time
+  unchanged) and stamped in tasks.reminder_fired_at, committed at once;
+- publish: each claimed reminder is sent and acked by the broker;
+- mark: tasks.reminder_published_at is set and committed per reminder.
+A reminder counts as fired once marked. Windows are loaded by that mark,
+so a restart re-fires anything claimed but not marked and never misses
+one. The only repeat is a crash between a broker ack and its mark
+commit, one reminder at most, and it carries the same reminder_id
+(task:due time), by which the digester drops it.
+"""
+
+from kafka_client import BOOTSTRAP_SERVERS, create_consumer
+import heapq
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+from sqlalchemy import text
+from sqlmodel import Session
+from database import engine
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# How far ahead reminders are loaded into memory
+WINDOW_SECONDS = int(os.getenv("REMINDER_WINDOW_SECONDS", "900"))
+# Hard cap on reminders held in memory at once
+MAX_IN_MEMORY = int(os.getenv("REMINDER_MAX_IN_MEMORY", "100000"))
+# Missed reminders older than this are not fired after downtime
+CATCHUP_SECONDS = int(os.getenv("REMINDER_CATCHUP_SECONDS", "86400"))
+# Rescan the loaded window to pick up changes whose events were missed
+RECONCILE_SECONDS = int(os.getenv("REMINDER_RECONCILE_SECONDS", "300"))
+LOAD_BATCH_SIZE = 5000
+FIRE_BATCH_SIZE = 500
+RETRY_DELAY_SECONDS = 5
+
+REMINDER_AT = "COALESCE(reminder_time, due_date)"
+
+LOAD_WINDOW_SQL = text(f"""
+    SELECT id, {REMINDER_AT} AS fire_at
+    FROM tasks
+    WHERE completed = false
+      AND {REMINDER_AT} >= :since
+      AND {REMINDER_AT} < :until
+      AND ({REMINDER_AT}, id) > (:after_at, :after_id)
+      AND (reminder_published_at IS NULL OR reminder_published_at <> {REMINDER_AT})
+    ORDER BY {REMINDER_AT}, id
+    LIMIT :limit
+""")
+
+# A claim left unmarked by a crash is claimed again, its publish never got acked
+CLAIM_SQL = text(f"""
+    UPDATE tasks SET reminder_fired_at = :fire_at
+    WHERE id = :task_id
+      AND completed = false
+      AND {REMINDER_AT} = :fire_at
+      AND (reminder_published_at IS NULL OR reminder_published_at <> :fire_at)
+    RETURNING user_id, title
+""")
+
+MARK_PUBLISHED_SQL = text("""
+    UPDATE tasks SET reminder_published_at = :fire_at
+    WHERE id = :task_id AND reminder_fired_at = :fire_at
+""")
+
+
+def _parse_time(value) -> Optional[datetime]:
+    """Parse an ISO timestamp from an event payload"""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+class ReminderScheduler:
+    """Min-heap of reminders due within the loaded window"""
+
+    def __init__(
+        self,
+        publish: Callable[[int, str, str, str], bool],
+        session_factory: Callable[[], Session] = lambda: Session(engine),
+        window: timedelta = timedelta(seconds=WINDOW_SECONDS),
+        max_in_memory: int = MAX_IN_MEMORY,
+    ):
+        self.publish = publish
+        self.session_factory = session_factory
+        self.window = window
+        self.max_in_memory = max_in_memory
+
+        # Heap of (wake_at, task_id, fire_at); stale entries are skipped when popped
+        self.heap: List[Tuple[datetime, int, datetime]] = []
+        # Current fire time per scheduled task, the source of truth for the heap
+        self.scheduled: Dict[int, datetime] = {}
+
+        # Every reminder with fire_at <= horizon is in memory or already fired
+        self.horizon: Optional[datetime] = None
+        # Keyset cursor of the last row loaded from the database
+        self.cursor: Tuple[datetime, int] = (datetime.min, 0)
+        self.last_reconcile: Optional[datetime] = None
+
+        self.fired_count = 0
+
+    # ----- Scheduling -----
+
+    def schedule(self, task_id: int, fire_at: Optional[datetime]):
+        """Schedule, reschedule or cancel (fire_at=None) a task's reminder"""
+        if fire_at is None:
+            self.cancel(task_id)
+            return
+
+        if self.horizon is None or fire_at > self.horizon:
+            # Beyond the window: the next sliding load will pick it up
+            self.scheduled.pop(task_id, None)
+            return
+
+        if self.scheduled.get(task_id) == fire_at:
+            return
+        if task_id not in self.scheduled and len(self.scheduled) >= self.max_in_memory:
+            # Full: shrink the horizon so the row is loaded again later
+            self.horizon = min(self.horizon, fire_at - timedelta(microseconds=1))
+            self.cursor = min(self.cursor, (self.horizon, 0))
+            return
+
+        self._push(task_id, fire_at)
+
+    def _push(self, task_id: int, fire_at: datetime, wake_at: Optional[datetime] = None):
+        self.scheduled[task_id] = fire_at
+        heapq.heappush(self.heap, (wake_at or fire_at, task_id, fire_at))
+
+    def cancel(self, task_id: int):
+        """Cancel a task's pending reminder"""
+        self.scheduled.pop(task_id, None)
+
+    def handle_task_event(self, event: dict):
+        """Apply a task-events message to the in-memory schedule"""
+        event_type = event.get('event_type')
+        task_id = event.get('task_id')
+        if task_id is None:
+            return
+
+        if event_type in ('completed', 'deleted'):
+            self.cancel(task_id)
+        elif event_type in ('created', 'updated'):
+            task_data = event.get('task_data', {})
+            if task_data.get('completed'):
+                self.cancel(task_id)
+                return
+            fire_at = _parse_time(task_data.get('reminder_time')) or _parse_time(task_data.get('due_date'))
+            self.schedule(task_id, fire_at)
+
+    # ----- Sliding window -----
+
+    def needs_refill(self, now: datetime) -> bool:
+        """Load more once half of the window has elapsed"""
+        if self.horizon is None:
+            return True
+        return self.horizon - now < self.window / 2 and len(self.scheduled) < self.max_in_memory
+
+    def refill(self, now: datetime):
+        """Load reminders up to now + window, bounded by max_in_memory"""
+        since = now - timedelta(seconds=CATCHUP_SECONDS)
+        until = now + self.window
+
+        with self.session_factory() as session:
+            full = False
+            while True:
+                rows = session.execute(LOAD_WINDOW_SQL, {
+                    'since': since,
+                    'until': until,
+                    'after_at': self.cursor[0],
+                    'after_id': self.cursor[1],
+                    'limit': LOAD_BATCH_SIZE,
+                }).all()
+
+                for task_id, fire_at in rows:
+                    fire_at = _parse_time(fire_at)
+                    if self.scheduled.get(task_id) != fire_at:
+                        if task_id not in self.scheduled and len(self.scheduled) >= self.max_in_memory:
+                            # Everything before this row is in memory
+                            full = True
+                            self.horizon = fire_at - timedelta(microseconds=1)
+                            break
+                        self._push(task_id, fire_at)
+                    self.cursor = (fire_at, task_id)
+
+                if full:
+                    break
+                if len(rows) == LOAD_BATCH_SIZE:
+                    # Rows sharing the cursor's fire time may still be unloaded
+                    self.horizon = self.cursor[0] - timedelta(microseconds=1)
+                else:
+                    # Window exhausted
+                    self.cursor = max(self.cursor, (until, 0))
+                    self.horizon = until
+                    break
+
+        logger.info(f"📥 Reminder window loaded up to {self.horizon} ({len(self.scheduled)} pending)")
+
+    def reconcile(self, now: datetime):
+        """Rescan the loaded window for changes whose task events were missed"""
+        self.last_reconcile = now
+        self.cursor = (datetime.min, 0)
+        self.refill(now)
+
+    # ----- Firing -----
+
+    def pop_due(self, now: datetime, limit: int = FIRE_BATCH_SIZE) -> List[Tuple[int, datetime]]:
+        """Pop up to `limit` reminders whose fire time has passed"""
+        due = []
+        while self.heap and self.heap[0][0] <= now and len(due) < limit:
+            _, task_id, fire_at = heapq.heappop(self.heap)
+            if self.scheduled.get(task_id) != fire_at:
+                continue  # rescheduled or cancelled
+            del self.scheduled[task_id]
+            due.append((task_id, fire_at))
+        return due
+
+    def fire_due(self, now: datetime) -> int:
+        """Claim a batch of due reminders, then publish and mark them one by one"""
+        fired = 0
+        while True:
+            due = self.pop_due(now)
+            if not due:
+                return fired
+
+            with self.session_factory() as session:
+                claimed = []
+                for task_id, fire_at in due:
+                    row = session.execute(CLAIM_SQL, {'task_id': task_id, 'fire_at': fire_at}).first()
+                    if row is not None:  # otherwise completed, deleted, moved or fired already
+                        claimed.append((task_id, fire_at, *row))
+                session.commit()
+
+                for i, (task_id, fire_at, user_id, title) in enumerate(claimed):
+                    # No transaction is open while the broker acks
+                    if not self.publish(task_id, user_id, title, fire_at.isoformat()):
+                        # Broker unavailable: the claims stay unmarked and are retried
+                        self._retry_later([(t, f) for t, f, _, _ in claimed[i:]], now)
+                        return fired
+                    session.execute(MARK_PUBLISHED_SQL, {'task_id': task_id, 'fire_at': fire_at})
+                    session.commit()
+                    fired += 1
+                    self.fired_count += 1
+
+    def _retry_later(self, due: List[Tuple[int, datetime]], now: datetime):
+        """Re-queue reminders after a publish failure"""
+        logger.warning(f"⚠️  Reminder publish failed, retrying {len(due)} reminders in {RETRY_DELAY_SECONDS}s")
+        retry_at = now + timedelta(seconds=RETRY_DELAY_SECONDS)
+        for task_id, fire_at in due:
+            if task_id not in self.scheduled:
+                self._push(task_id, fire_at, wake_at=retry_at)
+
+    def next_wakeup(self, now: datetime) -> float:
+        """Seconds until the next reminder or window refill"""
+        deadlines = []
+        if self.heap:
+            deadlines.append(self.heap[0][0])
+        if self.horizon is not None:
+            deadlines.append(self.horizon - self.window / 2)
+        if not deadlines:
+            return 1.0
+        return max(0.0, min((d - now).total_seconds() for d in deadlines))
+
+    def run(self, consumer):
+        """Main loop: refill, fire, then wait for task events until the next deadline"""
+        while True:
+            now = datetime.now()
+            if self.last_reconcile is None or (now - self.last_reconcile).total_seconds() >= RECONCILE_SECONDS:
+                self.reconcile(now)
+            elif self.needs_refill(now):
+                self.refill(now)
+
+            self.fire_due(now)
+
+            timeout_ms = int(min(self.next_wakeup(datetime.now()), 1.0) * 1000)
+            records = consumer.poll(timeout_ms=timeout_ms)
+            for messages in records.values():
+                for message in messages:
+                    self.handle_task_event(message.value)
+
+
+def main():
+    """Run the reminder scheduler service"""
+    from kafka_producer import kafka_producer
+
+    consumer = create_consumer(
+        'task-events',
+        bootstrap_servers=BOOTSTRAP_SERVERS,
+        group_id='reminder-scheduler',
+        value_deserializer=lambda v: json.loads(v.decode('utf-8')),
+        auto_offset_reset='latest'
+    )
+
+    scheduler = ReminderScheduler(publish=kafka_producer.publish_reminder)
+    logger.info("✅ Reminder scheduler started")
+    scheduler.run(consumer)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Response Cache
+Reuses chat replies for repeated questions about unchanged tasks
+
+"What's on my list?" asked twice against the same tasks gets the same
+answer, so it is served from memory instead of another completion. The
+key is the normalized message, the end of the conversation (summary and
+last RESPONSE_CACHE_TAIL_MESSAGES messages) and the user's task-state
+version (task_state.py), so any task change makes older entries
+unreachable. Only replies that did not change anything are stored: no
+write tool calls and no errors.
+
+Per worker, bounded by RESPONSE_CACHE_SIZE with LRU eviction, entries
+expire after RESPONSE_CACHE_TTL_SECONDS (which also bounds staleness
+after writes made by other workers).
+"""
+
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import task_state
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "2000"))
+RESPONSE_CACHE_TTL_SECONDS = float(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "120"))
+# Messages at the end of the conversation that take part in the key
+RESPONSE_CACHE_TAIL_MESSAGES = int(os.getenv("RESPONSE_CACHE_TAIL_MESSAGES", "2"))
+
+_NOT_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def normalize(message: str) -> str:
+    """Lowercase words only: "What's on my list?" == "whats on my list" """
+    return _NOT_WORD.sub(" ", message.lower().replace("'", "")).strip()
+
+
+def cache_key(
+    user_id: str,
+    message: str,
+    history: Optional[List[Dict[str, Any]]] = None,
+    summary: Optional[str] = None
+) -> Tuple[str, int, str, str]:
+    """Key of a chat request, read before the model is called"""
+    tail = hashlib.blake2b(digest_size=16)
+    tail.update((summary or "").encode())
+    for entry in (history or [])[-RESPONSE_CACHE_TAIL_MESSAGES:]:
+        tail.update(b"\x00" + entry["role"].encode() + b"\x00" + entry["content"].encode())
+    return user_id, task_state.version(user_id), normalize(message), tail.hexdigest()
+
+
+class ResponseCache:
+    """LRU of chat replies with a TTL per entry"""
+
+    def __init__(self, max_entries: int = RESPONSE_CACHE_SIZE, ttl: float = RESPONSE_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # key -> (expires_at, reply)
+        self._items: "OrderedDict[Tuple, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'expired': 0}
+
+    def get(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and item[0] < time.monotonic():
+                del self._items[key]
+                self.stats['expired'] += 1
+                item = None
+            if item is None:
+                self.stats['misses'] += 1
+                return None
+            self._items.move_to_end(key)
+            self.stats['hits'] += 1
+            return item[1]
+
+    def put(self, key: Tuple, response: str, tool_calls: List[str]):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl, {"response": response, "tool_calls": list(tool_calls)})
+            self._items.move_to_end(key)
+            self.stats['stores'] += 1
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+                self.stats['evictions'] += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.stats['hits'] + self.stats['misses']
+            return {
+                **self.stats,
+                'entries': len(self._items),
+                'hit_rate': round(self.stats['hits'] / lookups, 3) if lookups else None
+            }
+
+
+# Shared cache used by the chat agent
+response_cache = ResponseCache()
@@ -4,24 +4,18 @@ from fastapi import APIRouter, Depends, HTTPException, Query, status
 from sqlmodel import Session, select
 from database import get_session
 from models import Task, TaskCreate, TaskUpdate, TaskResponse
-from auth import verify_token
+from auth import authorized_user
 
-router = APIRouter(prefix="/api/{user_id}/tasks", tags=["tasks"])
+# Every route checks the bearer token against the path's user_id
+router = APIRouter(prefix="/api/{user_id}/tasks", tags=["tasks"], dependencies=[Depends(authorized_user)])
 
 
 @router.post("", response_model=TaskResponse, status_code=status.HTTP_201_CREATED)
 def create_task(
     user_id: str,
     task_data: TaskCreate,
-    session: Session = Depends(get_session),
-    token_user_id: str = Depends(verify_token)
+    session: Session = Depends(get_session)
 ):
-    if user_id != token_user_id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Cannot create tasks for another user"
-        )
-    
     task = Task(
         user_id=user_id,
         title=task_data.title,
@@ -39,15 +33,8 @@ def create_task(
 def get_tasks(
     user_id: str,
     status_filter: str = Query("all", regex="^(all|pending|completed)$"),
-    session: Session = Depends(get_session),
-    token_user_id: str = Depends(verify_token)
+    session: Session = Depends(get_session)
 ):
-    if user_id != token_user_id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Cannot access another user's tasks"
-        )
-    
     statement = select(Task).where(Task.user_id == user_id)
     
     if status_filter == "pending":
@@ -64,15 +51,8 @@ def get_tasks(
 def get_task(
     user_id: str,
     task_id: int,
-    session: Session = Depends(get_session),
-    token_user_id: str = Depends(verify_token)
+    session: Session = Depends(get_session)
 ):
-    if user_id != token_user_id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Cannot access another user's tasks"
-        )
-    
     task = session.get(Task, task_id)
     
     if not task:
@@ -95,15 +75,8 @@ def update_task(
     user_id: str,
     task_id: int,
     task_data: TaskUpdate,
-    session: Session = Depends(get_session),
-    token_user_id: str = Depends(verify_token)
+    session: Session = Depends(get_session)
 ):
-    if user_id != token_user_id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Cannot update another user's tasks"
-        )
-    
     task = session.get(Task, task_id)
     
     if not task:
@@ -137,15 +110,8 @@ def update_task(
 def toggle_complete(
     user_id: str,
     task_id: int,
-    session: Session = Depends(get_session),
-    token_user_id: str = Depends(verify_token)
+    session: Session = Depends(get_session)
 ):
-    if user_id != token_user_id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Cannot update another user's tasks"
-        )
-    
     task = session.get(Task, task_id)
     
     if not task:
@@ -174,15 +140,8 @@ def toggle_complete(
 def delete_task(
     user_id: str,
     task_id: int,
-    session: Session = Depends(get_session),
-    token_user_id: str = Depends(verify_token)
+    session: Session = Depends(get_session)
 ):
-    if user_id != token_user_id:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Cannot delete another user's tasks"
-        )
-    
     task = session.get(Task, task_id)
     
     if not task:
@@ -0,0 +1,142 @@
+"""
+Task Context
+Compact, ranked encoding of a user's tasks for LLM tool results
+
+list_tasks results are sent back to the model, so their size is prompt
+size. Instead of every task as JSON with full descriptions and ISO
+timestamps, tasks are ranked by relevance to the request (overdue and due
+soon, priority, words in common with the query), encoded one per line as
+pipe-separated columns with short descriptions and relative due dates,
+and cut off at TOOL_RESULT_TOKEN_BUDGET. The result says how many tasks
+were left out and the offset to ask for the next page with.
+"""
+
+import os
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from token_budget import count_tokens
+
+TOOL_RESULT_TOKEN_BUDGET = int(os.getenv("TOOL_RESULT_TOKEN_BUDGET", "600"))
+TITLE_CHARS = 80
+DESCRIPTION_CHARS = 60
+COLUMNS = "id|title|priority|due|tags|note"
+
+# Words of a request that say nothing about which tasks it is about
+_STOPWORDS = {
+    "the", "and", "for", "with", "that", "this", "what", "which", "are", "any", "all", "have", "has",
+    "show", "list", "tell", "give", "get", "see", "view", "display", "find", "about",
+    "task", "tasks", "todo", "todos", "list", "please", "can", "could", "you", "your", "mine", "my",
+    "pending", "completed", "done", "open", "need",
+}
+_WORD = re.compile(r"[a-z0-9]+")
+_PRIORITY_SCORE = {"high": 2.0, "medium": 1.0, "low": 0.0}
+_PRIORITY_CODE = {"high": "H", "medium": "M", "low": "L"}
+
+
+def query_terms(query: Optional[str]) -> List[str]:
+    """Words of a request used for text matching"""
+    return [w for w in _WORD.findall((query or "").lower()) if len(w) > 2 and w not in _STOPWORDS]
+
+
+def relevance(task: Any, terms: List[str], now: datetime) -> float:
+    """Higher for tasks the request is more likely about"""
+    score = 0.0 if task.completed else 3.0
+    if task.due_date and not task.completed:
+        days = (task.due_date - now).total_seconds() / 86400
+        if days < 0:
+            score += 4.0
+        elif days <= 1:
+            score += 3.0
+        elif days <= 7:
+            score += 2.0
+    score += _PRIORITY_SCORE.get(task.priority or "medium", 1.0)
+    if terms:
+        title = f"{task.title} {task.tags or ''}".lower()
+        description = (task.description or "").lower()
+        for term in terms:
+            if term in title:
+                score += 3.0
+            elif term in description:
+                score += 1.0
+    return score
+
+
+def rank(tasks: List[Any], query: Optional[str] = None, now: Optional[datetime] = None) -> List[Any]:
+    """Tasks most relevant first, ties by due date then id (stable across pages)"""
+    now = now or datetime.now()
+    terms = query_terms(query)
+    return sorted(
+        tasks,
+        key=lambda t: (-relevance(t, terms, now), t.due_date or datetime.max, t.id)
+    )
+
+
+def _truncate(text: str, limit: int) -> str:
+    text = " ".join((text or "").split()).replace("|", "/")
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + "…"
+
+
+def _due(task: Any, now: datetime) -> str:
+    if not task.due_date:
+        return "-"
+    days = (task.due_date.date() - now.date()).days
+    if days < 0:
+        return f"overdue {-days}d"
+    if days == 0:
+        return "today"
+    if days == 1:
+        return "tomorrow"
+    if days <= 7:
+        return f"in {days}d"
+    return task.due_date.strftime("%Y-%m-%d")
+
+
+def encode_row(task: Any, now: datetime) -> str:
+    """One task as a pipe-separated line"""
+    title = _truncate(task.title, TITLE_CHARS)
+    if task.completed:
+        title = f"[done] {title}"
+    return "|".join([
+        str(task.id),
+        title,
+        _PRIORITY_CODE.get(task.priority or "medium", "M"),
+        _due(task, now),
+        _truncate(task.tags or "", 30),
+        _truncate(task.description or "", DESCRIPTION_CHARS),
+    ])
+
+
+def encode_tasks(
+    tasks: List[Any],
+    query: Optional[str] = None,
+    offset: int = 0,
+    token_budget: int = TOOL_RESULT_TOKEN_BUDGET,
+    now: Optional[datetime] = None
+) -> Dict[str, Any]:
+    """Ranked page of tasks encoded within token_budget"""
+    now = now or datetime.now()
+    ranked = rank(tasks, query, now)
+    total = len(ranked)
+    offset = max(0, min(offset, total))
+
+    header = f"columns: {COLUMNS}"
+    used = count_tokens(header) + 40  # header and the fields around the table
+    rows = []
+    for task in ranked[offset:]:
+        row = encode_row(task, now)
+        tokens = count_tokens(row) + 1
+        if rows and used + tokens > token_budget:
+            break
+        rows.append(row)
+        used += tokens
+
+    next_offset = offset + len(rows)
+    return {
+        "tasks": "\n".join([header] + rows),
+        "shown": f"{offset + 1}-{next_offset}" if rows else "0",
+        "total": total,
+        "next_offset": next_offset if next_offset < total else None,
+        "tokens": used,
+    }
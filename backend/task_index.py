@@ -0,0 +1,339 @@
+"""
+Task Index
+Per-user similarity index over task titles and descriptions
+
+Tasks are character 3-gram TF-IDF vectors (sublinear tf, L2 normalized)
+kept as NumPy arrays in an inverted layout: one sorted array of n-gram
+ids with the row and weight of every entry. A query looks up the slices
+of its n-grams with searchsorted and adds up the products per row with
+bincount, so its cost depends on how many tasks share its n-grams, not
+on a Python loop over tasks. Cosine top-k is an argpartition.
+
+Updates are incremental: a changed task is tombstoned in the compiled
+arrays and its new vector goes to a small delta that queries score
+directly. The delta is compiled into the arrays once it grows past
+TASK_INDEX_DELTA_MAX (or a fraction of the index), which also refreshes
+the IDF weights. Changes arrive from task_state after every commit.
+
+An index is built from the database on first use and kept for the
+TASK_INDEX_MAX_USERS most recently used users. Everything is local, no
+network or model calls.
+"""
+
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from sqlmodel import Session, select
+
+import task_state
+from database import engine
+from models import Task
+
+logger = logging.getLogger(__name__)
+
+TASK_INDEX_MAX_USERS = int(os.getenv("TASK_INDEX_MAX_USERS", "200"))
+# Changed tasks scored outside the compiled arrays before they are rebuilt
+TASK_INDEX_DELTA_MAX = int(os.getenv("TASK_INDEX_DELTA_MAX", "512"))
+# Cosine similarity above which a new task is reported as a likely duplicate
+DUPLICATE_THRESHOLD = float(os.getenv("DUPLICATE_THRESHOLD", "0.8"))
+# Minimum similarity for a task to be a candidate of a fuzzy reference
+REFERENCE_THRESHOLD = float(os.getenv("REFERENCE_THRESHOLD", "0.35"))
+# A reference only acts on its own (tools that change or delete the task)
+# when its best match is this close and this far ahead of the runner-up,
+# anything less is sent back to be confirmed by id
+RESOLVE_THRESHOLD = float(os.getenv("RESOLVE_THRESHOLD", "0.6"))
+RESOLVE_MARGIN = float(os.getenv("RESOLVE_MARGIN", "0.25"))
+REFERENCE_CANDIDATES = 3
+
+NGRAM = 3
+DESCRIPTION_CHARS = 200
+_SPACES = re.compile(r"[^\w]+")
+
+
+def ngrams(text: str) -> Counter:
+    """Character n-grams of each word, padded so short words count too"""
+    padded = [f" {word} " for word in _SPACES.sub(" ", text.lower()).split()]
+    return Counter([p[i:i + NGRAM] for p in padded for i in range(max(1, len(p) - NGRAM + 1))])
+
+
+def task_text(title: Optional[str], description: Optional[str]) -> str:
+    return f"{title or ''} {(description or '')[:DESCRIPTION_CHARS]}"
+
+
+class Resolution(NamedTuple):
+    """Task a reference surely means, or the candidates to confirm"""
+    task_id: Optional[int]
+    candidates: List[Dict[str, Any]]
+
+
+def unresolved_message(reference: str, candidates: List[Dict[str, Any]]) -> str:
+    if not candidates:
+        return f"No task matches '{reference}'"
+    listed = ", ".join(f"#{c['id']} {c['title']}" for c in candidates)
+    return f"Not sure which task '{reference}' means: {listed}. Ask the user and retry with task_id"
+
+
+class UserIndex:
+    """Similarity index of one user's tasks"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.vocab: Dict[str, int] = {}
+        self.df = np.zeros(0, dtype=np.int32)
+        # task_id -> (n-gram ids, sublinear tf), the source of every rebuild
+        self.docs: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        self.texts: Dict[int, str] = {}
+        self.titles: Dict[int, str] = {}
+        # Compiled arrays
+        self.row_ids = np.zeros(0, dtype=np.int64)
+        self.alive = np.zeros(0, dtype=bool)
+        self.rows: Dict[int, int] = {}
+        self.post_gram = np.zeros(0, dtype=np.int32)
+        self.post_row = np.zeros(0, dtype=np.int32)
+        self.post_weight = np.zeros(0, dtype=np.float32)
+        # task_id -> (n-gram ids, normalized weights) of tasks changed since the rebuild
+        self.delta: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+    def _vector(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """n-gram ids (added to the vocabulary) and sublinear tf of a task"""
+        grams = ngrams(text)
+        vocab = self.vocab
+        ids = [vocab.setdefault(gram, len(vocab)) for gram in grams]
+        if len(vocab) > len(self.df):
+            self.df = np.concatenate([self.df, np.zeros(len(vocab) - len(self.df) + 1024, dtype=np.int32)])
+        return np.array(ids, dtype=np.int32), 1.0 + np.log(np.array(list(grams.values()), dtype=np.float32))
+
+    def _query_vector(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Normalized weights of the query's known n-grams"""
+        grams = ngrams(text)
+        known = [(self.vocab[gram], count) for gram, count in grams.items() if gram in self.vocab]
+        ids = np.array([gram_id for gram_id, _ in known], dtype=np.int32)
+        weights = (1.0 + np.log(np.array([count for _, count in known], dtype=np.float32))) * self._current_idf(ids)
+        # n-grams no task has still count in the norm, with the highest IDF
+        unknown = np.array([count for gram, count in grams.items() if gram not in self.vocab], dtype=np.float32)
+        unknown_weights = (1.0 + np.log(unknown)) * (np.log(1.0 + len(self.docs)) + 1.0)
+        norm = np.sqrt(np.sum(weights * weights) + np.sum(unknown_weights * unknown_weights))
+        return ids, (weights / norm if norm else weights).astype(np.float32)
+
+    def _current_idf(self, ids: np.ndarray) -> np.ndarray:
+        return np.log((1.0 + len(self.docs)) / (1.0 + self.df[ids])).astype(np.float32) + 1.0
+
+    def _normalized(self, ids: np.ndarray, tf: np.ndarray) -> np.ndarray:
+        weights = tf * self._current_idf(ids)
+        norm = np.linalg.norm(weights)
+        return weights / norm if norm else weights
+
+    def _add(self, task_id: int, title: str, description: str, count: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+        text = task_text(title, description)
+        ids, tf = self._vector(text)
+        self.docs[task_id] = (ids, tf)
+        self.texts[task_id] = text
+        self.titles[task_id] = title
+        if count:
+            self.df[ids] += 1
+        return ids, tf
+
+    def load(self, rows: List[Tuple[int, str, str]]):
+        """Index many tasks at once (counted and compiled in one pass)"""
+        for task_id, title, description in rows:
+            self.remove(task_id)
+            self._add(task_id, title, description, count=False)
+        # n-gram ids are unique within a task, so counting them gives the document frequency
+        counted = np.concatenate([ids for ids, _ in self.docs.values()]) if self.docs else np.zeros(0, dtype=np.int32)
+        self.df = np.bincount(counted, minlength=len(self.df)).astype(np.int32)
+        self.rebuild()
+
+    def upsert(self, task_id: int, title: str, description: str):
+        if self.texts.get(task_id) == task_text(title, description):
+            # Completed, rescheduled... the text did not change
+            return
+        self.remove(task_id)
+        ids, tf = self._add(task_id, title, description)
+        self.delta[task_id] = (ids, self._normalized(ids, tf))
+        if len(self.delta) > max(TASK_INDEX_DELTA_MAX, len(self.row_ids) // 10):
+            self.rebuild()
+
+    def remove(self, task_id: int):
+        doc = self.docs.pop(task_id, None)
+        if doc is None:
+            return
+        self.df[doc[0]] -= 1
+        self.texts.pop(task_id, None)
+        self.titles.pop(task_id, None)
+        self.delta.pop(task_id, None)
+        row = self.rows.pop(task_id, None)
+        if row is not None:
+            self.alive[row] = False
+
+    def rebuild(self):
+        """Compile every task into the inverted arrays, recomputing IDF"""
+        task_ids = list(self.docs)
+        self.row_ids = np.array(task_ids, dtype=np.int64)
+        self.alive = np.ones(len(task_ids), dtype=bool)
+        self.rows = {task_id: row for row, task_id in enumerate(task_ids)}
+        self.delta = {}
+        if not task_ids:
+            self.post_gram = np.zeros(0, dtype=np.int32)
+            self.post_row = np.zeros(0, dtype=np.int32)
+            self.post_weight = np.zeros(0, dtype=np.float32)
+            return
+
+        grams = np.concatenate([self.docs[t][0] for t in task_ids])
+        tf = np.concatenate([self.docs[t][1] for t in task_ids])
+        lengths = np.array([len(self.docs[t][0]) for t in task_ids], dtype=np.int64)
+        rows = np.repeat(np.arange(len(task_ids), dtype=np.int32), lengths)
+        weights = tf * self._current_idf(grams)
+        norms = np.sqrt(np.bincount(rows, weights=weights * weights, minlength=len(task_ids)))
+        weights = (weights / np.maximum(norms[rows], 1e-12)).astype(np.float32)
+
+        order = np.argsort(grams, kind="stable")
+        self.post_gram = grams[order]
+        self.post_row = rows[order]
+        self.post_weight = weights[order]
+
+    def query(self, text: str, k: int = 5, exclude: Optional[int] = None, min_score: float = 0.0) -> List[Tuple[int, float]]:
+        """
+        Top-k (task_id, cosine similarity) for a piece of text.
+
+        The compiled arrays keep the IDF of their last rebuild, so scores
+        drift slightly as tasks change until the next one.
+        """
+        ids, q_weights = self._query_vector(text)
+        if not len(ids) or not self.docs:
+            return []
+
+        candidates: List[Tuple[int, float]] = []
+        if len(self.row_ids):
+            starts = np.searchsorted(self.post_gram, ids, side="left")
+            ends = np.searchsorted(self.post_gram, ids, side="right")
+            slices = [slice(s, e) for s, e in zip(starts, ends) if e > s]
+            if slices:
+                rows = np.concatenate([self.post_row[s] for s in slices])
+                weights = np.concatenate([
+                    self.post_weight[s] * w for s, w in zip(slices, q_weights[starts != ends])
+                ])
+                scores = np.bincount(rows, weights=weights, minlength=len(self.row_ids))
+                scores[~self.alive] = 0.0
+                top = min(k + 1, len(scores))
+                best = np.argpartition(-scores, top - 1)[:top]
+                candidates += [(int(self.row_ids[r]), float(scores[r])) for r in best if scores[r] > 0]
+
+        if self.delta:
+            dense = np.zeros(len(self.vocab), dtype=np.float32)
+            dense[ids] = q_weights
+            for task_id, (doc_ids, doc_weights) in self.delta.items():
+                score = float(dense[doc_ids] @ doc_weights)
+                if score > 0:
+                    candidates.append((task_id, score))
+
+        candidates.sort(key=lambda c: -c[1])
+        return [
+            (task_id, round(min(score, 1.0), 3))
+            for task_id, score in candidates
+            if task_id != exclude and score >= min_score
+        ][:k]
+
+
+class TaskIndex:
+    """Similarity indexes of the most recently used users"""
+
+    def __init__(self, max_users: int = TASK_INDEX_MAX_USERS):
+        self.max_users = max_users
+        self._users: "OrderedDict[str, UserIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {'builds': 0, 'queries': 0, 'updates': 0, 'evictions': 0}
+        task_state.subscribe(self.apply)
+
+    def _load(self, user_id: str) -> UserIndex:
+        with self._lock:
+            index = self._users.get(user_id)
+            if index is not None:
+                self._users.move_to_end(user_id)
+                return index
+            index = self._users[user_id] = UserIndex()
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+                self.stats['evictions'] += 1
+            # Built under the index's lock, queries for the user wait for it
+            index.lock.acquire()
+
+        try:
+            started = time.perf_counter()
+            with Session(engine) as session:
+                rows = session.exec(
+                    select(Task.id, Task.title, Task.description).where(Task.user_id == user_id)
+                ).all()
+            index.load(rows)
+            self.stats['builds'] += 1
+            logger.info(f"🔎 Indexed {len(rows)} tasks of {user_id} in {(time.perf_counter() - started) * 1000:.0f}ms")
+        except Exception:
+            with self._lock:
+                self._users.pop(user_id, None)
+            raise
+        finally:
+            index.lock.release()
+        return index
+
+    def similar(
+        self,
+        user_id: str,
+        text: str,
+        k: int = 5,
+        exclude: Optional[int] = None,
+        min_score: float = 0.0
+    ) -> List[Dict[str, Any]]:
+        """The user's tasks most similar to text, best first"""
+        index = self._load(user_id)
+        with index.lock:
+            self.stats['queries'] += 1
+            return [
+                {"id": task_id, "title": index.titles.get(task_id, ""), "score": score}
+                for task_id, score in index.query(text, k, exclude, min_score)
+            ]
+
+    def resolve(self, user_id: str, reference: str) -> Resolution:
+        """Task a reference like "the milk one" surely means, or the candidates when unclear"""
+        matches = self.similar(user_id, reference, k=REFERENCE_CANDIDATES, min_score=REFERENCE_THRESHOLD)
+        candidates = [{**match, "score": round(match["score"], 2)} for match in matches]
+        if not matches:
+            return Resolution(None, [])
+        # The exact title is sure, whatever the runner-up scores
+        wanted = " ".join(reference.lower().split())
+        exact = [match for match in matches if " ".join(match["title"].lower().split()) == wanted]
+        if len(exact) == 1:
+            return Resolution(exact[0]["id"], [])
+        best, runner_up = matches[0]["score"], matches[1]["score"] if len(matches) > 1 else 0.0
+        if best >= RESOLVE_THRESHOLD and best - runner_up >= RESOLVE_MARGIN:
+            return Resolution(matches[0]["id"], [])
+        return Resolution(None, candidates)
+
+    def apply(self, changes: List[task_state.TaskChange]):
+        """Apply committed task changes to the indexes that are loaded"""
+        for change in changes:
+            with self._lock:
+                index = self._users.get(change.user_id)
+            if index is None:
+                continue
+            with index.lock:
+                if change.deleted:
+                    index.remove(change.task_id)
+                else:
+                    index.upsert(change.task_id, change.title, change.description)
+                self.stats['updates'] += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self.stats, 'users': len(self._users), 'tasks': sum(len(i) for i in self._users.values())}
+
+
+# Shared index
+task_index = TaskIndex()
@@ -0,0 +1,92 @@
+"""
+Task State
+Per-user version of the task list, bumped whenever a user's tasks change
+
+Anything derived from a user's tasks (such as cached chat replies, see
+response_cache.py) stores the version it was built at and is stale as
+soon as the version moved on. Versions are bumped from session events
+after a commit that added, changed or deleted Task rows, so every ORM
+write path is covered without touching it. Bulk statements that bypass
+the unit of work call touch() themselves. In-memory indexes over tasks
+subscribe() to the committed changes (see task_index.py).
+
+Versions live in this process: writes made by other workers are only
+seen through the TTL of whatever depends on them.
+"""
+
+import logging
+import threading
+from itertools import chain
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import Task
+
+logger = logging.getLogger(__name__)
+
+
+class TaskChange(NamedTuple):
+    """A committed change to one task"""
+    user_id: str
+    task_id: int
+    title: Optional[str]
+    description: Optional[str]
+    deleted: bool = False
+
+
+_versions: Dict[str, int] = {}
+_lock = threading.Lock()
+_listeners: List[Callable[[List[TaskChange]], None]] = []
+
+
+def version(user_id: str) -> int:
+    """Current version of the user's tasks"""
+    return _versions.get(user_id, 0)
+
+
+def bump(user_id: str):
+    with _lock:
+        _versions[user_id] = _versions.get(user_id, 0) + 1
+
+
+def subscribe(listener: Callable[[List[TaskChange]], None]):
+    """Call listener with the task changes of every commit"""
+    _listeners.append(listener)
+
+
+def touch(session: Session, user_id: str, changes: Iterable[TaskChange] = ()):
+    """Bump the user's version (and report changes) when the session commits"""
+    session.info.setdefault("task_users", set()).add(user_id)
+    session.info.setdefault("task_changes", []).extend(changes)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_task_users(session, flush_context):
+    for obj in chain(session.new, session.dirty):
+        if isinstance(obj, Task):
+            touch(session, obj.user_id, [TaskChange(obj.user_id, obj.id, obj.title, obj.description)])
+    for obj in session.deleted:
+        if isinstance(obj, Task):
+            touch(session, obj.user_id, [TaskChange(obj.user_id, obj.id, None, None, deleted=True)])
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_task_users(session):
+    for user_id in session.info.pop("task_users", ()):
+        bump(user_id)
+    changes = session.info.pop("task_changes", [])
+    for listener in _listeners if changes else ():
+        try:
+            listener(changes)
+        except Exception as e:
+            logger.error(f"❌ Task change listener failed: {e}")
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _forget_rolled_back(session, transaction):
+    # Whatever the outermost transaction did not commit never happened
+    if transaction.parent is None:
+        session.info.pop("task_users", None)
+        session.info.pop("task_changes", None)
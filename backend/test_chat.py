@@ -3,8 +3,13 @@
 import requests
 import time
 
+from auth import AUTH_REQUIRED, create_access_token
+
 BASE_URL = "http://localhost:8000"
 USER_ID = "test-user"
+HEADERS = {"Content-Type": "application/json"}
+if AUTH_REQUIRED:
+    HEADERS["Authorization"] = f"Bearer {create_access_token(USER_ID)}"
 
 def test_chat():
     print("🧪 Testing Phase III Chat Endpoint")
@@ -35,7 +40,7 @@ def test_chat():
             response = requests.post(
                 f"{BASE_URL}/api/{USER_ID}/chat",
                 json=payload,
-                headers={"Content-Type": "application/json"}
+                headers=HEADERS
             )
             
             if response.status_code == 200:
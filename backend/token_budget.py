@@ -0,0 +1,57 @@
+"""
+Token Budget
+Token estimates for fitting chat context into the model's prompt
+
+Uses tiktoken when it is installed, otherwise about four characters per
+token, which is close enough for English text to size a context window.
+"""
+
+import os
+from typing import Any, Dict, List
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except ImportError:
+    _encoding = None
+
+CHARS_PER_TOKEN = 4
+# Role and separators the API adds around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Tokens of conversation history sent with a new message
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "2000"))
+
+
+def count_tokens(text: str) -> int:
+    """Tokens in a piece of text"""
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def message_tokens(message: Dict[str, Any]) -> int:
+    """Tokens a chat message takes in the prompt"""
+    return count_tokens(message.get("content") or "") + MESSAGE_OVERHEAD_TOKENS
+
+
+def fit_latest(messages: List[Dict[str, Any]], budget: int) -> List[Dict[str, Any]]:
+    """The newest messages (oldest first) whose total stays within budget"""
+    kept = []
+    used = 0
+    for message in reversed(messages):
+        tokens = message.get("tokens") or message_tokens(message)
+        if used + tokens > budget:
+            break
+        kept.append(message)
+        used += tokens
+    kept.reverse()
+    return kept
+
+
+def prompt_tokens(messages: List[Dict[str, Any]]) -> int:
+    """Estimated prompt tokens of a chat completion request"""
+    # Every reply is primed with a few tokens for the assistant role
+    return sum(message_tokens(message) for message in messages) + 3
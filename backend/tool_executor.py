@@ -0,0 +1,359 @@
+"""
+Tool Executor
+Runs the tool calls of a chat turn, one short transaction per round
+
+- Writes run in the caller's session. A round of tool calls commits
+  before its results go back to the model, so no transaction (or row
+  lock) is held while the model is thinking. Each write leaves an undo
+  record: a turn that fails later is compensated (see TurnUnitOfWork).
+- Consecutive calls of the same write tool are batched: N add_task calls
+  are one multi-row INSERT ... RETURNING (their keyword priorities
+  classified in one pass), N complete_task / delete_task
+  calls load their tasks with one SELECT.
+- Reads that come before the turn's first write cannot see its changes
+  anyway, so they run concurrently on their own sessions while the
+  writes proceed. Reads after a write run in the turn's session.
+
+Each batch runs in a savepoint: a failing batch is rolled back and
+reported, the rest of the turn still commits. Results come back in call
+order with per-call timing.
+"""
+
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+from sqlalchemy import delete, insert, update
+from sqlmodel import Session, select
+
+import task_state
+from database import engine
+from mcp_server import MCPServer
+from models import Task
+from priority_classifier import classify_priorities
+from task_index import task_index, unresolved_message
+
+logger = logging.getLogger(__name__)
+
+TOOL_READ_WORKERS = int(os.getenv("TOOL_READ_WORKERS", "4"))
+
+READ_TOOLS = {"list_tasks"}
+BATCHED_TOOLS = {"add_task", "complete_task", "delete_task"}
+
+
+class ToolCallError(ValueError):
+    """A tool call with unusable arguments"""
+
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+def _task_id(arguments: Dict[str, Any], user_id: str) -> int:
+    if arguments.get("task_id") is None and arguments.get("task"):
+        # Fuzzy reference: only a sure match is changed, others are confirmed by id
+        task_id, candidates = task_index.resolve(user_id, arguments["task"])
+        if task_id is None:
+            raise ToolCallError(unresolved_message(arguments["task"], candidates))
+        return task_id
+    try:
+        return int(arguments["task_id"])
+    except (KeyError, TypeError, ValueError):
+        raise ToolCallError("task_id or task is required")
+
+
+def _not_found(task_id: int) -> Dict[str, Any]:
+    return {"task_id": task_id, "status": "error", "message": "Task not found"}
+
+
+def _remember_undo(session: Session, kind: str, rows: List[Dict[str, Any]]):
+    """Record how to revert a write: ("added", ids), ("updated", old values) or ("deleted", rows)"""
+    if rows:
+        session.info.setdefault("undo", []).append((kind, rows))
+
+
+def compensate(user_id: str, undo: List[tuple]):
+    """Revert committed tool writes, newest first, in one transaction"""
+    with Session(engine) as session:
+        for kind, rows in reversed(undo):
+            if kind == "added":
+                session.execute(delete(Task).where(Task.id.in_(rows), Task.user_id == user_id))
+                changes = [task_state.TaskChange(user_id, task_id, None, None, deleted=True) for task_id in rows]
+            elif kind == "updated":
+                for row in rows:
+                    values = {k: v for k, v in row.items() if k not in ("id", "title", "description")}
+                    session.execute(update(Task).where(Task.id == row["id"], Task.user_id == user_id).values(**values))
+                changes = [task_state.TaskChange(user_id, row["id"], row["title"], row["description"]) for row in rows]
+            else:
+                session.execute(insert(Task), rows)
+                changes = [task_state.TaskChange(user_id, row["id"], row["title"], row["description"]) for row in rows]
+            # Core statements bypass the flush events that track task changes
+            task_state.touch(session, user_id, changes)
+        session.commit()
+
+
+class ToolExecutor:
+    """Executes a turn's tool calls in one transaction"""
+
+    def __init__(self, mcp: MCPServer, read_workers: int = TOOL_READ_WORKERS):
+        self.mcp = mcp
+        self.pool = ThreadPoolExecutor(max_workers=read_workers, thread_name_prefix="tool-read")
+        self.batches: Dict[str, Callable] = {
+            "add_task": self._add_tasks,
+            "complete_task": self._complete_tasks,
+            "delete_task": self._delete_tasks,
+        }
+
+    def run(
+        self,
+        tool_calls: List[Dict[str, Any]],
+        user_id: str,
+        session: Optional[Session],
+        user_message: str = "",
+        concurrent_reads: bool = True
+    ) -> List[Dict[str, Any]]:
+        """
+        Execute tool calls, the caller commits the session (only
+        needed when there are writes). Pass concurrent_reads=False when
+        the session already holds uncommitted writes the reads must see.
+
+        Returns one {"name", "ok", "result" | "error", "ms", "batch"} per
+        call, in call order.
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(tool_calls)
+        first_write = next(
+            (i for i, call in enumerate(tool_calls) if call["name"] not in READ_TOOLS), len(tool_calls)
+        ) if concurrent_reads else 0
+
+        # Leading reads see the state before the turn: run them alongside the writes
+        reads = {
+            i: self.pool.submit(self._timed_read, tool_calls[i], user_id, None, user_message)
+            for i in range(first_write)
+        }
+
+        i = first_write
+        while i < len(tool_calls):
+            name = tool_calls[i]["name"]
+            if name in READ_TOOLS:
+                results[i] = self._timed_read(tool_calls[i], user_id, session, user_message)
+                i += 1
+                continue
+
+            end = i + 1
+            if name in BATCHED_TOOLS:
+                while end < len(tool_calls) and tool_calls[end]["name"] == name:
+                    end += 1
+            for index, result in zip(range(i, end), self._run_batch(name, tool_calls[i:end], user_id, session)):
+                results[index] = result
+            i = end
+
+        for index, future in reads.items():
+            results[index] = future.result()
+        return results
+
+    def _run_batch(self, name: str, calls: List[Dict[str, Any]], user_id: str, session: Session) -> List[Dict[str, Any]]:
+        started = time.perf_counter()
+        handler = self.batches.get(name)
+        if handler is None:
+            return [{"name": name, "ok": False, "error": f"Unknown tool: {name}", "ms": 0.0, "batch": 1}] * len(calls)
+
+        undo = session.info.setdefault("undo", [])
+        kept = len(undo)
+        try:
+            with session.begin_nested():
+                outcomes = handler([call["arguments"] for call in calls], user_id, session)
+        except Exception as e:
+            logger.error(f"❌ {name} batch of {len(calls)} failed: {e}")
+            outcomes = [e] * len(calls)
+            # The savepoint rolled the batch back, nothing to undo
+            del undo[kept:]
+
+        ms = _elapsed_ms(started)
+        results = []
+        for outcome in outcomes:
+            if isinstance(outcome, Exception):
+                results.append({"name": name, "ok": False, "error": str(outcome), "ms": ms, "batch": len(calls)})
+            else:
+                results.append({"name": name, "ok": outcome.get("status") != "error", "result": outcome,
+                                "ms": ms, "batch": len(calls)})
+        logger.info(f"🔧 {name} x{len(calls)} in {ms}ms")
+        return results
+
+    def _timed_read(self, call: Dict[str, Any], user_id: str, session: Optional[Session], user_message: str) -> Dict[str, Any]:
+        started = time.perf_counter()
+        try:
+            result = self._list_tasks(call["arguments"], user_id, session, user_message)
+            return {"name": call["name"], "ok": True, "result": result, "ms": _elapsed_ms(started), "batch": 1}
+        except Exception as e:
+            logger.error(f"❌ {call['name']} failed: {e}")
+            return {"name": call["name"], "ok": False, "error": str(e), "ms": _elapsed_ms(started), "batch": 1}
+
+    def _list_tasks(self, arguments: Dict[str, Any], user_id: str, session: Optional[Session], user_message: str):
+        """Ranked, token-budgeted table for the model (ranked by the request by default)"""
+        completed = arguments.get("completed")
+        status = arguments.get("status") or (
+            "all" if completed is None else ("completed" if completed else "pending")
+        )
+        return self.mcp.list_tasks(
+            user_id,
+            status=status,
+            query=arguments.get("query") or user_message,
+            offset=arguments.get("offset") or 0,
+            compact=True,
+            session=session
+        )
+
+    def _add_tasks(self, calls: List[Dict[str, Any]], user_id: str, session: Session) -> List[Any]:
+        """All add_task calls as one INSERT ... RETURNING, their priorities classified in one pass"""
+        outcomes: List[Any] = []
+        rows = []
+        for arguments in calls:
+            title = (arguments.get("title") or "").strip()
+            if not title:
+                outcomes.append(ToolCallError("title is required"))
+                continue
+            task = Task(user_id=user_id, title=title[:200], description=arguments.get("description") or "")
+            rows.append(task.model_dump(exclude={"id"}))
+            outcomes.append(None)
+
+        if not rows:
+            return outcomes
+        for values, priority in zip(rows, classify_priorities([values["title"] for values in rows])):
+            values["priority"] = priority
+        # Rows come back in insertion order (sort_by_parameter_order)
+        created = session.execute(
+            insert(Task).returning(Task.id, Task.title, sort_by_parameter_order=True), rows
+        ).all()
+        # Bulk INSERT bypasses the flush events that track task changes
+        task_state.touch(session, user_id, [
+            task_state.TaskChange(user_id, row.id, row.title, values["description"])
+            for row, values in zip(created, rows)
+        ])
+        _remember_undo(session, "added", [row.id for row in created])
+        created = iter(created)
+        for index, outcome in enumerate(outcomes):
+            if outcome is None:
+                row = next(created)
+                outcomes[index] = {"task_id": row.id, "status": "created", "title": row.title}
+        return outcomes
+
+    def _load(self, calls: List[Dict[str, Any]], user_id: str, session: Session):
+        ids = []
+        for arguments in calls:
+            try:
+                ids.append(_task_id(arguments, user_id))
+            except ToolCallError as e:
+                ids.append(e)
+        wanted = [i for i in ids if not isinstance(i, Exception)]
+        tasks = {
+            task.id: task
+            for task in session.exec(select(Task).where(Task.id.in_(wanted), Task.user_id == user_id)).all()
+        } if wanted else {}
+        return ids, tasks
+
+    def _complete_tasks(self, calls: List[Dict[str, Any]], user_id: str, session: Session) -> List[Any]:
+        ids, tasks = self._load(calls, user_id, session)
+        outcomes = []
+        now = datetime.now()
+        previous = []
+        for task_id in ids:
+            if isinstance(task_id, Exception):
+                outcomes.append(task_id)
+            elif task_id not in tasks:
+                outcomes.append(_not_found(task_id))
+            else:
+                task = tasks[task_id]
+                previous.append({"id": task.id, "title": task.title, "description": task.description,
+                                 "completed": task.completed, "updated_at": task.updated_at})
+                task.completed = True
+                task.updated_at = now
+                session.add(task)
+                outcomes.append({"task_id": task_id, "status": "completed", "title": task.title})
+        session.flush()
+        _remember_undo(session, "updated", previous)
+        return outcomes
+
+    def _delete_tasks(self, calls: List[Dict[str, Any]], user_id: str, session: Session) -> List[Any]:
+        ids, tasks = self._load(calls, user_id, session)
+        outcomes = []
+        removed = []
+        for task_id in ids:
+            if isinstance(task_id, Exception):
+                outcomes.append(task_id)
+            elif task_id not in tasks:
+                outcomes.append(_not_found(task_id))
+            else:
+                task = tasks.pop(task_id)
+                removed.append(task.model_dump())
+                session.delete(task)
+                outcomes.append({"task_id": task_id, "status": "deleted", "title": task.title})
+        session.flush()
+        _remember_undo(session, "deleted", removed)
+        return outcomes
+
+
+class TurnUnitOfWork:
+    """
+    Tool calls of one chat turn and its messages.
+
+    The agent may run several rounds of tool calls, feeding results back
+    to the model in between. Each round runs in its own short transaction
+    and commits before the model is called again. Its undo records are
+    kept until the turn ends. A turn that closes without commit() (the
+    model call failed, the client went away) is compensated: the writes
+    of its committed rounds are reverted. The final round and the
+    exchange are written together (open() / commit()).
+    """
+
+    def __init__(self, executor: ToolExecutor, user_id: str, user_message: str = ""):
+        self.executor = executor
+        self.user_id = user_id
+        self.user_message = user_message
+        self.session: Optional[Session] = None
+        self.results: List[Dict[str, Any]] = []
+        self.undo: List[tuple] = []
+
+    def open(self) -> Session:
+        """Session of the final transaction, committed with the exchange"""
+        if self.session is None:
+            self.session = Session(engine, expire_on_commit=False)
+        return self.session
+
+    def run(self, tool_calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Execute a round of tool calls (blocking)"""
+        if self.session is not None:
+            # Final round: part of the transaction that stores the exchange
+            results = self.executor.run(
+                tool_calls, self.user_id, self.session, self.user_message, concurrent_reads=False
+            )
+        elif all(call["name"] in READ_TOOLS for call in tool_calls):
+            results = self.executor.run(tool_calls, self.user_id, None, self.user_message)
+        else:
+            with Session(engine, expire_on_commit=False) as session:
+                results = self.executor.run(tool_calls, self.user_id, session, self.user_message)
+                undo = session.info.pop("undo", [])
+                session.commit()
+            self.undo += undo
+        self.results += results
+        return results
+
+    def commit(self):
+        if self.session is not None:
+            self.session.commit()
+        # The turn is stored, its tool writes stay
+        self.undo = []
+
+    def close(self):
+        """Release the session, rolling back anything not committed and compensating earlier rounds"""
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+        if self.undo:
+            undo, self.undo = self.undo, []
+            try:
+                compensate(self.user_id, undo)
+                logger.info(f"↩️ Reverted {len(undo)} tool write(s) of a failed turn")
+            except Exception as e:
+                logger.error(f"❌ Reverting tool writes of a failed turn failed: {e}")
@@ -0,0 +1,205 @@
+"""
+Usage Metrics
+Token and latency accounting of the chat feature
+
+Every chat turn carries a usage record filled in by the agent (model,
+LLM calls, prompt/completion tokens, time queued for a slot and spent in
+the LLM) and by the endpoint (tool time, total time). The ledger adds
+each record to running totals per user, per conversation and overall,
+with an estimated cost, and keeps recent latencies for percentiles, so
+expensive conversations and regressions show up in /metrics/chat (with
+user and conversation ids for callers holding METRICS_TOKEN only).
+
+Streamed completions report no usage, their tokens are estimated locally
+(tokens_estimated). Totals are per worker and kept in memory, for the
+most recently active USAGE_MAX_USERS users and USAGE_MAX_CONVERSATIONS
+conversations.
+"""
+
+import os
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional
+
+from token_budget import count_tokens, prompt_tokens
+
+USAGE_MAX_USERS = int(os.getenv("USAGE_MAX_USERS", "10000"))
+USAGE_MAX_CONVERSATIONS = int(os.getenv("USAGE_MAX_CONVERSATIONS", "10000"))
+# Attach each turn's usage record to the chat response
+CHAT_DEBUG = os.getenv("CHAT_DEBUG", "").lower() in ("1", "true", "yes")
+
+# USD per 1k (prompt, completion) tokens
+MODEL_PRICES = {
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+    "gpt-4o-mini": (0.00015, 0.0006),
+    "gpt-4o": (0.005, 0.015),
+}
+DEFAULT_PRICE = (
+    float(os.getenv("LLM_PROMPT_PRICE_PER_1K", "0.0005")),
+    float(os.getenv("LLM_COMPLETION_PRICE_PER_1K", "0.0015")),
+)
+
+_COUNTERS = (
+    "turns", "llm_calls", "prompt_tokens", "completion_tokens", "cost_usd",
+    "queue_ms", "llm_ms", "tool_ms", "tool_calls", "cache_hits", "local_intents", "summaries",
+)
+
+
+def new_usage(model: Optional[str] = None) -> Dict[str, Any]:
+    """Empty usage record of one turn"""
+    return {
+        "model": model, "llm_calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "tokens_estimated": False,
+        "queue_ms": 0.0, "llm_ms": 0.0, "tool_ms": 0.0, "tool_calls": 0,
+        "cached": False, "local_intent": False,
+    }
+
+
+def record_call(
+    usage: Dict[str, Any],
+    model: str,
+    queue_ms: float,
+    llm_ms: float,
+    messages: List[Dict[str, Any]],
+    reported: Any = None,
+    completion_text: str = ""
+) -> int:
+    """Add one completion to a usage record, returns its prompt tokens"""
+    if reported is not None:
+        prompt, completion = reported.prompt_tokens, reported.completion_tokens
+    else:
+        prompt, completion = prompt_tokens(messages), count_tokens(completion_text)
+        usage["tokens_estimated"] = True
+    usage["model"] = usage["model"] or model
+    usage["llm_calls"] += 1
+    usage["prompt_tokens"] += prompt
+    usage["completion_tokens"] += completion
+    usage["queue_ms"] = round(usage["queue_ms"] + queue_ms, 1)
+    usage["llm_ms"] = round(usage["llm_ms"] + llm_ms, 1)
+    return prompt
+
+
+def cost_usd(usage: Dict[str, Any]) -> float:
+    prompt_price, completion_price = MODEL_PRICES.get(usage.get("model") or "", DEFAULT_PRICE)
+    return round((usage["prompt_tokens"] * prompt_price + usage["completion_tokens"] * completion_price) / 1000, 6)
+
+
+def _percentiles(values) -> Dict[str, Optional[float]]:
+    values = sorted(values)
+    if not values:
+        return {"p50": None, "p95": None, "p99": None}
+    pick = lambda q: round(values[min(len(values) - 1, int(q * len(values)))], 1)
+    return {"p50": pick(0.5), "p95": pick(0.95), "p99": pick(0.99)}
+
+
+class UsageLedger:
+    """Running usage totals overall, per user and per conversation"""
+
+    def __init__(self, max_users: int = USAGE_MAX_USERS, max_conversations: int = USAGE_MAX_CONVERSATIONS):
+        self.max_users = max_users
+        self.max_conversations = max_conversations
+        self.totals = dict.fromkeys(_COUNTERS, 0)
+        self.models: Dict[str, int] = {}
+        self.users: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.conversations: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self.latencies = {"total_ms": deque(maxlen=2000), "llm_ms": deque(maxlen=2000), "tool_ms": deque(maxlen=2000)}
+        self._lock = threading.Lock()
+
+    def _entry(self, table: OrderedDict, key, limit: int, **fields) -> Dict[str, Any]:
+        entry = table.get(key)
+        if entry is None:
+            entry = table[key] = {**fields, **dict.fromkeys(_COUNTERS, 0)}
+            while len(table) > limit:
+                table.popitem(last=False)
+        table.move_to_end(key)
+        return entry
+
+    def record(
+        self,
+        user_id: Optional[str],
+        conversation_id: Optional[int],
+        usage: Dict[str, Any],
+        summary: bool = False
+    ) -> Dict[str, Any]:
+        """Add a turn (or a background summary) to the totals, returns the usage with its cost"""
+        usage = {**usage, "cost_usd": cost_usd(usage)}
+        increments = {
+            "turns": 0 if summary else 1,
+            "llm_calls": usage["llm_calls"],
+            "prompt_tokens": usage["prompt_tokens"],
+            "completion_tokens": usage["completion_tokens"],
+            "cost_usd": usage["cost_usd"],
+            "queue_ms": usage["queue_ms"],
+            "llm_ms": usage["llm_ms"],
+            "tool_ms": usage["tool_ms"],
+            "tool_calls": usage["tool_calls"],
+            "cache_hits": int(usage["cached"]),
+            "local_intents": int(usage["local_intent"]),
+            "summaries": int(summary),
+        }
+        with self._lock:
+            targets = [self.totals]
+            if conversation_id is not None:
+                conversation = self._entry(
+                    self.conversations, conversation_id, self.max_conversations, conversation_id=conversation_id, user_id=user_id
+                )
+                # Summaries run without a user, they are charged to the conversation's owner
+                user_id = conversation["user_id"] = conversation["user_id"] or user_id
+                targets.append(conversation)
+            if user_id is not None:
+                targets.append(self._entry(self.users, user_id, self.max_users, user_id=user_id))
+            for target in targets:
+                for counter, value in increments.items():
+                    target[counter] += value
+            if usage["model"] and usage["llm_calls"]:
+                self.models[usage["model"]] = self.models.get(usage["model"], 0) + usage["llm_calls"]
+            if not summary:
+                for name, values in self.latencies.items():
+                    if usage.get(name) is not None:
+                        values.append(usage[name])
+        return usage
+
+    @staticmethod
+    def _rounded(entry: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: (round(v, 6) if k == "cost_usd" else round(v, 1) if isinstance(v, float) else v) for k, v in entry.items()}
+
+    def snapshot(self, top: int = 10, identified: bool = False) -> Dict[str, Any]:
+        """
+        Totals, latency percentiles and the most expensive users and
+        conversations. Their user and conversation ids are only included
+        when identified (operators), the others see the costs alone.
+        """
+        hidden = () if identified else ("user_id", "conversation_id")
+        with self._lock:
+            by_cost = lambda entry: (entry["cost_usd"], entry["prompt_tokens"])
+            top_entries = lambda entries: [
+                {k: v for k, v in self._rounded(e).items() if k not in hidden}
+                for e in sorted(entries, key=by_cost, reverse=True)[:top]
+            ]
+            return {
+                "totals": self._rounded(self.totals),
+                "models": dict(self.models),
+                "latency_ms": {name.replace("_ms", ""): _percentiles(values) for name, values in self.latencies.items()},
+                "users": len(self.users),
+                "conversations": len(self.conversations),
+                "top_users": top_entries(self.users.values()),
+                "top_conversations": top_entries(self.conversations.values()),
+            }
+
+    def user_snapshot(self, user_id: str, top: int = 10) -> Dict[str, Any]:
+        """One user's totals and their most expensive conversations"""
+        with self._lock:
+            totals = self.users.get(user_id) or {"user_id": user_id, **dict.fromkeys(_COUNTERS, 0)}
+            conversations = [e for e in self.conversations.values() if e["user_id"] == user_id]
+            conversations.sort(key=lambda entry: entry["cost_usd"], reverse=True)
+            return {
+                "totals": self._rounded(totals),
+                "top_conversations": [self._rounded(e) for e in conversations[:top]],
+            }
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._rounded(self.totals), "users": len(self.users), "conversations": len(self.conversations)}
+
+
+# Shared ledger of the chat endpoints
+usage_ledger = UsageLedger()
@@ -3,6 +3,7 @@
 import { useState, useEffect, useRef } from "react";
 import { Send, Loader2, MessageSquare, Trash2, ArrowLeft } from "lucide-react";
 import Link from "next/link";
+import { authHeaders } from "@/lib/api";
 
 interface Message {
   role: "user" | "assistant";
@@ -56,7 +57,7 @@ export default function ChatPage() {
         `http://localhost:8000/api/${userId}/chat`,
         {
           method: "POST",
-          headers: { "Content-Type": "application/json" },
+          headers: { "Content-Type": "application/json", ...authHeaders() },
           body: JSON.stringify({
             message: inputMessage,
             conversation_id: conversationId,
@@ -25,10 +25,18 @@ export interface TaskUpdate {
 
 const API_BASE_URL = 'http://localhost:8000';
 
+// The backend checks the bearer token against the user in the path
+export function authHeaders(): Record<string, string> {
+  const token = typeof window !== 'undefined' ? localStorage.getItem('token') : null;
+  return token ? { Authorization: `Bearer ${token}` } : {};
+}
+
 export const taskAPI = {
   // Get all tasks for a user
   async getTasks(userId: string): Promise<Task[]> {
-    const response = await fetch(`${API_BASE_URL}/api/${userId}/tasks`);
+    const response = await fetch(`${API_BASE_URL}/api/${userId}/tasks`, {
+      headers: authHeaders(),
+    });
     if (!response.ok) {
       throw new Error(`Failed to fetch tasks: ${response.statusText}`);
     }
@@ -37,7 +45,9 @@ export const taskAPI = {
 
   // Get a single task
   async getTask(userId: string, taskId: number): Promise<Task> {
-    const response = await fetch(`${API_BASE_URL}/api/${userId}/tasks/${taskId}`);
+    const response = await fetch(`${API_BASE_URL}/api/${userId}/tasks/${taskId}`, {
+      headers: authHeaders(),
+    });
     if (!response.ok) {
       throw new Error(`Failed to fetch task: ${response.statusText}`);
     }
@@ -50,6 +60,7 @@ export const taskAPI = {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
+        ...authHeaders(),
       },
       body: JSON.stringify(task),
     });
@@ -65,6 +76,7 @@ export const taskAPI = {
       method: 'PUT',
       headers: {
         'Content-Type': 'application/json',
+        ...authHeaders(),
       },
       body: JSON.stringify(updates),
     });
@@ -78,6 +90,7 @@ export const taskAPI = {
   async deleteTask(userId: string, taskId: number): Promise<void> {
     const response = await fetch(`${API_BASE_URL}/api/${userId}/tasks/${taskId}`, {
       method: 'DELETE',
+      headers: authHeaders(),
     });
     if (!response.ok) {
       throw new Error(`Failed to delete task: ${response.statusText}`);
@@ -90,6 +103,7 @@ export const taskAPI = {
       method: 'POST',
       headers: {
         'Content-Type': 'application/json',
+        ...authHeaders(),
       },
       body: JSON.stringify({
         message,